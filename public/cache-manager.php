@@ -10,15 +10,49 @@
 header('Content-Type: text/html; charset=utf-8');
 
 $cacheDir = __DIR__ . DIRECTORY_SEPARATOR . 'cache';
+// Written by pythonscripts/report_cache.py: per-report files, sizes, hits and last use
+$indexFile = $cacheDir . DIRECTORY_SEPARATOR . 'index.json';
 $action = isset($_GET['action']) ? $_GET['action'] : '';
 $file = isset($_GET['file']) ? basename($_GET['file']) : ''; // Sanitize filename
 
+$index = is_file($indexFile) ? json_decode((string)file_get_contents($indexFile), true) : null;
+if (!is_array($index) || !isset($index['entries']) || !is_array($index['entries'])) {
+    $index = null;
+}
+
+/**
+ * Drop deleted reports from the index so the listing stays correct until
+ * report_cache.py next rescans the directory.
+ */
+function removeFromIndex(&$index, $indexFile, $names)
+{
+    if ($index === null) {
+        return;
+    }
+    foreach ($names as $name) {
+        unset($index['entries'][$name]);
+    }
+    $tmp = $indexFile . '.' . getmypid() . '.tmp';
+    if (file_put_contents($tmp, json_encode($index)) !== false) {
+        rename($tmp, $indexFile);
+    }
+}
+
 // Handle actions
 $message = '';
 if ($action === 'delete' && $file) {
     $filePath = $cacheDir . DIRECTORY_SEPARATOR . $file;
     if (file_exists($filePath) && strpos($file, 'dso_report_') === 0) {
         if (unlink($filePath)) {
+            // Remove the report's columnar data, track and visibility files and
+            // their precompressed copies along with it
+            $reportPath = preg_replace('/\.html$/', '', $filePath);
+            foreach (['.json', '.json.gz', '.json.br', '.tracks.bin', '.tracks.bin.gz', '.tracks.bin.br', '.vis.npz'] as $sidecar) {
+                if (file_exists($reportPath . $sidecar)) {
+                    unlink($reportPath . $sidecar);
+                }
+            }
+            removeFromIndex($index, $indexFile, [basename($reportPath)]);
             $message = "<div class='success'>✓ Deleted: $file</div>";
         } else {
             $message = "<div class='error'>✗ Failed to delete: $file</div>";
@@ -32,32 +66,59 @@ if ($action === 'delete' && $file) {
                 $deleted++;
             }
         }
+        foreach (['json', 'json.gz', 'json.br', 'tracks.bin', 'tracks.bin.gz', 'tracks.bin.br', 'vis.npz'] as $sidecar) {
+            foreach (glob($cacheDir . DIRECTORY_SEPARATOR . 'dso_report_*.' . $sidecar) as $file) {
+                unlink($file);
+            }
+        }
+        if ($index !== null) {
+            removeFromIndex($index, $indexFile, array_keys($index['entries']));
+        }
     }
     $message = "<div class='success'>✓ Cleared $deleted cache file(s)</div>";
 }
 
-// Get cache files
+// Get cache files: from the index when report_cache.py has written one, so
+// the listing needs no per-file stat
 $cacheFiles = [];
-if (is_dir($cacheDir)) {
+if ($index !== null) {
+    foreach ($index['entries'] as $name => $entry) {
+        if (!isset($entry['files']['.html'])) {
+            continue;
+        }
+        $lastUse = max((int)$entry['modified'], (int)$entry['last_access']);
+        $cacheFiles[] = [
+            'filename' => $name . '.html',
+            'profile' => $entry['profile'],
+            'date' => $entry['date'],
+            'size' => $entry['bytes'],
+            'hits' => $entry['hits'],
+            'age' => time() - $entry['modified'],
+            'modified' => $entry['modified'],
+            'last_use' => $lastUse
+        ];
+    }
+} elseif (is_dir($cacheDir)) {
     foreach (glob($cacheDir . DIRECTORY_SEPARATOR . 'dso_report_*.html') as $file) {
         $basename = basename($file);
-        // Extract date from filename (format: dso_report_YYYY-MM-DD.html)
-        preg_match('/dso_report_(\d{4}-\d{2}-\d{2})\.html/', $basename, $matches);
-        $date = isset($matches[1]) ? $matches[1] : 'Unknown';
-        
+        // Extract profile and date from filename (format: dso_report_<profile>_YYYY-MM-DD.html)
+        preg_match('/dso_report_(.+)_(\d{4}-\d{2}-\d{2})\.html/', $basename, $matches);
         $cacheFiles[] = [
             'filename' => $basename,
-            'date' => $date,
+            'profile' => isset($matches[1]) ? $matches[1] : 'Unknown',
+            'date' => isset($matches[2]) ? $matches[2] : 'Unknown',
             'size' => filesize($file),
+            'hits' => null,
             'age' => time() - filemtime($file),
-            'modified' => filemtime($file)
+            'modified' => filemtime($file),
+            'last_use' => filemtime($file)
         ];
     }
-    // Sort by date descending
-    usort($cacheFiles, function($a, $b) {
-        return strcmp($b['date'], $a['date']);
-    });
 }
+// Sort by date descending
+usort($cacheFiles, function($a, $b) {
+    return strcmp($b['date'], $a['date']);
+});
 
 function formatBytes($bytes) {
     if ($bytes < 1024) return $bytes . ' B';
@@ -194,6 +255,9 @@ function formatAge($seconds) {
     <div class="info">
         <p><strong>Cache Directory:</strong> <?php echo htmlspecialchars($cacheDir); ?></p>
         <p><strong>Total Cache Files:</strong> <?php echo count($cacheFiles); ?></p>
+        <?php if ($index !== null): ?>
+            <p><strong>Total Size:</strong> <?php echo formatBytes($index['total_bytes']); ?> (index updated <?php echo date('Y-m-d H:i:s', (int)$index['updated']); ?>)</p>
+        <?php endif; ?>
         <p><strong>Cache Max Age:</strong> 24 hours</p>
     </div>
     
@@ -214,9 +278,11 @@ function formatAge($seconds) {
             <thead>
                 <tr>
                     <th>Date</th>
-                    <th>File Size</th>
+                    <th>Profile</th>
+                    <th>Size</th>
+                    <th>Hits</th>
                     <th>Age</th>
-                    <th>Last Modified</th>
+                    <th>Last Used</th>
                     <th>Actions</th>
                 </tr>
             </thead>
@@ -224,13 +290,15 @@ function formatAge($seconds) {
                 <?php foreach ($cacheFiles as $file): ?>
                     <tr>
                         <td><strong><?php echo htmlspecialchars($file['date']); ?></strong></td>
+                        <td><?php echo htmlspecialchars($file['profile']); ?></td>
                         <td><?php echo formatBytes($file['size']); ?></td>
+                        <td><?php echo $file['hits'] === null ? '—' : (int)$file['hits']; ?></td>
                         <td><?php echo formatAge($file['age']); ?></td>
-                        <td><?php echo date('Y-m-d H:i:s', $file['modified']); ?></td>
+                        <td><?php echo date('Y-m-d H:i:s', $file['last_use']); ?></td>
                         <td>
-                            <a href="/vis?date=<?php echo urlencode($file['date']); ?>" 
+                            <a href="/vis?date=<?php echo urlencode($file['date']); ?>&profile=<?php echo urlencode($file['profile']); ?>" 
                                class="btn" style="font-size: 0.9em; padding: 5px 10px;">View</a>
-                            <a href="/vis?date=<?php echo urlencode($file['date']); ?>&rebuild=1" 
+                            <a href="/vis?date=<?php echo urlencode($file['date']); ?>&profile=<?php echo urlencode($file['profile']); ?>&rebuild=1" 
                                class="btn" style="font-size: 0.9em; padding: 5px 10px;">Rebuild</a>
                             <a href="?action=delete&file=<?php echo urlencode($file['filename']); ?>" 
                                class="btn btn-danger" style="font-size: 0.9em; padding: 5px 10px;"
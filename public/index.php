@@ -7,6 +7,9 @@
 $dirFull = __DIR__ . '/images/annotated_full';
 $dirWall = __DIR__ . '/images/annotated_wall';
 $dirFav = __DIR__ . '/images/fav';
+$dirThumbs = __DIR__ . '/images/thumbs';
+$dsoInfoPath = __DIR__ . '/dso_watchlist_info.json';
+$manifestPath = __DIR__ . '/gallery_manifest.json';
 $extensions = ['jpg','jpeg','png','gif','webp'];
 
 function gatherImages($dir, $prefix, $extensions) {
@@ -23,17 +26,25 @@ function gatherImages($dir, $prefix, $extensions) {
     return array_values($images);
 }
 
-// Load DSO information
-$dsoInfoPath = __DIR__ . '/dso_watchlist_info.json';
-$dsoInfo = [];
-if (file_exists($dsoInfoPath)) {
-    $dsoInfo = json_decode(file_get_contents($dsoInfoPath), true) ?: [];
+/**
+ * Load the gallery manifest built by pythonscripts/gallery_manifest.py.
+ * Returns null if it is missing, unreadable, or older than any of its inputs
+ * (adding or removing an image, or editing the info file, bumps an mtime).
+ */
+function loadGalleryManifest($manifestPath, $inputs) {
+    if (!file_exists($manifestPath)) {
+        return null;
+    }
+    $manifestTime = filemtime($manifestPath);
+    foreach ($inputs as $input) {
+        if (file_exists($input) && filemtime($input) > $manifestTime) {
+            return null;
+        }
+    }
+    $manifest = json_decode(file_get_contents($manifestPath), true);
+    return is_array($manifest) && isset($manifest['galleryItems']) ? $manifest : null;
 }
 
-$fullImages = gatherImages($dirFull, 'images/annotated_full', $extensions);
-$wallImages = gatherImages($dirWall, 'images/annotated_wall', $extensions);
-$favImages = gatherImages($dirFav, 'images/fav', $extensions);
-
 /**
  * Extract DSO name from filename (new convention: scientific name at start, terminated by underscore)
  */
@@ -82,43 +93,60 @@ function getDSOInfo($dsoKey, $dsoInfo) {
     return null;
 }
 
-// Create gallery data
-$galleryItems = [];
-foreach ($fullImages as $imgPath) {
-    $filename = basename($imgPath);
-    $dsoKey = extractDSOName($filename);
-    $baseName = extractBaseName($filename);
-    $fullPath = $imgPath;
-    $wallpaperPath = str_replace('images/annotated_full', 'images/annotated_wall', $imgPath);
-    $wallpaperPath = str_replace('_full_annotated', '_wall_annotated', $wallpaperPath);
-    $favPath = str_replace('images/annotated_full', 'images/fav', $imgPath);
-    $favPath = str_replace('_full_annotated', '_fav', $favPath);
-    $info = getDSOInfo($dsoKey, $dsoInfo);
-    
-    if ($info && isset($info['CommonName'])) {
-        $displayName = $info['CommonName'];
-    } else {
-        $displayName = 'Unknown';
+$manifest = loadGalleryManifest($manifestPath, [$dirFull, $dirWall, $dirFav, $dirThumbs, $dsoInfoPath]);
+
+if ($manifest !== null) {
+    $fullImages = $manifest['fullImages'];
+    $wallImages = $manifest['wallImages'];
+    $galleryItems = $manifest['galleryItems'];
+} else {
+    // No usable manifest: scan the directories and join the info file here
+    $dsoInfo = [];
+    if (file_exists($dsoInfoPath)) {
+        $dsoInfo = json_decode(file_get_contents($dsoInfoPath), true) ?: [];
     }
-    
-    $thumbPath = 'images/thumbs/' . $baseName . '_thumb.jpg';
-    
-    $galleryItems[] = [
-        'filename' => $filename,
-        'baseName' => $baseName,
-        'fullPath' => $fullPath,
-        'favPath' => $favPath,
-        'thumbPath' => $thumbPath,
-        'wallpaperPath' => $wallpaperPath,
-        'displayName' => $displayName,
-        'dsoKey' => $dsoKey,
-        'info' => $info
-    ];
-}
 
-usort($galleryItems, function($a, $b) {
-    return strcmp($a['displayName'], $b['displayName']);
-});
+    $fullImages = gatherImages($dirFull, 'images/annotated_full', $extensions);
+    $wallImages = gatherImages($dirWall, 'images/annotated_wall', $extensions);
+
+    // Create gallery data
+    $galleryItems = [];
+    foreach ($fullImages as $imgPath) {
+        $filename = basename($imgPath);
+        $dsoKey = extractDSOName($filename);
+        $baseName = extractBaseName($filename);
+        $fullPath = $imgPath;
+        $wallpaperPath = str_replace('images/annotated_full', 'images/annotated_wall', $imgPath);
+        $wallpaperPath = str_replace('_full_annotated', '_wall_annotated', $wallpaperPath);
+        $favPath = str_replace('images/annotated_full', 'images/fav', $imgPath);
+        $favPath = str_replace('_full_annotated', '_fav', $favPath);
+        $info = getDSOInfo($dsoKey, $dsoInfo);
+
+        if ($info && isset($info['CommonName'])) {
+            $displayName = $info['CommonName'];
+        } else {
+            $displayName = 'Unknown';
+        }
+
+        $thumbPath = 'images/thumbs/' . $baseName . '_thumb.jpg';
+
+        $galleryItems[] = [
+            'filename' => $filename,
+            'baseName' => $baseName,
+            'fullPath' => $fullPath,
+            'favPath' => $favPath,
+            'thumbPath' => $thumbPath,
+            'wallpaperPath' => $wallpaperPath,
+            'displayName' => $displayName,
+            'dsoKey' => $dsoKey,
+            'info' => $info
+        ];
+    }
+
+    usort($galleryItems, function($a, $b) {
+        return strcmp($a['displayName'], $b['displayName']);
+    });
+}
 
 $fullJson = json_encode($fullImages);
 $wallJson = json_encode($wallImages);
@@ -3,6 +3,9 @@
  * DSO Visibility Report Handler with Caching
  * Route: /vis or /vis?date=YYYY-MM-DD
  * Force rebuild: /vis?rebuild=1 or /vis?date=YYYY-MM-DD&rebuild=1
+ * Variant: /vis?date=YYYY-MM-DD&min_duration=90&min_alt=30&az_min=90&az_max=200
+ * Part of the night: /vis?date=YYYY-MM-DD&window=23:00-02:00 (comma-separate several windows)
+ * Responses carry an ETag; a matching If-None-Match gets 304 Not Modified
  */
 
 // Set execution time limit (Python script may take 30-60 seconds)
@@ -31,6 +34,34 @@ if (!preg_match('/^\d{4}-\d{2}-\d{2}$/', $date)) {
     exit;
 }
 
+// Report variant thresholds (e.g. &min_duration=90&min_alt=30&az_min=90&az_max=200)
+// and time windows (&window=23:00-02:00), derived from the night's stored alt/az
+// tracks by visibility_cache.py
+$variantParams = ['min_duration' => '--min-duration', 'min_alt' => '--min-alt', 'az_min' => '--az-min', 'az_max' => '--az-max'];
+$variantArgs = [];
+foreach ($variantParams as $param => $flag) {
+    if (!isset($_GET[$param]) || $_GET[$param] === '') {
+        continue;
+    }
+    if (!is_numeric($_GET[$param])) {
+        http_response_code(400);
+        echo "<!DOCTYPE html><html><body><h1>Error</h1><p>Invalid " . htmlspecialchars($param) . " value. Use a number.</p></body></html>";
+        exit;
+    }
+    $variantArgs[] = $flag . ' ' . (float)$_GET[$param];
+}
+if (isset($_GET['window']) && $_GET['window'] !== '') {
+    foreach (explode(',', (string)$_GET['window']) as $window) {
+        $window = trim($window);
+        if (!preg_match('/^\d{1,2}:\d{2}-\d{1,2}:\d{2}$/', $window)) {
+            http_response_code(400);
+            echo "<!DOCTYPE html><html><body><h1>Error</h1><p>Invalid time window. Use HH:MM-HH:MM, e.g. 23:00-02:00</p></body></html>";
+            exit;
+        }
+        $variantArgs[] = '--window ' . $window;
+    }
+}
+
 // Cache directory setup
 $cacheDir = __DIR__ . DIRECTORY_SEPARATOR . 'cache';
 if (!is_dir($cacheDir)) {
@@ -42,14 +73,151 @@ if (!is_dir($cacheDir)) {
 
 // Cache file path (include profile in cache key)
 $cacheFile = $cacheDir . DIRECTORY_SEPARATOR . 'dso_report_' . $profile . '_' . $date . '.html';
+$cacheDataFile = $cacheDir . DIRECTORY_SEPARATOR . 'dso_report_' . $profile . '_' . $date . '.json';
+$cacheTrackFile = $cacheDir . DIRECTORY_SEPARATOR . 'dso_report_' . $profile . '_' . $date . '.tracks.bin';
+$cacheVisFile = $cacheDir . DIRECTORY_SEPARATOR . 'dso_report_' . $profile . '_' . $date . '.vis.npz';
 $cacheMaxAge = 86400; // 24 hours in seconds
 
+$cacheHitsLog = $cacheDir . DIRECTORY_SEPARATOR . 'hits.log';
+$cacheIndexFile = $cacheDir . DIRECTORY_SEPARATOR . 'index.json';
+
+$pythonDir = dirname(__DIR__) . DIRECTORY_SEPARATOR . 'pythonscripts';
+
+$reportName = 'dso_report_' . $profile . '_' . $date;
+// A past night's report does not change, so browsers may keep it for a week
+$isPastDate = $date < date('Y-m-d');
+$pageCacheControl = $isPastDate && !$forceRebuild ? 'public, max-age=604800' : 'no-cache';
+
+// Profiles listed by the date/profile controls injected into the page
+$profilesDir = dirname(__DIR__) . DIRECTORY_SEPARATOR . 'pythonscripts' . DIRECTORY_SEPARATOR . 'profiles';
+$availableProfiles = [];
+if (is_dir($profilesDir)) {
+    $profiles = array_diff(scandir($profilesDir), ['.', '..']);
+    foreach ($profiles as $p) {
+        if (is_file($profilesDir . DIRECTORY_SEPARATOR . $p) && pathinfo($p, PATHINFO_EXTENSION) === 'json') {
+            $availableProfiles[] = pathinfo($p, PATHINFO_FILENAME);
+        }
+    }
+}
+
+/**
+ * Content hash of a cached file (the ETag), from cache/index.json while the
+ * file's mtime and size still match what report_cache.py recorded there.
+ */
+function cachedEtag($indexFile, $name, $suffix, $file)
+{
+    static $index = null;
+    if ($index === null) {
+        $index = is_file($indexFile) ? json_decode((string)file_get_contents($indexFile), true) : [];
+    }
+    if (isset($index['entries'][$name]['etags'][$suffix])) {
+        $known = $index['entries'][$name]['etags'][$suffix];
+        if ($known['mtime'] === filemtime($file) && $known['bytes'] === filesize($file)) {
+            return $known['etag'];
+        }
+    }
+    return substr(hash_file('sha256', $file), 0, 16);
+}
+
+/**
+ * ETag of a report page: the stored page's content hash plus what this script
+ * adds to it (see report_cache.page_etag(), which report_server.py checks).
+ * The cache status is left out, as its wording changes between requests.
+ */
+function pageEtag($htmlEtag, $profiles, $variant, $visEtag)
+{
+    $key = implode("\n", [$htmlEtag, implode(',', $profiles), $variant, $visEtag]);
+    return 'W/"' . substr(hash('sha256', $key), 0, 16) . '"';
+}
+
+/**
+ * Whether the request's If-None-Match lists this ETag (weak comparison).
+ */
+function etagMatches($etag)
+{
+    if (!isset($_SERVER['HTTP_IF_NONE_MATCH'])) {
+        return false;
+    }
+    $header = trim((string)$_SERVER['HTTP_IF_NONE_MATCH']);
+    if ($header === '*') {
+        return true;
+    }
+    $strip = function ($tag) {
+        return preg_replace('/^W\//', '', trim($tag));
+    };
+    return in_array($strip($etag), array_map($strip, explode(',', $header)), true);
+}
+
+/**
+ * Send a cached file, using the .br/.gz sibling report_cache.py wrote when
+ * the client accepts that encoding and the sibling is current. Answers a
+ * matching If-None-Match with 304 Not Modified.
+ */
+function sendCachedFile($file, $etag, $cacheControl)
+{
+    $accept = isset($_SERVER['HTTP_ACCEPT_ENCODING']) ? (string)$_SERVER['HTTP_ACCEPT_ENCODING'] : '';
+    header('Vary: Accept-Encoding');
+    header('Cache-Control: ' . $cacheControl);
+    $encoding = null;
+    foreach (['br' => '.br', 'gzip' => '.gz'] as $name => $extension) {
+        $sibling = $file . $extension;
+        if (preg_match('/\b' . $name . '\b/i', $accept) && file_exists($sibling)
+            && filemtime($sibling) >= filemtime($file)) {
+            $encoding = $name;
+            $etag .= '-' . substr($extension, 1);
+            $file = $sibling;
+            break;
+        }
+    }
+    header('ETag: "' . $etag . '"');
+    if (etagMatches('"' . $etag . '"')) {
+        http_response_code(304);
+        return;
+    }
+    if ($encoding !== null) {
+        header('Content-Encoding: ' . $encoding);
+    }
+    header('Content-Length: ' . filesize($file));
+    readfile($file);
+}
+
+// Columnar table payload fetched by the report page (shared by every sort order)
+if (isset($_GET['format']) && $_GET['format'] === 'json') {
+    header('Content-Type: application/json; charset=utf-8');
+    if (!file_exists($cacheDataFile)) {
+        http_response_code(404);
+        echo json_encode(['error' => 'Report data not found']);
+        exit;
+    }
+    $etag = cachedEtag($cacheIndexFile, $reportName, '.json', $cacheDataFile);
+    // Report pages request the payload with its content hash as v=, so that URL never changes content
+    $versioned = isset($_GET['v']) && $_GET['v'] === $etag;
+    sendCachedFile($cacheDataFile, $etag,
+        $versioned ? 'public, max-age=31536000, immutable' : ($isPastDate ? 'public, max-age=604800' : 'no-cache'));
+    exit;
+}
+
+// Altitude/azimuth track sidecar (int16 array described by the payload's "tracks" entry)
+if (isset($_GET['format']) && $_GET['format'] === 'tracks') {
+    if (!file_exists($cacheTrackFile)) {
+        http_response_code(404);
+        exit;
+    }
+    header('Content-Type: application/octet-stream');
+    $etag = cachedEtag($cacheIndexFile, $reportName, '.tracks.bin', $cacheTrackFile);
+    $versioned = isset($_GET['v']) && $_GET['v'] === $etag;
+    sendCachedFile($cacheTrackFile, $etag,
+        $versioned ? 'public, max-age=31536000, immutable' : ($isPastDate ? 'public, max-age=604800' : 'no-cache'));
+    exit;
+}
+
 // Check if we should use cached version
 $useCache = false;
 $cacheAge = 0;
 if (!$forceRebuild && file_exists($cacheFile)) {
     $cacheAge = time() - filemtime($cacheFile);
-    if ($cacheAge < $cacheMaxAge) {
+    // Variants need the night's visibility cache, which older reports lack
+    if ($cacheAge < $cacheMaxAge && (!$variantArgs || file_exists($cacheVisFile))) {
         $useCache = true;
     }
 }
@@ -59,6 +227,18 @@ if ($useCache) {
     header('Content-Type: text/html; charset=utf-8');
     header('X-Cache-Status: HIT');
     header('X-Cache-Age: ' . round($cacheAge / 60) . ' minutes');
+    // Counted into cache/index.json by the next report_cache.py update
+    @file_put_contents($cacheHitsLog, $reportName . "\t" . time() . "\n", FILE_APPEND | LOCK_EX);
+    // The ETag comes from the index, so a revalidation is answered before the page is read
+    $htmlEtag = cachedEtag($cacheIndexFile, $reportName, '.html', $cacheFile);
+    $visEtag = $variantArgs ? cachedEtag($cacheIndexFile, $reportName, '.vis.npz', $cacheVisFile) : '';
+    $pageEtag = pageEtag($htmlEtag, $availableProfiles, implode(' ', $variantArgs), $visEtag);
+    if (etagMatches($pageEtag)) {
+        header('ETag: ' . $pageEtag);
+        header('Cache-Control: ' . $pageCacheControl);
+        http_response_code(304);
+        exit;
+    }
     $output = file_get_contents($cacheFile);
     // Will inject cache status footer below
 } else {
@@ -69,9 +249,35 @@ if ($forceRebuild) {
     header('X-Cache-Rebuild: FORCED');
 }
 
+// Python writes the report straight into the cache file (atomically) when it
+// can, so the page is not buffered through shell_exec as well
+$writeCache = is_dir($cacheDir) && is_writable($cacheDir);
+$generateStarted = time();
+$dataUrl = '?date=' . $date . '&profile=' . $profile . '&format=json';
+$trackUrl = '?date=' . $date . '&profile=' . $profile . '&format=tracks';
+
+// Variants are derived from the night's visibility cache; when the cache
+// directory is not writable it goes to a temporary file instead, removed when
+// the request ends
+$tempVisFile = null;
+if (!$writeCache && $variantArgs) {
+    $tempVisFile = tempnam(sys_get_temp_dir(), 'dso_vis_');
+    if ($tempVisFile === false) {
+        http_response_code(500);
+        echo "<!DOCTYPE html><html><body><h1>Error</h1><p>Cannot create a temporary visibility cache for the requested variant.</p></body></html>";
+        exit;
+    }
+    register_shutdown_function(function () use ($tempVisFile) {
+        @unlink($tempVisFile);
+    });
+    $cacheVisFile = $tempVisFile;
+}
+
 // Paths
-$pythonDir = dirname(__DIR__) . DIRECTORY_SEPARATOR . 'pythonscripts';
 $pythonScript = $pythonDir . DIRECTORY_SEPARATOR . 'todays_dsos_web.py';
+// Unified catalog built by dso_catalog.py; without it objects are resolved from the Google Sheet
+$catalogFile = $pythonDir . DIRECTORY_SEPARATOR . 'data' . DIRECTORY_SEPARATOR . 'dso_catalog.npz';
+$useCatalog = file_exists($catalogFile);
 if (!file_exists($pythonScript)) {
     http_response_code(500);
     echo "<!DOCTYPE html><html><body><h1>Error</h1><p>Python script not found at: $pythonScript</p><p>OS: " . PHP_OS . "</p></body></html>";
@@ -88,11 +294,22 @@ if (strtoupper(substr(PHP_OS, 0, 3)) === 'WIN') {
         echo "<!DOCTYPE html><html><body><h1>Error</h1><p>Python executable not found at: $pythonExe</p><p>OS: " . PHP_OS . "</p></body></html>";
         exit;
     }
-    $command = sprintf('"%s" "%s" --date %s --profile %s 2>&1', $pythonExe, $pythonScript, $date, $profile);
-    $output = shell_exec($command);
+    $outputArg = $writeCache
+        ? sprintf(' --output "%s" --data-output "%s" --data-url "%s" --track-output "%s" --track-url "%s" --visibility-output "%s"',
+            $cacheFile, $cacheDataFile, $dataUrl, $cacheTrackFile, $trackUrl, $cacheVisFile)
+        : '';
+    if ($tempVisFile !== null) {
+        $outputArg .= sprintf(' --visibility-output "%s"', $tempVisFile);
+    }
+    if ($useCatalog) {
+        $outputArg .= sprintf(' --catalog "%s"', $catalogFile);
+    }
+    $outputArg .= ' --schedule';
+    $command = sprintf('"%s" "%s" --date %s --profile %s%s 2>&1', $pythonExe, $pythonScript, $date, $profile, $outputArg);
+    $output = (string)shell_exec($command);
 
     // Check if we got output
-    if ($output === null || trim($output) === '') {
+    if (!$writeCache && trim($output) === '') {
         http_response_code(500);
         echo "<!DOCTYPE html><html><body><h1>Error</h1><p>No output from Python script. Command: <pre>" . htmlspecialchars($command) . "</pre></p></body></html>";
         exit;
@@ -121,16 +338,26 @@ if (strtoupper(substr(PHP_OS, 0, 3)) === 'WIN') {
 
     // Build command that activates venv and runs Python script
     $command = sprintf(
-        'bash -c "source %s && python %s --date %s --profile %s" 2>&1',
+        'bash -c "source %s && python %s --date %s --profile %s --schedule%s%s%s" 2>&1',
         escapeshellarg($activateScript),
         escapeshellarg($pythonScript),
         escapeshellarg($date),
-        escapeshellarg($profile)
+        escapeshellarg($profile),
+        $writeCache
+            ? ' --output ' . escapeshellarg($cacheFile)
+                . ' --data-output ' . escapeshellarg($cacheDataFile)
+                . ' --data-url ' . escapeshellarg($dataUrl)
+                . ' --track-output ' . escapeshellarg($cacheTrackFile)
+                . ' --track-url ' . escapeshellarg($trackUrl)
+                . ' --visibility-output ' . escapeshellarg($cacheVisFile)
+            : '',
+        $tempVisFile !== null ? ' --visibility-output ' . escapeshellarg($tempVisFile) : '',
+        $useCatalog ? ' --catalog ' . escapeshellarg($catalogFile) : ''
     );
 
-    $output = shell_exec($command);
+    $output = (string)shell_exec($command);
 
-    if ($output === null || trim($output) === '') {
+    if (!$writeCache && trim($output) === '') {
         http_response_code(500);
         echo "<!DOCTYPE html><html><body><h1>Error</h1><p>No output from Python script.</p><p>Command: <pre>" . htmlspecialchars($command) . "</pre></p></body></html>";
         exit;
@@ -144,13 +371,81 @@ if (strtoupper(substr(PHP_OS, 0, 3)) === 'WIN') {
     }
 }
 
-    // Cache the output if we have a valid cache directory
-    if (is_dir($cacheDir) && is_writable($cacheDir)) {
-        if (file_put_contents($cacheFile, $output) === false) {
-            error_log("Failed to write cache file: $cacheFile");
-            // Continue anyway, just without caching
+    // Read back the report Python wrote into the cache
+    if ($writeCache) {
+        clearstatcache(true, $cacheFile);
+        if (!file_exists($cacheFile) || filemtime($cacheFile) < $generateStarted) {
+            http_response_code(500);
+            echo "<!DOCTYPE html><html><body><h1>Error</h1><p>Report was not generated.</p><pre>" . htmlspecialchars($output) . "</pre></body></html>";
+            exit;
+        }
+        $output = file_get_contents($cacheFile);
+
+        // Compress the new files, record the report in cache/index.json and
+        // evict least recently used reports over the cache budget
+        $maintainScript = $pythonDir . DIRECTORY_SEPARATOR . 'report_cache.py';
+        if (strtoupper(substr(PHP_OS, 0, 3)) === 'WIN') {
+            $command = sprintf('"%s" "%s" add %s --profile %s --date %s%s 2>&1', $pythonExe, $maintainScript,
+                $reportName, $profile, $date, $useCatalog ? sprintf(' --catalog "%s"', $catalogFile) : '');
+        } else {
+            $command = sprintf(
+                'bash -c "source %s && python %s add %s --profile %s --date %s%s" 2>&1',
+                escapeshellarg($activateScript),
+                escapeshellarg($maintainScript),
+                escapeshellarg($reportName),
+                escapeshellarg($profile),
+                escapeshellarg($date),
+                $useCatalog ? ' --catalog ' . escapeshellarg($catalogFile) : ''
+            );
+        }
+        $maintainOutput = (string)shell_exec($command);
+        if (strpos($maintainOutput, '"success": true') === false) {
+            error_log('report_cache.py failed: ' . $maintainOutput);
         }
     }
+
+    // Content hash of the page as generated: from the index report_cache.py
+    // just updated, or of the output itself when it was not cached
+    $htmlEtag = $writeCache ? cachedEtag($cacheIndexFile, $reportName, '.html', $cacheFile)
+        : substr(hash('sha256', $output), 0, 16);
+}
+
+// Replace the report with the requested variant, derived from the cached night
+if ($variantArgs) {
+    clearstatcache(true, $cacheVisFile);
+    if (!file_exists($cacheVisFile) || filesize($cacheVisFile) === 0) {
+        http_response_code(500);
+        echo "<!DOCTYPE html><html><body><h1>Error</h1><p>The night's visibility cache was not written, so the requested thresholds cannot be applied.</p><pre>" . htmlspecialchars($output) . "</pre></body></html>";
+        exit;
+    }
+    if (!$useCache) {
+        $visEtag = $tempVisFile !== null ? substr(hash_file('sha256', $cacheVisFile), 0, 16)
+            : cachedEtag($cacheIndexFile, $reportName, '.vis.npz', $cacheVisFile);
+    }
+    $queryScript = $pythonDir . DIRECTORY_SEPARATOR . 'visibility_cache.py';
+    $queryArgs = ' ' . implode(' ', $variantArgs) . ' --schedule';
+    if (strtoupper(substr(PHP_OS, 0, 3)) === 'WIN') {
+        $ds = DIRECTORY_SEPARATOR;
+        $pythonExe = $pythonDir . $ds . 'venv' . $ds . 'Scripts' . $ds . 'python.exe';
+        $command = sprintf('"%s" "%s" "%s"%s 2>&1', $pythonExe, $queryScript, $cacheVisFile, $queryArgs);
+    } else {
+        $command = sprintf(
+            'bash -c "source %s && python %s %s%s" 2>&1',
+            escapeshellarg($pythonDir . '/venv/bin/activate'),
+            escapeshellarg($queryScript),
+            escapeshellarg($cacheVisFile),
+            $queryArgs
+        );
+    }
+
+    $variantOutput = (string)shell_exec($command);
+    if (stripos($variantOutput, 'Traceback') !== false || stripos($variantOutput, '<p>Error:') !== false) {
+        http_response_code(500);
+        echo "<!DOCTYPE html><html><body><h1>Python Error</h1><pre>" . htmlspecialchars($variantOutput) . "</pre></body></html>";
+        exit;
+    }
+    header('X-Report-Variant: ' . implode(' ', $variantArgs));
+    $output = $variantOutput;
 }
 
 // Add cache status footer to output
@@ -189,18 +484,6 @@ if ($profile !== 'default') {
     $output = str_replace('</body>', $profileInfo . '</body>', $output);
 }
 
-// Get list of available profiles
-$profilesDir = dirname(__DIR__) . DIRECTORY_SEPARATOR . 'pythonscripts' . DIRECTORY_SEPARATOR . 'profiles';
-$availableProfiles = [];
-if (is_dir($profilesDir)) {
-    $profiles = array_diff(scandir($profilesDir), ['.', '..']);
-    foreach ($profiles as $p) {
-        if (is_file($profilesDir . DIRECTORY_SEPARATOR . $p) && pathinfo($p, PATHINFO_EXTENSION) === 'json') {
-            $availableProfiles[] = pathinfo($p, PATHINFO_FILENAME);
-        }
-    }
-}
-
 // Build profile options HTML
 $profileOptions = '';
 foreach ($availableProfiles as $p) {
@@ -263,12 +546,23 @@ $output = preg_replace(
     1
 );
 
+// A hit already has its ETag; a regenerated page that did not change still revalidates
+if (!$useCache) {
+    $pageEtag = pageEtag($htmlEtag, $availableProfiles, implode(' ', $variantArgs), $variantArgs ? $visEtag : '');
+}
+
 // Inject cache status before closing body tag
 $output = str_replace('</body>', $cacheStatus . '</body>', $output);
 
 
 // Set content type to HTML
 header('Content-Type: text/html; charset=utf-8');
+header('ETag: ' . $pageEtag);
+header('Cache-Control: ' . $pageCacheControl);
+if (etagMatches($pageEtag)) {
+    http_response_code(304);
+    exit;
+}
 
 // Output the HTML from Python script
 echo $output;
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Multi-night campaign planner.
+
+Given per-object integration goals (hours) and a date range, plans each night's
+imaging blocks so that as many goals as possible finish as early as possible.
+
+Per-night visibility windows (first/last visible minute per object, plus Moon
+illumination and separation when the kernel has the Moon) are computed once
+and cached in <data dir>/nights/<profile>_<date>.npz. Planning and replanning
+only read that cache, so replanning a 90-night horizon does no ephemeris work.
+When several nights are missing, one sidereal day is evaluated exactly and the
+nights are predicted from it (night_series.py), refining only near crossings.
+
+Each night is scheduled with session_scheduler.schedule(). Object weights
+favor goals that are nearly complete and goals whose remaining visible time
+over the horizon is short compared with what they still need. Blocks are
+capped at the time an object still needs.
+
+Plans are JSON. 'replan' re-plans from a date onward (by default the first
+night marked lost) and keeps earlier nights as planned. Those nights count
+as imaged.
+"""
+import argparse
+import datetime
+import json
+import math
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from zoneinfo import ZoneInfo
+from skyfield.api import Topos
+from skyfield import almanac
+import dso_info
+import ephemeris_data
+import night_series
+import session_scheduler
+from profile_manager import load_profile
+from todays_dsos_web import clock_minutes, evaluate_targets, get_viewing_window, load_targets
+
+NIGHT_CACHE_DIR = 'nights'
+NIGHT_CACHE_VERSION = 1
+
+# Campaign scheduling: coarser grid than a single-night session keeps
+# replanning interactive
+STEP = 30
+
+# Nights missing from the cache before they are predicted from a reference
+# day (which costs about two nights) instead of evaluated one by one
+INCREMENTAL_NIGHTS = 4
+
+# Moon constraint: required separation grows linearly with illumination
+# (MOON_MIN_SEPARATION degrees at full Moon, none at new Moon)
+MOON_MIN_SEPARATION = 60.0
+
+
+def night_cache_path(profile_name, target_date):
+    return ephemeris_data.DATA_DIR / NIGHT_CACHE_DIR / f'{profile_name}_{target_date.isoformat()}.npz'
+
+
+def moon_state(eph, observer_pos, t, ra_deg, dec_deg):
+    """
+    Moon illumination and per-target separation at time t.
+
+    Returns:
+        (illumination 0..1, separation degrees array), or (nan, nan array)
+        if the kernel has no Moon segment covering t
+    """
+    nan = np.full(len(ra_deg), np.nan, dtype=np.float32)
+    if ephemeris_data.check_coverage(eph, t.tdb, t.tdb, bodies=ephemeris_data.MOON_BODIES):
+        return float('nan'), nan
+    moon = eph['moon']
+    illumination = float(almanac.fraction_illuminated(eph, 'moon', t))
+    moon_ra, moon_dec, _ = observer_pos.at(t).observe(moon).radec()
+    ra1, dec1 = np.radians(ra_deg), np.radians(dec_deg)
+    ra2, dec2 = moon_ra.radians, moon_dec.radians
+    cos_sep = np.sin(dec1) * np.sin(dec2) + np.cos(dec1) * np.cos(dec2) * np.cos(ra1 - ra2)
+    return illumination, np.degrees(np.arccos(np.clip(cos_sep, -1, 1))).astype(np.float32)
+
+
+def compute_night(target_date, profile, names, ra_deg, dec_deg, ts, eph, reference=None):
+    """
+    Visibility windows of every target for one night.
+
+    With a night_series.reference_day() result the windows are predicted from
+    it (same result, far fewer Skyfield evaluations).
+
+    Returns:
+        dict of arrays: names, start_minutes/end_minutes (int16 report clock
+        minutes, -1 when not visible), moon_separation (float32 degrees),
+        moon_illumination, window (start, end clock minutes) and criteria
+    """
+    criteria = np.array([profile['min_altitude'], profile['az_min'], profile['az_max']], dtype=np.float64)
+    night = {
+        'names': np.array(names, dtype=str),
+        'start_minutes': np.full(len(names), -1, dtype=np.int16),
+        'end_minutes': np.full(len(names), -1, dtype=np.int16),
+        'moon_separation': np.full(len(names), np.nan, dtype=np.float32),
+        'moon_illumination': np.float64(np.nan),
+        'window': np.array([-1, -1], dtype=np.int16),
+        'criteria': criteria,
+    }
+
+    observer = Topos(profile['latitude'], profile['longitude'])
+    viewing_start, viewing_end = get_viewing_window(target_date, ts, eph, observer)
+    if viewing_start is None or viewing_end is None:
+        return night
+
+    tz = ZoneInfo(profile['timezone'])
+    duration_minutes = int((viewing_end.utc_datetime() - viewing_start.utc_datetime()).total_seconds() / 60)
+    time_range = ts.linspace(viewing_start, viewing_end, duration_minutes)
+    observer_pos = eph['earth'] + observer
+    observer_at = observer_pos.at(time_range)
+    if reference is None:
+        indices, _, _ = evaluate_targets(observer_at, ra_deg, dec_deg, *criteria)
+    else:
+        indices, _ = night_series.evaluate_night(reference, observer_at, ra_deg, dec_deg, eph, observer_pos)
+
+    sample_minutes = np.array([clock_minutes(t) for t in time_range.astimezone(tz)], dtype=np.int16)
+    visible = indices[:, 0] >= 0
+    night['start_minutes'][visible] = sample_minutes[indices[visible, 0]]
+    night['end_minutes'][visible] = sample_minutes[indices[visible, 1]]
+    night['window'] = sample_minutes[[0, -1]]
+    illumination, separation = moon_state(eph, observer_pos, time_range[len(time_range) // 2], ra_deg, dec_deg)
+    night['moon_illumination'] = np.float64(illumination)
+    night['moon_separation'] = separation
+    return night
+
+
+def load_night(path, names, criteria):
+    """Cached night, or None if missing or built for other targets or criteria."""
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            night = {key: npz[key] for key in npz.files}
+    except (OSError, ValueError):
+        return None
+    if (int(night.pop('version', 0)) != NIGHT_CACHE_VERSION
+            or night['names'].tolist() != list(names)
+            or not np.array_equal(night['criteria'], criteria)):
+        return None
+    return night
+
+
+def save_night(path, night):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.stem}.tmp.npz')
+    np.savez(tmp, version=np.int32(NIGHT_CACHE_VERSION), **night)
+    tmp.replace(path)
+
+
+def cached_names(path):
+    """Target names stored in a night cache file, or None."""
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            return npz['names'].tolist()
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def night_windows(profile_name, dates, catalog_path=None, log=None, exact=False):
+    """
+    Per-night visibility windows for each date, from the cache where possible.
+
+    Targets and the ephemeris are only loaded if some night is missing from the
+    cache or was built for a different target list. With INCREMENTAL_NIGHTS or
+    more missing nights they are predicted from a reference day unless exact.
+
+    Returns:
+        {date: night dict from compute_night()}, all with the same target list
+    """
+    profile = load_profile(profile_name)
+    criteria = np.array([profile['min_altitude'], profile['az_min'], profile['az_max']], dtype=np.float64)
+    paths = {target_date: night_cache_path(profile_name, target_date) for target_date in dates}
+
+    # Cache-only pass: every night must agree on the target list
+    nights = {}
+    names = cached_names(paths[dates[0]])
+    for target_date in dates:
+        night = load_night(paths[target_date], names, criteria) if names else None
+        if night is None:
+            break
+        nights[target_date] = night
+    else:
+        return nights
+
+    rows, ra_deg, dec_deg = load_targets([] if log is None else log, catalog_path)
+    names = [row['name'] for row in rows]
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    nights = {target_date: load_night(paths[target_date], names, criteria) for target_date in dates}
+    missing = [target_date for target_date, night in nights.items() if night is None]
+    reference = None
+    if not exact and len(missing) >= INCREMENTAL_NIGHTS:
+        reference = night_series.reference_day(missing[0], profile, ra_deg, dec_deg, ts, eph)
+    for target_date in missing:
+        nights[target_date] = compute_night(target_date, profile, names, ra_deg, dec_deg, ts, eph, reference)
+        save_night(paths[target_date], nights[target_date])
+    return nights
+
+
+def available(night, index, min_block):
+    """Window (start, end) of target index on a night, or None if unusable."""
+    start, end = int(night['start_minutes'][index]), int(night['end_minutes'][index])
+    if start < 0 or end - start < min_block:
+        return None
+    illumination = float(night['moon_illumination'])
+    separation = float(night['moon_separation'][index])
+    if not math.isnan(illumination) and not math.isnan(separation):
+        if separation < MOON_MIN_SEPARATION * illumination:
+            return None
+    return start, end
+
+
+def match_goals(goals, names):
+    """
+    Map goal names to target indices.
+
+    Goals may use any designation or name the info file knows ('IC 405',
+    'ic405', 'Orion Nebula' for a watchlist 'M42').
+
+    Returns:
+        (matched {index: hours}, unmatched names)
+    """
+    aliases, _ = dso_info.build_alias_index(dso_info.load_info())
+    index = {}
+    for i, name in enumerate(names):
+        index.setdefault(dso_info.normalize_name(name), i)
+        if aliases.get(dso_info.normalize_name(name)):
+            index.setdefault(dso_info.normalize_name(aliases[dso_info.normalize_name(name)]), i)
+    matched = {}
+    unmatched = []
+    for name, hours in goals.items():
+        normalized = dso_info.normalize_name(name)
+        i = index.get(normalized, index.get(dso_info.normalize_name(aliases.get(normalized, ''))))
+        if i is None:
+            unmatched.append(name)
+        else:
+            matched[i] = float(hours)
+    return matched, unmatched
+
+
+def plan_nights(nights, dates, goal_minutes, done_minutes, lost=(), min_block=session_scheduler.MIN_BLOCK,
+                max_block=session_scheduler.MAX_BLOCK, overhead=session_scheduler.SLEW_OVERHEAD, step=STEP):
+    """
+    Plan imaging blocks night by night.
+
+    Args:
+        nights: {date: night} from night_windows()
+        dates: Dates to plan, in order
+        goal_minutes: {target index: goal minutes}
+        done_minutes: {target index: minutes already imaged}
+        lost: Dates to skip (weather)
+
+    Returns:
+        (plan, remaining) where plan is [{date, lost, blocks}] and remaining is
+        {target index: minutes still needed after the last date}
+    """
+    targets = sorted(goal_minutes)
+    remaining = {i: max(0.0, goal_minutes[i] - done_minutes.get(i, 0.0)) for i in targets}
+    lost = set(lost)
+
+    # Usable minutes per target per night, and what is left from each night on
+    usable = np.zeros((len(targets), len(dates)))
+    for n, target_date in enumerate(dates):
+        if target_date in lost:
+            continue
+        for k, i in enumerate(targets):
+            window = available(nights[target_date], i, min_block)
+            if window:
+                usable[k, n] = window[1] - window[0]
+    future = np.cumsum(usable[:, ::-1], axis=1)[:, ::-1]
+
+    plan = []
+    for n, target_date in enumerate(dates):
+        night = nights[target_date]
+        if target_date in lost:
+            plan.append({'date': target_date.isoformat(), 'lost': True, 'blocks': []})
+            continue
+
+        objects = []
+        for k, i in enumerate(targets):
+            need = remaining[i]
+            window = available(night, i, min_block) if need > 0 else None
+            if window is None:
+                continue
+            # Nearly finished goals first; boost goals at risk of running out of nights
+            at_risk = need / future[k, n] if future[k, n] else 1.0
+            objects.append({
+                'name': str(night['names'][i]),
+                'start_minutes': window[0],
+                'end_minutes': window[1],
+                'weight': (1.0 + at_risk) / max(need, min_block),
+                'max_minutes': math.ceil(need),
+                'target': i,
+            })
+
+        blocks = session_scheduler.schedule(objects, min_block, max_block, step, overhead)
+        for block in blocks:
+            target = objects[block.pop('index')]['target']
+            block.pop('aka')
+            remaining[target] = max(0.0, remaining[target] - block['minutes'])
+            block['remaining_hours'] = round(remaining[target] / 60, 2)
+        plan.append({'date': target_date.isoformat(), 'lost': False, 'blocks': blocks})
+
+    return plan, remaining
+
+
+def build_plan(profile_name, start_date, count, goals, done=None, lost=(), catalog_path=None,
+               settings=None, nights=None, exact=False):
+    """
+    Plan a campaign from start_date for count nights.
+
+    Args:
+        goals: {target name: goal hours}
+        done: {target name: hours already imaged}
+        lost: Dates to skip
+        settings: dict of min_block, max_block, overhead, step overrides
+        nights: Preloaded {date: night} (otherwise read from the cache)
+        exact: Evaluate missing nights one by one instead of incrementally
+
+    Returns:
+        Plan dict (JSON-serializable)
+    """
+    settings = dict({'min_block': session_scheduler.MIN_BLOCK, 'max_block': session_scheduler.MAX_BLOCK,
+                     'overhead': session_scheduler.SLEW_OVERHEAD, 'step': STEP}, **(settings or {}))
+    dates = [start_date + datetime.timedelta(days=d) for d in range(count)]
+    log = []
+    if nights is None:
+        nights = night_windows(profile_name, dates, catalog_path, log, exact)
+    names = nights[dates[0]]['names'].tolist()
+
+    goal_targets, unmatched = match_goals(goals, names)
+    done_targets, _ = match_goals(done or {}, names)
+    goal_minutes = {i: hours * 60 for i, hours in goal_targets.items()}
+    done_minutes = {i: hours * 60 for i, hours in done_targets.items()}
+
+    plan, remaining = plan_nights(nights, dates, goal_minutes, done_minutes, lost, **settings)
+
+    completed = {}
+    for night in plan:
+        for block in night['blocks']:
+            if block['remaining_hours'] == 0 and block['name'] not in completed:
+                completed[block['name']] = night['date']
+
+    return {
+        'profile': profile_name,
+        'start': start_date.isoformat(),
+        'nights': plan,
+        'settings': settings,
+        'goals': goals,
+        'done': done or {},
+        'catalog': str(catalog_path) if catalog_path else None,
+        'completed': completed,
+        'remaining_hours': {names[i]: round(minutes / 60, 2) for i, minutes in remaining.items() if minutes > 0},
+        'unmatched_goals': unmatched,
+        'log': log,
+    }
+
+
+def replan(plan, lost=(), from_date=None):
+    """
+    Re-plan an existing campaign after nights are lost.
+
+    Nights before from_date (default: the earliest newly lost night) are kept
+    and their blocks counted as imaged; later nights are planned again.
+
+    Returns:
+        New plan dict
+    """
+    lost = {datetime.date.fromisoformat(d) if isinstance(d, str) else d for d in lost}
+    lost |= {datetime.date.fromisoformat(night['date']) for night in plan['nights'] if night['lost']}
+    start = datetime.date.fromisoformat(plan['start'])
+    end = datetime.date.fromisoformat(plan['nights'][-1]['date'])
+    if from_date is None:
+        from_date = min(lost) if lost else start
+
+    kept = [night for night in plan['nights'] if datetime.date.fromisoformat(night['date']) < from_date]
+    done = dict(plan['done'])
+    for night in kept:
+        for block in night['blocks']:
+            done[block['name']] = done.get(block['name'], 0.0) + block['minutes'] / 60
+
+    count = (end - from_date).days + 1
+    new_plan = build_plan(plan['profile'], from_date, count, plan['goals'], done,
+                          {d for d in lost if d >= from_date}, plan.get('catalog'), plan['settings'])
+    new_plan['start'] = plan['start']
+    new_plan['done'] = plan['done']
+    new_plan['nights'] = kept + new_plan['nights']
+    for night in kept:
+        for block in night['blocks']:
+            if block['remaining_hours'] == 0:
+                new_plan['completed'].setdefault(block['name'], night['date'])
+    return new_plan
+
+
+def benchmark(targets, count, seed=0):
+    """Plan random windows for `targets` objects over `count` nights; returns seconds."""
+    rng = np.random.default_rng(seed)
+    dates = [datetime.date(2025, 1, 1) + datetime.timedelta(days=d) for d in range(count)]
+    names = np.array([f'OBJ{i}' for i in range(targets)])
+    base = rng.integers(1150, 1800, targets)
+    nights = {}
+    for n, target_date in enumerate(dates):
+        start = (base - 4 * n) % 700 + 1150
+        end = np.minimum(start + rng.integers(0, 400, targets), 1900)
+        nights[target_date] = {
+            'names': names,
+            'start_minutes': start.astype(np.int16),
+            'end_minutes': end.astype(np.int16),
+            'moon_separation': rng.uniform(0, 180, targets).astype(np.float32),
+            'moon_illumination': np.float64(abs(math.cos(math.pi * n / 29.5))),
+        }
+    goals = {name: float(rng.uniform(6, 20)) for name in names}
+    t0 = time.perf_counter()
+    plan = build_plan('benchmark', dates[0], count, goals, nights=nights)
+    return time.perf_counter() - t0, plan
+
+
+def parse_hours(pairs):
+    """['NGC7000=12', ...] -> {'NGC7000': 12.0}"""
+    result = {}
+    for pair in pairs or []:
+        name, _, hours = pair.rpartition('=')
+        result[name] = float(hours)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan multi-night imaging campaigns')
+    parser.add_argument('--data-dir', help='Data directory (default: $DSO_DATA_DIR or pythonscripts/data)')
+    parser.add_argument('--ephemeris', help='Kernel file name inside the data directory')
+    parser.add_argument('--offline', action='store_true', default=None, help='Never download ephemeris files')
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    plan_parser = subparsers.add_parser('plan', help='Plan a campaign')
+    plan_parser.add_argument('goals', help='JSON file of {"target": goal hours}')
+    plan_parser.add_argument('--profile', default='default', help='Profile name (default: default)')
+    plan_parser.add_argument('--start', help='First night YYYY-MM-DD (default: today)')
+    plan_parser.add_argument('--nights', type=int, default=30, help='Number of nights (default: 30)')
+    plan_parser.add_argument('--done', nargs='*', metavar='TARGET=HOURS', help='Integration already collected')
+    plan_parser.add_argument('--catalog', help='Load targets from a dso_catalog.py catalog')
+    plan_parser.add_argument('--min-block', type=int, default=session_scheduler.MIN_BLOCK)
+    plan_parser.add_argument('--max-block', type=int, default=session_scheduler.MAX_BLOCK)
+    plan_parser.add_argument('--overhead', type=int, default=session_scheduler.SLEW_OVERHEAD)
+    plan_parser.add_argument('--output', help='Write the plan here instead of stdout')
+    plan_parser.add_argument('--exact', action='store_true',
+                             help='Evaluate every missing night in full instead of from a reference day')
+
+    replan_parser = subparsers.add_parser('replan', help='Re-plan after losing nights')
+    replan_parser.add_argument('plan', help='Plan JSON from "plan"; rewritten in place unless --output')
+    replan_parser.add_argument('--lost', nargs='*', default=[], metavar='YYYY-MM-DD', help='Nights lost to weather')
+    replan_parser.add_argument('--from', dest='from_date', help='Re-plan from this night (default: first lost)')
+    replan_parser.add_argument('--output', help='Write the new plan here')
+
+    bench_parser = subparsers.add_parser('benchmark', help='Time planning with random windows')
+    bench_parser.add_argument('--targets', type=int, default=300)
+    bench_parser.add_argument('--nights', type=int, default=90)
+
+    args = parser.parse_args()
+    ephemeris_data.configure(args.data_dir, args.ephemeris, args.offline)
+
+    def write_plan(plan, output):
+        text = json.dumps(plan, indent=2)
+        if output:
+            tmp = Path(output).with_name(Path(output).name + '.tmp')
+            tmp.write_text(text, encoding='utf-8')
+            tmp.replace(output)
+            print(json.dumps({'success': True, 'output': output, 'completed': len(plan['completed']),
+                              'remaining': len(plan['remaining_hours'])}))
+        else:
+            print(text)
+
+    try:
+        if args.command == 'plan':
+            with open(args.goals, 'r', encoding='utf-8') as f:
+                goals = json.load(f)
+            start = datetime.date.fromisoformat(args.start) if args.start else datetime.date.today()
+            settings = {'min_block': args.min_block, 'max_block': args.max_block, 'overhead': args.overhead}
+            write_plan(build_plan(args.profile, start, args.nights, goals, parse_hours(args.done), (),
+                                  args.catalog, settings, exact=args.exact), args.output)
+        elif args.command == 'replan':
+            with open(args.plan, 'r', encoding='utf-8') as f:
+                plan = json.load(f)
+            from_date = datetime.date.fromisoformat(args.from_date) if args.from_date else None
+            write_plan(replan(plan, args.lost, from_date), args.output or args.plan)
+        elif args.command == 'benchmark':
+            elapsed, plan = benchmark(args.targets, args.nights)
+            print(json.dumps({'targets': args.targets, 'nights': args.nights, 'seconds': round(elapsed, 3),
+                              'completed': len(plan['completed'])}, indent=2))
+        else:
+            parser.print_help()
+            sys.exit(1)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
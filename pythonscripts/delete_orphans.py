@@ -7,102 +7,148 @@ in all 6 image directories (fav, full, wall, annotated_fav, annotated_full, anno
 
 A complete set requires all 6 versions of an image to exist.
 Orphans are files that exist in some directories but not all 6.
+
+Directory listings are kept in an incremental index (see image_index.py), so
+repeat runs only re-list directories that changed. For cron, use
+--dry-run/--yes with --json for a non-interactive JSON report.
 """
 
+import argparse
+import json
 import os
 import sys
 from pathlib import Path
 from collections import defaultdict
+from image_index import BASE_PATH, DIRECTORIES, refresh_index, image_sets, file_path, scan_directory
 
-# Configuration
-BASE_PATH = Path(r"C:\laragon7\www\astro\public\images")
 
-# Directory names and their corresponding filename suffixes
-DIRECTORIES = {
-    "fav": "_fav",
-    "full": "_full",
-    "wall": "_wall",
-    "annotated_fav": "_fav_annotated",
-    "annotated_full": "_full_annotated",
-    "annotated_wall": "_wall_annotated",
-}
+def find_orphans(base_path: Path, full: bool = False) -> tuple[dict, set[str], list[tuple[str, str, str]]]:
+    """
+    Refresh the image index and split it into complete sets and orphan files.
 
-VALID_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+    Returns:
+        (manifest, master_list, orphans) where master_list holds base names present
+        in all 6 directories and orphans is a sorted list of (base_name, dir_name, filepath)
+    """
+    manifest = refresh_index(base_path, full=full)
+    sets = image_sets(manifest)
+    all_dir_names = set(DIRECTORIES.keys())
 
+    master_list = {base_name for base_name, dirs in sets.items() if set(dirs) == all_dir_names}
 
-def extract_base_name(filename: str, suffix: str) -> str | None:
-    """
-    Extract the base name from a filename by removing the suffix and extension.
-    
-    Example: "M31_20250113_fav.jpg" with suffix "_fav" -> "M31_20250113"
-    """
-    path = Path(filename)
-    
-    # Check if valid image extension
-    if path.suffix.lower() not in VALID_EXTENSIONS:
-        return None
-    
-    # Remove extension first
-    name_without_ext = path.stem
-    
-    # Check if the name ends with the expected suffix
-    if not name_without_ext.endswith(suffix):
-        return None
-    
-    # Remove the suffix to get base name
-    base_name = name_without_ext[: -len(suffix)]
-    
-    return base_name if base_name else None
+    orphans = [
+        (base_name, dir_name, str(file_path(base_path, dir_name, entry)))
+        for base_name, dirs in sets.items() if base_name not in master_list
+        for dir_name, entry in dirs.items()
+    ]
+    orphans.sort(key=lambda x: (x[0], x[1]))
+    return manifest, master_list, orphans
 
 
-def scan_directory(dir_path: Path, suffix: str) -> dict[str, str]:
+def confirm_orphans(base_path: Path,
+                    orphans: list[tuple[str, str, str]]) -> tuple[list[tuple[str, str, str]], list[str]]:
     """
-    Scan a directory and return a dict mapping base_name -> full_filepath.
+    Re-check on disk that each orphan's missing variants really are missing.
+
+    The index only re-lists directories whose mtime changed, so a variant that
+    appeared without changing its directory's mtime (a copy preserving
+    timestamps, a coarse filesystem clock) is still listed as missing. Every
+    directory holding a missing variant is re-listed before anything is deleted.
+
+    Returns:
+        (orphans, completed) where orphans are those still incomplete on disk and
+        completed names the base names found to have all 6 versions after all
     """
-    files = {}
-    
-    if not dir_path.exists():
-        print(f"  Warning: Directory does not exist: {dir_path}")
-        return files
-    
-    for entry in dir_path.iterdir():
-        if entry.is_file():
-            base_name = extract_base_name(entry.name, suffix)
-            if base_name:
-                files[base_name] = str(entry)
-    
-    return files
+    all_dir_names = set(DIRECTORIES.keys())
+    present = defaultdict(set)
+    for base_name, dir_name, _ in orphans:
+        present[base_name].add(dir_name)
+
+    listed = {
+        dir_name: scan_directory(base_path / dir_name, DIRECTORIES[dir_name])["files"]
+        for dir_name in sorted(set().union(*(all_dir_names - dirs for dirs in present.values())))
+    }
+    completed = sorted(
+        base_name for base_name, dirs in present.items()
+        if all(base_name in listed[dir_name] for dir_name in all_dir_names - dirs)
+    )
+    return [orphan for orphan in orphans if orphan[0] not in completed], completed
+
 
+def delete_files(orphans: list[tuple[str, str, str]], verbose: bool = True) -> tuple[list[str], list[dict]]:
+    """Delete orphan files. Returns (deleted paths, errors)."""
+    deleted = []
+    errors = []
+    for base_name, dir_name, filepath in orphans:
+        try:
+            os.remove(filepath)
+            if verbose:
+                print(f"  Deleted: {filepath}")
+            deleted.append(filepath)
+        except OSError as e:
+            if verbose:
+                print(f"  ERROR deleting {filepath}: {e}")
+            errors.append({"file": filepath, "error": str(e)})
+    return deleted, errors
+
+
+def run_json(base_path: Path, delete: bool, full: bool) -> int:
+    """Non-interactive mode: print a JSON report (and delete with --yes)."""
+    all_dir_names = set(DIRECTORIES.keys())
+    manifest, master_list, orphans = find_orphans(base_path, full)
+
+    grouped = defaultdict(list)
+    for base_name, dir_name, filepath in orphans:
+        grouped[base_name].append((dir_name, filepath))
 
-def main():
+    report = {
+        "base_path": str(base_path),
+        "rescanned": manifest["rescanned"],
+        "complete_sets": len(master_list),
+        "orphan_files": len(orphans),
+        "orphans": [
+            {
+                "base_name": base_name,
+                "present": sorted(d for d, _ in entries),
+                "missing": sorted(all_dir_names - {d for d, _ in entries}),
+                "files": [f for _, f in sorted(entries)],
+            }
+            for base_name, entries in sorted(grouped.items())
+        ],
+        "dry_run": not delete,
+        "completed": [],
+        "deleted": [],
+        "errors": [],
+    }
+
+    if delete and orphans:
+        orphans, report["completed"] = confirm_orphans(base_path, orphans)
+        report["deleted"], report["errors"] = delete_files(orphans, verbose=False)
+        refresh_index(base_path)
+
+    print(json.dumps(report, indent=2))
+    return 1 if report["errors"] else 0
+
+
+def main(base_path: Path = BASE_PATH, assume_yes: bool = False, dry_run: bool = False, full: bool = False):
     print("=" * 70)
     print("Image Orphan Finder")
     print("=" * 70)
-    print(f"\nBase path: {BASE_PATH}\n")
-    
-    # Step 1: Scan all directories and collect base names
+    print(f"\nBase path: {base_path}\n")
+
+    # Step 1: Refresh the image index (only changed directories are re-listed)
     print("Scanning directories...")
-    dir_contents = {}  # dir_name -> {base_name: filepath}
-    all_base_names = defaultdict(set)  # base_name -> set of dir_names where it exists
-    
-    for dir_name, suffix in DIRECTORIES.items():
-        dir_path = BASE_PATH / dir_name
-        print(f"  Scanning {dir_name}/...")
-        files = scan_directory(dir_path, suffix)
-        dir_contents[dir_name] = files
-        print(f"    Found {len(files)} valid image files")
-        
-        for base_name in files:
-            all_base_names[base_name].add(dir_name)
-    
-    # Step 2: Find base names that exist in ALL 6 directories (master list)
+    manifest, master_list, orphans = find_orphans(base_path, full)
     all_dir_names = set(DIRECTORIES.keys())
-    master_list = {
-        base_name
-        for base_name, dirs in all_base_names.items()
-        if dirs == all_dir_names
-    }
-    
+    rescanned = manifest["rescanned"]
+    print(f"  Re-listed {len(rescanned)} of {len(DIRECTORIES)} directories"
+          + (f": {', '.join(rescanned)}" if rescanned else " (index up to date)"))
+    for dir_name, listing in manifest["directories"].items():
+        if listing["mtime_ns"] is None:
+            print(f"  Warning: Directory does not exist: {base_path / dir_name}")
+        else:
+            print(f"  {dir_name}/: {len(listing['files'])} valid image files")
+
     print(f"\n{'=' * 70}")
     print(f"MASTER LIST: {len(master_list)} objects have complete sets (all 6 versions)")
     print("=" * 70)
@@ -113,17 +159,6 @@ def main():
     else:
         print("  (none)")
     
-    # Step 3: Find orphan files (files whose base_name is NOT in master list)
-    orphans = []  # list of (base_name, dir_name, filepath)
-    
-    for dir_name, files in dir_contents.items():
-        for base_name, filepath in files.items():
-            if base_name not in master_list:
-                orphans.append((base_name, dir_name, filepath))
-    
-    # Sort orphans by base_name, then by directory
-    orphans.sort(key=lambda x: (x[0], x[1]))
-    
     print(f"\n{'=' * 70}")
     print(f"ORPHAN FILES: {len(orphans)} files found")
     print("=" * 70)
@@ -155,30 +190,43 @@ def main():
     print(f"SUMMARY: {len(orphans)} orphan files will be deleted")
     print("=" * 70)
     
-    response = input("\nDo you want to delete all orphan files? (yes/no): ").strip().lower()
-    
-    if response != "yes":
-        print("\nDeletion cancelled. No files were deleted.")
+    if dry_run:
+        print("\nDry run. No files were deleted.")
         return
-    
-    # Step 5: Delete orphan files
+
+    if not assume_yes:
+        response = input("\nDo you want to delete all orphan files? (yes/no): ").strip().lower()
+
+        if response != "yes":
+            print("\nDeletion cancelled. No files were deleted.")
+            return
+
+    # Step 5: Re-check the missing versions on disk, then delete orphan files
+    orphans, completed = confirm_orphans(base_path, orphans)
+    for base_name in completed:
+        print(f"\n  Skipping {base_name}: all 6 versions are on disk now")
     print("\nDeleting orphan files...")
-    deleted_count = 0
-    error_count = 0
-    
-    for base_name, dir_name, filepath in orphans:
-        try:
-            os.remove(filepath)
-            print(f"  Deleted: {filepath}")
-            deleted_count += 1
-        except OSError as e:
-            print(f"  ERROR deleting {filepath}: {e}")
-            error_count += 1
-    
+    deleted, errors = delete_files(orphans)
+    refresh_index(base_path)
+
     print(f"\n{'=' * 70}")
-    print(f"COMPLETE: {deleted_count} files deleted, {error_count} errors")
+    print(f"COMPLETE: {len(deleted)} files deleted, {len(errors)} errors")
     print("=" * 70)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Find and delete orphan image files")
+    parser.add_argument("--base-path", type=Path, default=BASE_PATH,
+                        help="Directory containing the image directories")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="Report orphans without deleting")
+    mode.add_argument("--yes", action="store_true", help="Delete orphans without prompting")
+    parser.add_argument("--json", action="store_true",
+                        help="Print a JSON report instead of text (implies --dry-run unless --yes)")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-list every directory instead of only those that changed")
+    args = parser.parse_args()
+
+    if args.json:
+        sys.exit(run_json(args.base_path, args.yes, args.full))
+    main(args.base_path, args.yes, args.dry_run, args.full)
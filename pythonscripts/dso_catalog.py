@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Unified DSO catalog: one row per object, joined across
+
+    - the watchlist (Google Sheet / CSV 'Name' column, e.g. 'IC59', 'HD34078')
+    - public/dso_watchlist_info.json (keys and names, via dso_info's alias index)
+    - the image library (filename prefixes, as extractDSOName() in index.php)
+
+Designations are normalized once with dso_info.normalize_name(). The result is
+a columnar NumPy .npz file (coordinates, magnitude, size, type, common name,
+image availability) that todays_dsos_web.py --catalog loads instead of
+resolving every watchlist name over the network on each run, plus an integrity
+report of entries that did not match across the sources.
+
+Coordinates are resolved with SkyCoord.from_name only for names not already
+in the previous catalog (or all of them with --refresh-coords). The catalog
+also carries a declination/RA index (sky_index.py) so reports only evaluate
+objects that can reach the usable part of the sky.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from astropy.coordinates import SkyCoord
+import dso_info
+import ephemeris_data
+import image_index
+import sky_index
+
+CATALOG_FILE = 'dso_catalog.npz'
+CATALOG_VERSION = 1
+
+# Bit per image directory in the image_mask column, in image_index.DIRECTORIES order
+IMAGE_BITS = {dir_name: 1 << bit for bit, dir_name in enumerate(image_index.DIRECTORIES)}
+
+STRING_COLUMNS = ('key', 'name', 'aka', 'common_name', 'info_key', 'type_desc', 'dso_type', 'constellation')
+
+
+def default_catalog_path():
+    return ephemeris_data.DATA_DIR / CATALOG_FILE
+
+
+def image_key(base_name):
+    """Object designation from an image base name ('M31_20250113' -> 'M31'), as extractDSOName()."""
+    return dso_info.normalize_key(base_name.split('_')[0])
+
+
+def load_catalog(path=None):
+    """
+    Load a catalog as a dict of column arrays.
+
+    Raises:
+        FileNotFoundError: If the catalog has not been built
+        ValueError: If it was written by an incompatible version
+    """
+    path = Path(path) if path is not None else default_catalog_path()
+    with np.load(path, allow_pickle=False) as npz:
+        catalog = {name: npz[name] for name in npz.files}
+    if int(catalog.pop('version', 0)) != CATALOG_VERSION:
+        raise ValueError(f'{path} is not a version {CATALOG_VERSION} catalog; rebuild it')
+    return catalog
+
+
+def save_catalog(catalog, path):
+    """Write the catalog atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.stem}.{os.getpid()}.tmp.npz')
+    try:
+        np.savez(tmp, version=np.int32(CATALOG_VERSION), **catalog)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def catalog_targets(catalog, log, candidates=None):
+    """
+    Watchlist objects with coordinates, in the same form as resolve_targets().
+
+    Args:
+        catalog: Loaded catalog
+        log: List that objects without coordinates are appended to
+        candidates: Sorted catalog rows to restrict to (sky_index.candidates())
+
+    Returns:
+        (rows, ra_deg, dec_deg)
+    """
+    watchlist = np.flatnonzero(catalog['in_watchlist']) if candidates is None \
+        else candidates[catalog['in_watchlist'][candidates]]
+    selected = []
+    for i in watchlist:
+        if np.isnan(catalog['ra_deg'][i]):
+            log.append(f"Error resolving {catalog['name'][i]}: no coordinates in catalog")
+            continue
+        selected.append(i)
+    selected = np.array(selected, dtype=np.intp)
+
+    rows = [{
+        'do_me': '&#9733;' if catalog['want_better'][i] else '',
+        'name': str(catalog['name'][i]),
+        'aka': str(catalog['aka'][i]),
+        'size': float(catalog['size'][i]),
+        'magnitude': float(catalog['magnitude'][i]),
+        'constellation': str(catalog['constellation'][i]),
+        'type_desc': str(catalog['type_desc'][i]),
+    } for i in selected]
+
+    return rows, catalog['ra_deg'][selected].astype(np.float64), catalog['dec_deg'][selected].astype(np.float64)
+
+
+def resolve_coordinates(names, known, refresh=False):
+    """
+    Look up coordinates for each name.
+
+    Args:
+        names: Watchlist designations
+        known: {name: (ra_deg, dec_deg)} from a previous catalog
+        refresh: Re-resolve names already in known
+
+    Returns:
+        ({name: (ra_deg, dec_deg)}, [unresolved names with errors])
+    """
+    coords = {}
+    failed = []
+    for name in names:
+        if not refresh and name in known:
+            coords[name] = known[name]
+            continue
+        try:
+            obj = SkyCoord.from_name(name)
+            coords[name] = (obj.ra.deg, obj.dec.deg)
+        except Exception as e:
+            failed.append(f'{name}: {e}')
+    return coords, failed
+
+
+def cell(value):
+    """Watchlist cell as a string ('' for empty)."""
+    return '' if pd.isna(value) else str(value)
+
+
+def number(value):
+    """Watchlist cell as a float (NaN for empty or non-numeric)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def build_catalog(watchlist, info, images=None, previous=None, refresh_coords=False):
+    """
+    Join the three sources into catalog columns.
+
+    Args:
+        watchlist: Watchlist DataFrame (load_watchlist() or the CSV)
+        info: Loaded info dict (dso_info.load_info())
+        images: image_index manifest, or None to skip the image library
+        previous: Previous catalog, for reusing resolved coordinates
+        refresh_coords: Re-resolve every watchlist name
+
+    Returns:
+        (catalog, report) where report lists unmatched entries per source
+    """
+    index, ambiguous = dso_info.build_alias_index(info)
+    report = {
+        'watchlist_without_info': [],
+        'watchlist_unresolved': [],
+        'watchlist_duplicates': [],
+        'info_not_in_watchlist': [],
+        'images_without_object': [],
+        'ambiguous_names': {name: keys for name, keys in ambiguous.items()},
+    }
+
+    def info_key(*names):
+        for name in names:
+            if name:
+                key = index.get(dso_info.normalize_name(name))
+                if key is not None:
+                    return key
+        return ''
+
+    # Watchlist rows first, in sheet order, so catalog_targets() keeps report order
+    records = {}
+    for _, row in watchlist.iterrows():
+        name = cell(row['Name']).strip()
+        if not name:
+            continue
+        key = dso_info.normalize_key(name)
+        if key in records:
+            report['watchlist_duplicates'].append(name)
+            continue
+        matched = info_key(name, cell(row['Aka']))
+        if not matched:
+            report['watchlist_without_info'].append(name)
+        records[key] = {
+            'key': key,
+            'name': name,
+            'aka': cell(row['Aka']),
+            'info_key': matched,
+            'type_desc': cell(row['TypeDesc']),
+            'dso_type': cell(row.get('DSOType')),
+            'constellation': cell(row['Constellation']),
+            'magnitude': number(row['Mag']),
+            'size': number(row['SqArcMins']),
+            'want_better': str(row.get('WantBetter', False)).upper() == 'TRUE',
+            'in_watchlist': True,
+        }
+
+    # Info entries no watchlist row refers to
+    used = {record['info_key'] for record in records.values()}
+    for key, entry in info.items():
+        if 'See' in entry or key in used:
+            continue
+        report['info_not_in_watchlist'].append(key)
+        records[key] = {
+            'key': key, 'name': key, 'aka': '', 'info_key': key,
+            'type_desc': entry.get('Type', ''), 'dso_type': '',
+            'constellation': entry.get('Constellation', ''),
+            'magnitude': float('nan'), 'size': float('nan'),
+            'want_better': False, 'in_watchlist': False,
+        }
+
+    # Common names and image availability
+    by_info_key = {record['info_key']: record for record in records.values() if record['info_key']}
+    for record in records.values():
+        entry = info.get(record['info_key'], {})
+        record['common_name'] = entry.get('CommonName') or record['aka']
+        record['image_mask'] = 0
+        record['image_count'] = 0
+
+    if images is not None:
+        for base_name, dirs in image_index.image_sets(images).items():
+            key = image_key(base_name)
+            record = records.get(key) or by_info_key.get(info_key(key))
+            if record is None:
+                report['images_without_object'].append(base_name)
+                continue
+            record['image_count'] += 1
+            for dir_name in dirs:
+                record['image_mask'] |= IMAGE_BITS[dir_name]
+
+    # Coordinates for watchlist objects
+    known = {}
+    if previous is not None:
+        known = {str(name): (ra, dec) for name, ra, dec in
+                 zip(previous['name'], previous['ra_deg'], previous['dec_deg']) if not np.isnan(ra)}
+    names = [record['name'] for record in records.values() if record['in_watchlist']]
+    coords, report['watchlist_unresolved'] = resolve_coordinates(names, known, refresh_coords)
+
+    rows = list(records.values())
+    catalog = {column: np.array([row[column] for row in rows], dtype=str) for column in STRING_COLUMNS}
+    catalog.update({
+        'ra_deg': np.array([coords.get(row['name'], (np.nan, np.nan))[0] if row['in_watchlist'] else np.nan
+                            for row in rows], dtype=np.float64),
+        'dec_deg': np.array([coords.get(row['name'], (np.nan, np.nan))[1] if row['in_watchlist'] else np.nan
+                             for row in rows], dtype=np.float64),
+        'magnitude': np.array([row['magnitude'] for row in rows], dtype=np.float64),
+        'size': np.array([row['size'] for row in rows], dtype=np.float64),
+        'want_better': np.array([row['want_better'] for row in rows], dtype=bool),
+        'in_watchlist': np.array([row['in_watchlist'] for row in rows], dtype=bool),
+        'image_mask': np.array([row['image_mask'] for row in rows], dtype=np.uint8),
+        'image_count': np.array([row['image_count'] for row in rows], dtype=np.int32),
+    })
+    catalog.update(sky_index.build_index(catalog['ra_deg'], catalog['dec_deg']))
+    return catalog, report
+
+
+def lookup_index(catalog):
+    """Map normalized key, name and common name to catalog row (first wins)."""
+    index = {}
+    for i in range(len(catalog['key'])):
+        for name in (catalog['key'][i], catalog['name'][i], catalog['info_key'][i], catalog['common_name'][i]):
+            if name:
+                index.setdefault(dso_info.normalize_name(str(name)), i)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the unified DSO catalog')
+    parser.add_argument('--watchlist', help='Watchlist CSV (default: the shared Google Sheet)')
+    parser.add_argument('--info', type=Path, default=dso_info.INFO_FILE, help='DSO info JSON')
+    parser.add_argument('--images', type=Path, default=image_index.BASE_PATH,
+                        help='Image library directory (skipped if missing)')
+    parser.add_argument('--output', type=Path, help='Catalog file (default: <data dir>/dso_catalog.npz)')
+    parser.add_argument('--refresh-coords', action='store_true', help='Re-resolve coordinates for every object')
+    args = parser.parse_args()
+
+    output = args.output or default_catalog_path()
+
+    try:
+        if args.watchlist:
+            watchlist = pd.read_csv(args.watchlist)
+        else:
+            from todays_dsos_web import load_watchlist
+            watchlist = load_watchlist()
+
+        images = image_index.refresh_index(args.images) if args.images.is_dir() else None
+
+        try:
+            previous = load_catalog(output)
+        except (OSError, ValueError):
+            previous = None
+
+        catalog, report = build_catalog(watchlist, dso_info.load_info(args.info), images,
+                                        previous, args.refresh_coords)
+        save_catalog(catalog, output)
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+    print(json.dumps({
+        'success': True,
+        'catalog': str(output),
+        'objects': len(catalog['key']),
+        'watchlist': int(catalog['in_watchlist'].sum()),
+        'with_images': int((catalog['image_count'] > 0).sum()),
+        'images_scanned': images is not None,
+        'report': report,
+    }, indent=2))
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+DSO information store for public/dso_watchlist_info.json
+
+The info file maps a catalog key (e.g. 'IC405', the form extractDSOName() in
+index.php derives from image filenames) to either a full entry or a redirect:
+
+    "IC405": {"CommonName": "Flaming Star Nebula", "Type": ..., ...}
+    "M1":    {"CommonName": "Crab Nebula", "See": "NGC1952"}
+
+This module validates entries against a schema, resolves any designation or
+name ('IC 405', 'ic405', 'Flaming Star Nebula') to its key through an alias
+index, and writes changes atomically. Bulk edits go through registered
+migrations (see MIGRATIONS) instead of one-off scripts.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+INFO_FILE = Path(__file__).parent.parent / 'public' / 'dso_watchlist_info.json'
+
+# Field name -> expected type for full entries
+FIELDS = {
+    'CommonName': str,
+    'OtherNames': list,
+    'Type': str,
+    'Constellation': str,
+    'Distance': str,
+    'Size': str,
+    'Composition': str,
+    'FunFacts': list,
+}
+
+# Full entries must have these; redirect entries have exactly CommonName and See
+REQUIRED_FIELDS = ('CommonName',)
+REDIRECT_FIELDS = {'CommonName', 'See'}
+
+KEY_PATTERN = re.compile(r'^[A-Z0-9+\-.]+$')
+
+
+def normalize_name(name):
+    """
+    Normalize a designation or name for lookups.
+
+    Case, whitespace and punctuation other than '+' and '-' (which are part of
+    designations like 'Sh2-155') are ignored: 'IC 405' and 'IC405' -> 'ic405',
+    'Flaming Star Nebula' -> 'flamingstarnebula'.
+    """
+    return re.sub(r'[^0-9a-z+\-]', '', name.casefold())
+
+
+def normalize_key(name):
+    """Key form used in the info file: uppercase with spaces removed (matches extractDSOName())."""
+    return name.strip().upper().replace(' ', '')
+
+
+def load_info(path=INFO_FILE):
+    """Load the info file; an absent file is an empty store."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def resolve_entry(data, key):
+    """
+    Follow a redirect and return (key, entry) of the entry holding the data.
+
+    Returns (None, None) if key is unknown.
+    """
+    entry = data.get(key)
+    if entry is None:
+        return None, None
+    if entry.get('See') and entry['See'] in data:
+        return entry['See'], data[entry['See']]
+    return key, entry
+
+
+def entry_names(key, entry):
+    """Every name an entry is known by: its key, CommonName and OtherNames."""
+    names = [key]
+    if entry.get('CommonName'):
+        names.append(entry['CommonName'])
+    names.extend(entry.get('OtherNames') or [])
+    return names
+
+
+def build_alias_index(data):
+    """
+    Map normalized names to the key holding the data (redirects followed).
+
+    Returns:
+        (index, ambiguous) where index is {normalized_name: key} and
+        ambiguous is {normalized_name: sorted keys} for names used by more
+        than one object; ambiguous names are left out of the index.
+    """
+    targets = {}
+    for key, entry in data.items():
+        target, _ = resolve_entry(data, key)
+        for name in entry_names(key, entry):
+            targets.setdefault(normalize_name(name), set()).add(target)
+
+    index = {}
+    ambiguous = {}
+    for name, keys in targets.items():
+        if len(keys) == 1:
+            index[name] = next(iter(keys))
+        else:
+            ambiguous[name] = sorted(keys)
+
+    # A catalog key always resolves to itself, even if another object lists it as an alias
+    for key in data:
+        index[normalize_name(key)] = resolve_entry(data, key)[0]
+        ambiguous.pop(normalize_name(key), None)
+
+    return index, ambiguous
+
+
+def lookup(data, name, index=None):
+    """
+    Find an entry by key, designation or name.
+
+    Args:
+        data: Loaded info dict
+        name: Any designation or name ('IC 405', 'M1', 'Crab Nebula')
+        index: Alias index from build_alias_index() (built if omitted)
+
+    Returns:
+        (key, entry) of the entry holding the data, or (None, None)
+    """
+    if index is None:
+        index, _ = build_alias_index(data)
+    key = index.get(normalize_name(name))
+    if key is None:
+        return None, None
+    return key, data[key]
+
+
+def validate(data):
+    """
+    Check the info dict against the schema.
+
+    Returns:
+        (errors, warnings) as lists of messages. Errors make the data unsafe
+        to save; warnings flag ambiguous names and suspicious redirects.
+    """
+    errors = []
+    warnings = []
+
+    if not isinstance(data, dict):
+        return ['Top level must be an object'], warnings
+
+    for key, entry in data.items():
+        if not KEY_PATTERN.match(key):
+            errors.append(f"{key}: key must be uppercase with no spaces (e.g. 'IC405')")
+        if not isinstance(entry, dict):
+            errors.append(f'{key}: entry must be an object')
+            continue
+
+        if 'See' in entry:
+            if set(entry) != REDIRECT_FIELDS:
+                errors.append(f"{key}: redirect entries may only have 'CommonName' and 'See'")
+            target = data.get(entry['See'])
+            if target is None:
+                errors.append(f"{key}: 'See' points to missing key '{entry['See']}'")
+            elif 'See' in target:
+                errors.append(f"{key}: 'See' points to another redirect '{entry['See']}'")
+            elif entry.get('CommonName') != target.get('CommonName'):
+                warnings.append(f"{key}: CommonName '{entry.get('CommonName')}' differs from "
+                                f"{entry['See']}'s '{target.get('CommonName')}'")
+            continue
+
+        for field in REQUIRED_FIELDS:
+            if not entry.get(field):
+                errors.append(f'{key}: missing {field}')
+        for field, value in entry.items():
+            expected = FIELDS.get(field)
+            if expected is None:
+                errors.append(f'{key}: unknown field {field}')
+            elif not isinstance(value, expected):
+                errors.append(f'{key}: {field} must be a {expected.__name__}')
+            elif expected is list and not all(isinstance(item, str) for item in value):
+                errors.append(f'{key}: {field} must contain only strings')
+
+    if not errors:
+        _, ambiguous = build_alias_index(data)
+        for name, keys in sorted(ambiguous.items()):
+            warnings.append(f"Name '{name}' is used by {', '.join(keys)}; it only resolves by key")
+
+    return errors, warnings
+
+
+def save_info(data, path=INFO_FILE):
+    """
+    Validate and write the info file atomically.
+
+    Raises:
+        ValueError: If the data fails validation (the file is left untouched)
+    """
+    errors, _ = validate(data)
+    if errors:
+        raise ValueError('; '.join(errors))
+
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def update_entry(name, changes, path=INFO_FILE):
+    """
+    Change fields of one entry and save.
+
+    Args:
+        name: Key, designation or name of the entry (redirects are followed)
+        changes: {field: value}; a value of None removes the field
+        path: Info file
+
+    Returns:
+        (key, entry) after the update
+
+    Raises:
+        KeyError: If name does not resolve to an entry
+        ValueError: If the result fails validation
+    """
+    data = load_info(path)
+    key, entry = lookup(data, name)
+    if key is None:
+        raise KeyError(f'No entry for {name!r}')
+    for field, value in changes.items():
+        if value is None:
+            entry.pop(field, None)
+        else:
+            entry[field] = value
+    save_info(data, path)
+    return key, entry
+
+
+def add_alias(name, alias, path=INFO_FILE):
+    """Append alias to an entry's OtherNames (no-op if it already resolves there)."""
+    data = load_info(path)
+    index, _ = build_alias_index(data)
+    key, entry = lookup(data, name, index)
+    if key is None:
+        raise KeyError(f'No entry for {name!r}')
+    existing = index.get(normalize_name(alias))
+    if existing == key:
+        return key, entry
+    if existing is not None:
+        raise ValueError(f'{alias!r} already refers to {existing}')
+    entry.setdefault('OtherNames', []).append(alias)
+    save_info(data, path)
+    return key, entry
+
+
+# Bulk migrations: name -> function(key, entry) returning the new entry or None to drop it.
+# Redirect entries are passed through untouched.
+
+def migrate_common_name_from_other_names(key, entry):
+    """Fill a missing CommonName from the first OtherNames entry, or the key."""
+    if not entry.get('CommonName'):
+        if entry.get('OtherNames'):
+            entry['CommonName'] = entry['OtherNames'][0]
+            entry['OtherNames'] = entry['OtherNames'][1:]
+        else:
+            entry['CommonName'] = key
+    return entry
+
+
+def migrate_drop_empty_fields(key, entry):
+    """Remove empty strings and lists."""
+    return {field: value for field, value in entry.items() if value not in ('', [], None)}
+
+
+def migrate_dedupe_other_names(key, entry):
+    """Drop OtherNames that repeat the key, the CommonName or each other."""
+    if 'OtherNames' not in entry:
+        return entry
+    seen = {normalize_name(key), normalize_name(entry.get('CommonName', ''))}
+    names = []
+    for name in entry['OtherNames']:
+        if normalize_name(name) not in seen:
+            seen.add(normalize_name(name))
+            names.append(name)
+    entry['OtherNames'] = names
+    return entry
+
+
+MIGRATIONS = {
+    'common-name': migrate_common_name_from_other_names,
+    'drop-empty': migrate_drop_empty_fields,
+    'dedupe-names': migrate_dedupe_other_names,
+}
+
+
+def run_migration(migration, path=INFO_FILE, dry_run=False):
+    """
+    Apply a migration to every full entry and save atomically.
+
+    Returns:
+        List of keys whose entry changed
+    """
+    data = load_info(path)
+    transform = MIGRATIONS[migration]
+    changed = []
+    migrated = {}
+    for key, entry in data.items():
+        if 'See' in entry:
+            migrated[key] = entry
+            continue
+        before = json.dumps(entry, sort_keys=True)
+        new_entry = transform(key, dict(entry))
+        if new_entry is None or json.dumps(new_entry, sort_keys=True) != before:
+            changed.append(key)
+        if new_entry is not None:
+            migrated[key] = new_entry
+    if changed and not dry_run:
+        save_info(migrated, path)
+    return changed
+
+
+def parse_value(value):
+    """CLI values: JSON when it parses (lists, null), otherwise a plain string."""
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return value
+    return parsed if isinstance(parsed, (list, type(None))) else value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate, query and update dso_watchlist_info.json')
+    parser.add_argument('--file', type=Path, default=INFO_FILE, help='Info file (default: public/dso_watchlist_info.json)')
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    subparsers.add_parser('validate', help='Check the file against the schema')
+
+    lookup_parser = subparsers.add_parser('lookup', help='Find an entry by key, designation or name')
+    lookup_parser.add_argument('name')
+
+    set_parser = subparsers.add_parser('set', help='Set (or with null, remove) a field')
+    set_parser.add_argument('name')
+    set_parser.add_argument('field')
+    set_parser.add_argument('value', help="String, or JSON for lists/null (e.g. '[\"a\", \"b\"]')")
+
+    alias_parser = subparsers.add_parser('add-alias', help='Add an alternate name to an entry')
+    alias_parser.add_argument('name')
+    alias_parser.add_argument('alias')
+
+    migrate_parser = subparsers.add_parser('migrate', help='Apply a bulk transform to every entry')
+    migrate_parser.add_argument('migration', choices=sorted(MIGRATIONS))
+    migrate_parser.add_argument('--dry-run', action='store_true', help='Report changes without saving')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'validate':
+            errors, warnings = validate(load_info(args.file))
+            print(json.dumps({'success': not errors, 'errors': errors, 'warnings': warnings}, indent=2))
+            if errors:
+                sys.exit(1)
+        elif args.command == 'lookup':
+            key, entry = lookup(load_info(args.file), args.name)
+            if key is None:
+                print(json.dumps({'success': False, 'error': f'No entry for {args.name!r}'}))
+                sys.exit(1)
+            print(json.dumps({'success': True, 'key': key, 'entry': entry}, indent=2, ensure_ascii=False))
+        elif args.command == 'set':
+            key, entry = update_entry(args.name, {args.field: parse_value(args.value)}, args.file)
+            print(json.dumps({'success': True, 'key': key, 'entry': entry}, indent=2, ensure_ascii=False))
+        elif args.command == 'add-alias':
+            key, entry = add_alias(args.name, args.alias, args.file)
+            print(json.dumps({'success': True, 'key': key, 'entry': entry}, indent=2, ensure_ascii=False))
+        elif args.command == 'migrate':
+            changed = run_migration(args.migration, args.file, args.dry_run)
+            print(json.dumps({'success': True, 'dry_run': args.dry_run, 'changed': changed}, indent=2))
+        else:
+            parser.print_help()
+            sys.exit(1)
+    except (KeyError, ValueError, OSError) as e:
+        message = e.args[0] if isinstance(e, KeyError) else str(e)
+        print(json.dumps({'success': False, 'error': message}))
+        sys.exit(1)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Ephemeris and timescale data directory for DSO visibility reports.
+
+Keeps de421.bsp (and optionally finals2000A.all) in one configurable directory
+instead of the current working directory, opens the SPK kernel memory-mapped,
+and can fail fast instead of downloading when running offline.
+
+Configuration (command-line flags on todays_dsos_web.py override these):
+    DSO_DATA_DIR      Data directory (default: pythonscripts/data)
+    DSO_EPHEMERIS     Kernel file name inside the data directory (default: de421.bsp)
+    DSO_OFFLINE=1     Never download; error out if a file is missing
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+from pathlib import Path
+from jplephem.daf import DAF
+from jplephem.excerpter import write_excerpt
+from jplephem.spk import SPK
+from skyfield.api import Loader, load_file
+
+DATA_DIR = Path(os.environ.get('DSO_DATA_DIR', Path(__file__).parent / 'data'))
+EPHEMERIS_FILE = os.environ.get('DSO_EPHEMERIS', 'de421.bsp')
+OFFLINE = os.environ.get('DSO_OFFLINE', '') not in ('', '0')
+
+# Full kernel that trimmed kernels are cut from
+SOURCE_EPHEMERIS_FILE = 'de421.bsp'
+
+# Optional IERS file; the timescale falls back to Skyfield's bundled data
+TIMESCALE_FILE = 'finals2000A.all'
+
+# SPK targets the engine needs: Earth (0->3->399), Sun for twilight and
+# deflection, Jupiter and Saturn barycenters for deflection
+KERNEL_BODIES = (3, 399, 10, 5, 6)
+
+# Kept in trimmed kernels but not required: the Moon (3->301), for moon
+# constraints in campaign_planner.py, and the other planet barycenters, for
+# solar_system.py targets
+OPTIONAL_BODIES = (301, 1, 2, 4, 7, 8)
+
+# SPK targets the moon constraints need (3->301)
+MOON_BODIES = (301,)
+
+
+def configure(data_dir=None, ephemeris_file=None, offline=None):
+    """
+    Override the data directory settings for this process.
+
+    Args:
+        data_dir: Directory holding the ephemeris and timescale files
+        ephemeris_file: Kernel file name inside data_dir
+        offline: True to never download missing files
+    """
+    global DATA_DIR, EPHEMERIS_FILE, OFFLINE
+    if data_dir is not None:
+        DATA_DIR = Path(data_dir)
+    if ephemeris_file is not None:
+        EPHEMERIS_FILE = ephemeris_file
+    if offline is not None:
+        OFFLINE = offline
+
+
+def settings():
+    """Return the current (data_dir, ephemeris_file, offline) for passing to worker processes."""
+    return str(DATA_DIR), EPHEMERIS_FILE, OFFLINE
+
+
+def load_timescale():
+    """
+    Build the Skyfield timescale.
+
+    Uses finals2000A.all from the data directory when present, otherwise
+    Skyfield's bundled tables. Never downloads.
+    """
+    if (DATA_DIR / TIMESCALE_FILE).exists():
+        return Loader(str(DATA_DIR), verbose=False).timescale(builtin=False)
+    return Loader(str(DATA_DIR), verbose=False).timescale(builtin=True)
+
+
+def load_ephemeris():
+    """
+    Open the configured SPK kernel from the data directory.
+
+    The kernel is opened with load_file(), so jplephem memory-maps the segment
+    data instead of reading it; processes opening the same file share pages.
+
+    Returns:
+        Skyfield SpiceKernel
+
+    Raises:
+        FileNotFoundError: If the kernel is missing and we are offline, or it
+            is a trimmed kernel (which cannot be downloaded)
+    """
+    path = DATA_DIR / EPHEMERIS_FILE
+    if not path.exists():
+        if OFFLINE or EPHEMERIS_FILE != SOURCE_EPHEMERIS_FILE:
+            raise FileNotFoundError(
+                f"Ephemeris not found at {path}. "
+                f"Run 'python ephemeris_data.py download' (or trim) to install it."
+            )
+        download_ephemeris()
+    return load_file(str(path))
+
+
+def download_ephemeris():
+    """Download the full kernel into the data directory. Returns its path."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    loader = Loader(str(DATA_DIR), verbose=False)
+    loader.download(SOURCE_EPHEMERIS_FILE)
+    return DATA_DIR / SOURCE_EPHEMERIS_FILE
+
+
+def check_coverage(eph, start_jd, end_jd, bodies=KERNEL_BODIES):
+    """
+    Check that the kernel covers the required bodies over a TDB date span.
+
+    Args:
+        eph: Skyfield SpiceKernel
+        start_jd, end_jd: Julian date span that must be covered
+        bodies: SPK target codes that must be present
+
+    Returns:
+        list of missing/short target codes (empty when fully covered)
+    """
+    missing = []
+    for body in bodies:
+        segments = [s for s in eph.spk.segments if s.target == body]
+        if not any(s.start_jd <= start_jd and s.end_jd >= end_jd for s in segments):
+            missing.append(body)
+    return missing
+
+
+def night_span_jd(target_date):
+    """Julian date span searched for a night's viewing window (noon to noon + 2 days)."""
+    start = datetime.datetime(target_date.year, target_date.month, target_date.day, 12)
+    jd = (start - datetime.datetime(2000, 1, 1, 12)).total_seconds() / 86400.0 + 2451545.0
+    return jd, jd + 2.0
+
+
+def trim_kernel(start_date, end_date, output_file, bodies=KERNEL_BODIES + OPTIONAL_BODIES):
+    """
+    Write a kernel excerpt covering only the needed bodies and dates.
+
+    Args:
+        start_date, end_date: datetime.date span to keep
+        output_file: File name inside the data directory
+        bodies: SPK target codes to keep
+
+    Returns:
+        Path of the written kernel
+    """
+    source = DATA_DIR / SOURCE_EPHEMERIS_FILE
+    output = DATA_DIR / output_file
+    start_jd, _ = night_span_jd(start_date)
+    _, end_jd = night_span_jd(end_date)
+    # Pad by a day on each side for light-time and deflector retardation
+    start_jd -= 1.0
+    end_jd += 1.0
+
+    tmp = output.with_name(output.name + '.tmp')
+    with open(source, 'rb') as f:
+        spk = SPK(DAF(f))
+        summaries = [summary for summary, segment in zip(spk.daf.summaries(), spk.segments)
+                     if segment.target in bodies]
+        with open(tmp, 'w+b') as out:
+            write_excerpt(spk, out, start_jd, end_jd, summaries)
+    os.replace(tmp, output)
+    return output
+
+
+def cmd_check(target_date):
+    """Report data directory status as JSON; exit 1 if the report cannot run offline."""
+    path = DATA_DIR / EPHEMERIS_FILE
+    status = {
+        'data_dir': str(DATA_DIR),
+        'ephemeris': str(path),
+        'ephemeris_exists': path.exists(),
+        'timescale': str(DATA_DIR / TIMESCALE_FILE) if (DATA_DIR / TIMESCALE_FILE).exists() else 'builtin',
+        'offline': OFFLINE,
+    }
+    ok = path.exists()
+    if ok:
+        eph = load_file(str(path))
+        status['size_bytes'] = path.stat().st_size
+        status['missing_bodies'] = check_coverage(eph, *night_span_jd(target_date))
+        ok = not status['missing_bodies']
+        eph.close()
+    status['success'] = ok
+    print(json.dumps(status, indent=2))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the ephemeris data directory')
+    parser.add_argument('--data-dir', help='Data directory (default: $DSO_DATA_DIR or pythonscripts/data)')
+    parser.add_argument('--ephemeris', help='Kernel file name inside the data directory')
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    check_parser = subparsers.add_parser('check', help='Verify files needed for a date are present')
+    check_parser.add_argument('--date', help='Date in YYYY-MM-DD format (default: today)')
+
+    subparsers.add_parser('download', help='Download de421.bsp into the data directory')
+
+    trim_parser = subparsers.add_parser('trim', help='Write a kernel trimmed to a date span')
+    trim_parser.add_argument('start', help='First date in YYYY-MM-DD format')
+    trim_parser.add_argument('end', help='Last date in YYYY-MM-DD format')
+    trim_parser.add_argument('--output', default='de421_trimmed.bsp',
+                             help='Output file name inside the data directory')
+
+    args = parser.parse_args()
+    configure(args.data_dir, args.ephemeris)
+
+    if args.command == 'check':
+        date = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today()
+        cmd_check(date)
+    elif args.command == 'download':
+        print(f"Downloaded {download_ephemeris()}")
+    elif args.command == 'trim':
+        output = trim_kernel(datetime.date.fromisoformat(args.start),
+                             datetime.date.fromisoformat(args.end), args.output)
+        print(f"Wrote {output} ({output.stat().st_size} bytes)")
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Low-precision alt/az engine in plain NumPy.
+
+The Skyfield path in todays_dsos_web.evaluate_targets() runs the full
+observe().apparent() chain (light time, aberration, deflection) per object,
+which is far more precision than "above 18 degrees for an hour" needs. This
+engine instead
+
+    - applies annual aberration and precession-nutation to the catalog
+      RA/Dec once per night (at the middle of the grid),
+    - takes apparent sidereal time for the whole time grid once,
+    - computes alt/az for every object and sample with a few broadcast trig ops.
+
+Ignored terms (light deflection, diurnal aberration, polar motion, the change
+of precession/nutation within one night) are each well under 0.01 degrees.
+Select it with todays_dsos_web.py --engine fast. Check it against Skyfield:
+
+    python fast_altaz.py --dates 2025-11-21 2026-03-20 2026-06-21 --latitudes -33 0 43.69 60
+
+Objects are processed in blocks sized from a memory budget, reusing the same
+working arrays, so large catalogs cost time linearly but not memory:
+
+    python fast_altaz.py --benchmark 1000 10000 50000 --memory-budget 64 [--float32]
+"""
+import argparse
+import datetime
+import sys
+import time
+import numpy as np
+from skyfield.api import Topos
+from skyfield.constants import C_AUDAY
+import ephemeris_data
+import quality
+
+# Documented accuracy bound (degrees) that the check enforces
+ERROR_BOUND = 0.05
+
+# Working memory per block of objects: alt, az and scratch floats plus two
+# boolean masks per sample, and what quality.summarize() allocates on top
+DEFAULT_MEMORY_BUDGET = 256 << 20
+WORK_FLOATS = 3
+WORK_MASKS = 2
+QUALITY_BYTES = 40
+
+# Sidereal degrees per day
+SIDEREAL_RATE = 360.98564736629
+
+CHECK_LATITUDES = (-33.0, 0.0, 43.69, 60.0)
+CHECK_LONGITUDE = -116.49
+
+
+def apparent_radec(ra_deg, dec_deg, t_mid, eph):
+    """
+    Catalog (ICRS) coordinates to apparent RA/Dec of date, in radians.
+
+    Args:
+        ra_deg, dec_deg: float64 arrays of catalog coordinates
+        t_mid: Skyfield Time the night's correction is evaluated at
+        eph: Ephemeris, for Earth's velocity (annual aberration)
+    """
+    ra = np.radians(ra_deg)
+    dec = np.radians(dec_deg)
+    u = np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=1)
+    u = u + eph['earth'].at(t_mid).velocity.au_per_d / C_AUDAY
+    u = u @ t_mid.M.T  # precession, nutation and frame bias to the true equator of date
+    u /= np.linalg.norm(u, axis=1)[:, None]
+    return np.arctan2(u[:, 1], u[:, 0]), np.arcsin(u[:, 2])
+
+
+def night_terms(time_range, eph, ra_deg, dec_deg, dtype=np.float64):
+    """
+    Per-night inputs of the alt/az computation.
+
+    Returns:
+        (gast, ra, dec) in radians and the given dtype: Greenwich apparent
+        sidereal time of each sample (wrapped to 0..2pi) and the objects'
+        apparent RA/Dec of date
+    """
+    t_mid = time_range[len(time_range) // 2]
+    ra, dec = apparent_radec(ra_deg, dec_deg, t_mid, eph)
+    gast = np.radians(time_range.gast * 15.0) % (2 * np.pi)
+    return gast.astype(dtype), ra.astype(dtype), dec.astype(dtype)
+
+
+def transit_terms(start, end, eph, latitude, longitude, ra_deg, dec_deg):
+    """
+    Upper transit and highest altitude of every object between two times, in closed form.
+
+    Altitude falls off monotonically with the hour angle's distance from
+    zero, so the highest point in the window is the transit if the window
+    contains one, otherwise the window end nearer to it.
+
+    Args:
+        start, end: Skyfield Times bounding the window
+        eph: Ephemeris
+        latitude, longitude: Observer position in degrees
+        ra_deg, dec_deg: float64 arrays of catalog coordinates
+
+    Returns:
+        (transit_days, transit_alt, max_alt): offset in days from start of the
+        transit nearest the window's middle (negative or past the end when it
+        falls outside the window), altitude at transit and highest altitude
+        within the window, in degrees
+    """
+    ra, dec = apparent_radec(ra_deg, dec_deg, start.ts.tt_jd((start.tt + end.tt) / 2), eph)
+    lat = np.radians(latitude)
+    span = (end.tt - start.tt) * SIDEREAL_RATE
+    ha_start = (start.gast * 15.0 + longitude - np.degrees(ra) + 180.0) % 360.0 - 180.0
+    transit_ha = np.round((ha_start + span / 2) / 360.0) * 360.0
+
+    def altitude(ha):
+        sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(np.radians(ha))
+        return np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+
+    transit_alt = altitude(0.0)
+    in_window = (transit_ha >= ha_start) & (transit_ha <= ha_start + span)
+    max_alt = np.where(in_window, transit_alt, np.maximum(altitude(ha_start), altitude(ha_start + span)))
+    return (transit_ha - ha_start) / SIDEREAL_RATE, transit_alt, max_alt
+
+
+def block_altaz(lst, latitude, ra, dec, alt, az, work):
+    """
+    Alt/az in degrees of one block of objects, written into preallocated arrays.
+
+    Args:
+        lst: (T,) local sidereal time in radians
+        latitude: Observer latitude in degrees
+        ra, dec: (B,) apparent RA/Dec in radians
+        alt, az, work: (B, T) output and scratch arrays (same dtype)
+    """
+    lat = np.radians(latitude)
+    sin_dec, cos_dec = np.sin(dec)[:, None], np.cos(dec)[:, None]
+
+    hour_angle = np.subtract(lst[None, :], ra[:, None], out=work)
+    np.sin(hour_angle, out=az)
+    az *= -cos_dec
+    cos_ha = np.cos(hour_angle, out=work)
+    np.multiply(cos_ha, np.cos(lat) * cos_dec, out=alt)
+    alt += np.sin(lat) * sin_dec
+    cos_ha *= -np.sin(lat) * cos_dec
+    cos_ha += np.cos(lat) * sin_dec
+    np.arctan2(az, cos_ha, out=az)
+    np.degrees(az, out=az)
+    np.mod(az, 360.0, out=az)
+    np.clip(alt, -1.0, 1.0, out=alt)
+    np.arcsin(alt, out=alt)
+    np.degrees(alt, out=alt)
+
+
+def block_size(samples, memory_budget=DEFAULT_MEMORY_BUDGET, dtype=np.float64, with_quality=False):
+    """Objects per block so the block's working arrays fit in memory_budget bytes."""
+    per_object = samples * (WORK_FLOATS * np.dtype(dtype).itemsize + WORK_MASKS
+                            + (QUALITY_BYTES if with_quality else 0))
+    return max(1, int(memory_budget // per_object))
+
+
+def evaluate_targets(time_range, eph, latitude, longitude, ra_deg, dec_deg, min_alt, az_min, az_max,
+                     track_step=0, memory_budget=DEFAULT_MEMORY_BUDGET, dtype=np.float64, quality_settings=None):
+    """
+    Drop-in for todays_dsos_web.evaluate_targets() using this engine.
+
+    Objects are processed in blocks sized from memory_budget. The block
+    working arrays are allocated once and reused, so transient memory stays
+    flat however large the catalog is (the outputs still grow with it).
+
+    Args:
+        time_range: Skyfield Time grid
+        eph: Ephemeris
+        latitude, longitude: Observer position in degrees
+        ra_deg, dec_deg, min_alt, az_min, az_max, track_step, quality_settings:
+            As for todays_dsos_web.evaluate_targets()
+        memory_budget: Bytes of working memory per block
+        dtype: np.float64, or np.float32 for half the memory (errors stay
+            under 0.001 degrees)
+
+    Returns:
+        (indices, altaz, tracks[, quality]) as todays_dsos_web.evaluate_targets()
+    """
+    gast, ra, dec = night_terms(time_range, eph, ra_deg, dec_deg, dtype)
+    lst = ((gast + np.radians(longitude)) % (2 * np.pi)).astype(dtype)
+
+    count, samples = len(ra), len(lst)
+    sample_idx = np.arange(0, samples, track_step) if track_step else np.arange(0)
+    indices = np.full((count, 2), -1, dtype=np.int32)
+    result = np.zeros((count, 4), dtype=np.float64)
+    tracks = np.zeros((count, len(sample_idx), 2), dtype=np.float32)
+    if quality_settings is not None:
+        grid_minutes = (time_range.tt - time_range.tt[0]) * 1440.0
+        scores = np.zeros((count, len(quality.FIELDS) + len(quality_settings['tiers'])), dtype=np.float64)
+
+    block = min(max(count, 1), block_size(samples, memory_budget, dtype, quality_settings is not None))
+    alt_buf = np.empty((block, samples), dtype=dtype)
+    az_buf = np.empty((block, samples), dtype=dtype)
+    work_buf = np.empty((block, samples), dtype=dtype)
+    mask_buf = np.empty((block, samples), dtype=bool)
+    test_buf = np.empty((block, samples), dtype=bool)
+
+    for start in range(0, count, block):
+        stop = min(count, start + block)
+        n = stop - start
+        alt, az, mask, test = alt_buf[:n], az_buf[:n], mask_buf[:n], test_buf[:n]
+        block_altaz(lst, latitude, ra[start:stop], dec[start:stop], alt, az, work_buf[:n])
+
+        np.greater_equal(alt, min_alt, out=mask)
+        mask &= np.greater_equal(az, az_min, out=test)
+        mask &= np.less_equal(az, az_max, out=test)
+
+        seen = mask.any(axis=1)
+        first = mask.argmax(axis=1)
+        last = samples - 1 - mask[:, ::-1].argmax(axis=1)
+        rows = np.arange(n)
+
+        indices[start:stop][seen] = np.stack([first, last], axis=1)[seen]
+        values = np.stack([alt[rows, first], az[rows, first], alt[rows, last], az[rows, last]], axis=1)
+        result[start:stop][seen] = values[seen]
+        if track_step:
+            tracks[start:stop, :, 0] = alt[:, sample_idx]
+            tracks[start:stop, :, 1] = az[:, sample_idx]
+        if quality_settings is not None:
+            scores[start:stop] = quality.summarize(alt, mask, grid_minutes, quality_settings)
+
+    if quality_settings is not None:
+        return indices, result, tracks, scores
+    return indices, result, tracks
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def benchmark(counts, target_date, latitude=CHECK_LATITUDES[2], longitude=CHECK_LONGITUDE,
+              memory_budget=DEFAULT_MEMORY_BUDGET, dtype=np.float64, seed=0):
+    """
+    Time random catalogs of each size over one night's 1-minute grid and print
+    seconds, block size and peak RSS (which should stay flat as counts grow).
+    """
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    time_range = ts.utc(target_date.year, target_date.month, target_date.day, 2, np.arange(600))
+    rng = np.random.default_rng(seed)
+    block = block_size(len(time_range), memory_budget, dtype)
+
+    print(f'Fast engine benchmark: 600 samples, {np.dtype(dtype).name}, '
+          f'budget {memory_budget / (1 << 20):.0f} MB ({block} objects per block)')
+    for count in sorted(counts):
+        ra_deg = rng.uniform(0, 360, count)
+        dec_deg = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+        start = time.perf_counter()
+        evaluate_targets(time_range, eph, latitude, longitude, ra_deg, dec_deg, 18.0, 10.0, 165.0,
+                         memory_budget=memory_budget, dtype=dtype)
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mb()
+        print(f"  {count:>8} objects {elapsed:8.2f}s  {count / elapsed:10.0f} obj/s  "
+              f"peak RSS {'n/a' if peak is None else f'{peak:.0f} MB'}")
+
+
+def compare(target_date, latitude, longitude, ra_deg, dec_deg, ts, eph, criteria, dtype=np.float64):
+    """
+    Compare this engine with the Skyfield path over one UTC day at 1-minute steps.
+
+    Returns:
+        dict with max_alt_error and max_az_error (on-sky, degrees, samples
+        above the horizon), seconds for each engine and the number of objects
+        whose visible span differs by more than one sample
+    """
+    from todays_dsos_web import evaluate_targets as skyfield_targets
+
+    time_range = ts.utc(target_date.year, target_date.month, target_date.day, 0, np.arange(1440))
+    observer_pos = eph['earth'] + Topos(latitude, longitude)
+
+    start = time.perf_counter()
+    observer_at = observer_pos.at(time_range)
+    reference = skyfield_targets(observer_at, ra_deg, dec_deg, *criteria, track_step=1)
+    skyfield_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = evaluate_targets(time_range, eph, latitude, longitude, ra_deg, dec_deg, *criteria,
+                            track_step=1, dtype=dtype)
+    fast_seconds = time.perf_counter() - start
+
+    ref_alt, ref_az = reference[2][..., 0], reference[2][..., 1]
+    fast_alt, fast_az = fast[2][..., 0], fast[2][..., 1]
+    up = ref_alt > 0
+    alt_error = np.abs(fast_alt - ref_alt)[up]
+    az_error = (np.abs((fast_az - ref_az + 180.0) % 360.0 - 180.0) * np.cos(np.radians(ref_alt)))[up]
+    span_error = np.abs(fast[0].astype(np.int64) - reference[0]).max(axis=1)
+
+    return {
+        'max_alt_error': float(alt_error.max()) if alt_error.size else 0.0,
+        'max_az_error': float(az_error.max()) if az_error.size else 0.0,
+        'skyfield_seconds': skyfield_seconds,
+        'fast_seconds': fast_seconds,
+        'span_mismatches': int((span_error > 1).sum()),
+    }
+
+
+def check(dates, latitudes, longitude=CHECK_LONGITUDE, catalog_path=None, criteria=(18.0, 0.0, 360.0),
+          dtype=np.float64):
+    """
+    Print the error budget and speedup of this engine against Skyfield.
+
+    Returns:
+        True if every alt/az error is within ERROR_BOUND
+    """
+    from todays_dsos_web import load_targets
+
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    log = []
+    rows, ra_deg, dec_deg = load_targets(log, catalog_path)
+
+    print(f'Fast engine check: {len(rows)} objects x 1440 samples, {np.dtype(dtype).name}, bound {ERROR_BOUND} deg')
+    print(f"  {'date':<10} {'lat':>7} {'alt err':>9} {'az err':>9} {'skyfield':>9} {'fast':>8} {'speedup':>8}  spans")
+    ok = True
+    for target_date in dates:
+        for latitude in latitudes:
+            r = compare(target_date, latitude, longitude, ra_deg, dec_deg, ts, eph, criteria, dtype)
+            ok &= max(r['max_alt_error'], r['max_az_error']) <= ERROR_BOUND
+            print(f"  {target_date.isoformat():<10} {latitude:7.2f} {r['max_alt_error']:9.4f} "
+                  f"{r['max_az_error']:9.4f} {r['skyfield_seconds']:8.3f}s {r['fast_seconds']:7.3f}s "
+                  f"{r['skyfield_seconds'] / r['fast_seconds']:7.1f}x  "
+                  f"{'ok' if not r['span_mismatches'] else str(r['span_mismatches']) + ' differ'}")
+    print('PASS' if ok else 'FAIL')
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the fast alt/az engine against Skyfield')
+    parser.add_argument('--float32', action='store_true', help='Compute in float32 instead of float64')
+    parser.add_argument('--memory-budget', type=float, default=DEFAULT_MEMORY_BUDGET / (1 << 20),
+                        help=f'Working memory per block in MB (default: {DEFAULT_MEMORY_BUDGET >> 20})')
+    parser.add_argument('--benchmark', nargs='+', type=int, metavar='N',
+                        help='Time random catalogs of N objects (with peak RSS) instead of checking')
+    parser.add_argument('--dates', nargs='+', help='Dates in YYYY-MM-DD format (default: today)')
+    parser.add_argument('--latitudes', nargs='+', type=float, default=list(CHECK_LATITUDES),
+                        help='Observer latitudes in degrees')
+    parser.add_argument('--longitude', type=float, default=CHECK_LONGITUDE, help='Observer longitude in degrees')
+    parser.add_argument('--catalog', help='Load objects from a dso_catalog.py catalog instead of the Google Sheet')
+    parser.add_argument('--data-dir', help='Directory holding de421.bsp and timescale files')
+    parser.add_argument('--ephemeris', help='Kernel file name inside the data directory')
+    args = parser.parse_args()
+    ephemeris_data.configure(args.data_dir, args.ephemeris)
+
+    try:
+        dates = [datetime.datetime.strptime(d, '%Y-%m-%d').date() for d in args.dates or []] \
+            or [datetime.date.today()]
+    except ValueError:
+        print('Error: Invalid date format. Use YYYY-MM-DD')
+        sys.exit(1)
+
+    dtype = np.float32 if args.float32 else np.float64
+    if args.benchmark:
+        benchmark(args.benchmark, dates[0], memory_budget=int(args.memory_budget * (1 << 20)), dtype=dtype)
+        sys.exit(0)
+    sys.exit(0 if check(dates, args.latitudes, args.longitude, args.catalog, dtype=dtype) else 1)
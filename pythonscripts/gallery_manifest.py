@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+gallery_manifest.py
+
+Builds public/gallery_manifest.json: the landing page's image lists and gallery
+items (joined with dso_watchlist_info.json, sorted by display name, with
+variant paths and image dimensions) precomputed once, so index.php reads one
+file instead of scanning directories and parsing the info JSON per request.
+
+Rebuilds are incremental: nothing happens if the image directories and info
+file are unchanged since the last build, and image dimensions are reused for
+files whose size and mtime are unchanged. index.php falls back to scanning if
+the manifest is missing or older than any of its inputs.
+
+When the unified catalog (dso_catalog.py) has been built, it is used to match
+images whose filename prefix is not an info file key (e.g. an alternate
+designation), and each item records its catalog key and watchlist membership.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from PIL import Image
+import dso_catalog
+import dso_info
+
+PUBLIC_DIR = Path(__file__).resolve().parent.parent / "public"
+
+MANIFEST_NAME = "gallery_manifest.json"
+MANIFEST_VERSION = 1
+
+# Same list as $extensions in index.php
+EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+
+# Web paths (relative to public/) the manifest is built from
+FULL_DIR = "images/annotated_full"
+WALL_DIR = "images/annotated_wall"
+FAV_DIR = "images/fav"
+THUMB_DIR = "images/thumbs"
+INFO_FILE = "dso_watchlist_info.json"
+INPUTS = (FULL_DIR, WALL_DIR, FAV_DIR, THUMB_DIR, INFO_FILE)
+
+# Suffixes stripped by extractBaseName() in index.php, longest first
+BASE_NAME_SUFFIXES = ("_fav_annotated", "_full_annotated", "_wall_annotated", "_fav", "_full", "_wall")
+
+
+def natural_key(name: str) -> list:
+    """Sort key matching PHP's SORT_NATURAL | SORT_FLAG_CASE."""
+    return [int(part) if part.isdigit() else part.casefold() for part in re.split(r"(\d+)", name)]
+
+
+def list_images(public_dir: Path, web_dir: str) -> dict[str, os.stat_result]:
+    """Map file name -> stat for image files directly inside public_dir/web_dir."""
+    files = {}
+    try:
+        with os.scandir(public_dir / web_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and Path(entry.name).suffix[1:].lower() in EXTENSIONS:
+                    files[entry.name] = entry.stat()
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def gather_images(listing: dict, web_dir: str) -> list[str]:
+    """Equivalent of gatherImages() in index.php."""
+    return sorted((f"{web_dir}/{name}" for name in listing), key=natural_key)
+
+
+def extract_dso_name(filename: str) -> str | None:
+    """Equivalent of extractDSOName() in index.php."""
+    stem = Path(filename).stem
+    return stem.split("_")[0].strip().upper().replace(" ", "")
+
+
+def extract_base_name(filename: str) -> str:
+    """Equivalent of extractBaseName() in index.php."""
+    stem = Path(filename).stem
+    for suffix in BASE_NAME_SUFFIXES:
+        if stem.endswith(suffix):
+            return stem[: -len(suffix)]
+    return stem
+
+
+def get_dso_info(dso_key: str | None, info_data: dict) -> dict | None:
+    """Equivalent of getDSOInfo() in index.php, including "See" redirection."""
+    if not dso_key or dso_key not in info_data:
+        return None
+    entry = info_data[dso_key]
+    if entry.get("See") and entry["See"] in info_data:
+        return info_data[entry["See"]]
+    if len(entry) > 2 or (len(entry) == 2 and "See" not in entry):
+        return entry
+    return None
+
+
+def image_size(path: Path) -> tuple[int, int] | None:
+    """Pixel dimensions from the image header, or None if unreadable."""
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except (OSError, ValueError):
+        return None
+
+
+def input_mtimes(public_dir: Path) -> dict[str, int | None]:
+    mtimes = {}
+    for name in INPUTS:
+        try:
+            mtimes[name] = (public_dir / name).stat().st_mtime_ns
+        except FileNotFoundError:
+            mtimes[name] = None
+    return mtimes
+
+
+def load_manifest(manifest_path: Path) -> dict | None:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def build_manifest(public_dir: Path = PUBLIC_DIR, force: bool = False,
+                   catalog_path: Path | None = None) -> tuple[dict, bool]:
+    """
+    Rebuild the gallery manifest if any input changed.
+
+    Args:
+        public_dir: Web root
+        force: Rebuild even if no input changed
+        catalog_path: Unified catalog (default: dso_catalog's, if it exists)
+
+    Returns:
+        (manifest, rebuilt)
+    """
+    manifest_path = public_dir / MANIFEST_NAME
+    previous = load_manifest(manifest_path)
+    mtimes = input_mtimes(public_dir)
+
+    if catalog_path is None:
+        catalog_path = dso_catalog.default_catalog_path()
+    catalog = None
+    if catalog_path.exists():
+        catalog = dso_catalog.load_catalog(catalog_path)
+        catalog_index = dso_catalog.lookup_index(catalog)
+        mtimes["catalog"] = catalog_path.stat().st_mtime_ns
+
+    if previous and not force and previous["inputs"] == mtimes:
+        return previous, False
+
+    # Reuse dimensions for unchanged files
+    known_sizes = {}
+    if previous:
+        for item in previous["galleryItems"]:
+            known_sizes[item["fullPath"]] = (item["fileSize"], item["mtime"], item["width"], item["height"])
+
+    info_data = dso_info.load_info(public_dir / INFO_FILE) or {}
+
+    full_listing = list_images(public_dir, FULL_DIR)
+    wall_listing = list_images(public_dir, WALL_DIR)
+    fav_listing = list_images(public_dir, FAV_DIR)
+    thumb_listing = list_images(public_dir, THUMB_DIR)
+
+    full_images = gather_images(full_listing, FULL_DIR)
+    wall_images = gather_images(wall_listing, WALL_DIR)
+
+    gallery_items = []
+    for img_path in full_images:
+        filename = img_path.rsplit("/", 1)[1]
+        dso_key = extract_dso_name(filename)
+        base_name = extract_base_name(filename)
+        wallpaper_path = img_path.replace(FULL_DIR, WALL_DIR).replace("_full_annotated", "_wall_annotated")
+        fav_path = img_path.replace(FULL_DIR, FAV_DIR).replace("_full_annotated", "_fav")
+        thumb_name = f"{base_name}_thumb.jpg"
+        info = get_dso_info(dso_key, info_data)
+
+        row = catalog_index.get(dso_info.normalize_name(dso_key)) if catalog is not None else None
+        if info is None and row is not None and catalog["info_key"][row]:
+            info = get_dso_info(str(catalog["info_key"][row]), info_data)
+
+        stat = full_listing[filename]
+        cached = known_sizes.get(img_path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            width, height = cached[2], cached[3]
+        else:
+            width, height = image_size(public_dir / img_path) or (None, None)
+
+        gallery_items.append({
+            "filename": filename,
+            "baseName": base_name,
+            "fullPath": img_path,
+            "favPath": fav_path,
+            "thumbPath": f"{THUMB_DIR}/{thumb_name}",
+            "wallpaperPath": wallpaper_path,
+            "displayName": info["CommonName"] if info and "CommonName" in info else "Unknown",
+            "dsoKey": dso_key,
+            "info": info,
+            "catalogKey": str(catalog["key"][row]) if row is not None else None,
+            "inWatchlist": bool(catalog["in_watchlist"][row]) if row is not None else False,
+            "hasThumb": thumb_name in thumb_listing,
+            "hasFav": fav_path.rsplit("/", 1)[1] in fav_listing,
+            "hasWallpaper": wallpaper_path.rsplit("/", 1)[1] in wall_listing,
+            "width": width,
+            "height": height,
+            "fileSize": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        })
+
+    # usort(... strcmp(displayName)) in index.php; both sorts are stable
+    gallery_items.sort(key=lambda item: item["displayName"].encode("utf-8"))
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "inputs": mtimes,
+        "fullImages": full_images,
+        "wallImages": wall_images,
+        "galleryItems": gallery_items,
+    }
+
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, manifest_path)
+    return manifest, True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the landing page gallery manifest")
+    parser.add_argument("--public-dir", type=Path, default=PUBLIC_DIR, help="Web root (default: ../public)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if no input changed")
+    parser.add_argument("--catalog", type=Path, help="Unified catalog (default: <data dir>/dso_catalog.npz if built)")
+    args = parser.parse_args()
+
+    try:
+        manifest, rebuilt = build_manifest(args.public_dir, args.force, args.catalog)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+
+    print(json.dumps({
+        "success": True,
+        "rebuilt": rebuilt,
+        "gallery_items": len(manifest["galleryItems"]),
+        "missing_thumbs": sum(1 for item in manifest["galleryItems"] if not item["hasThumb"]),
+    }, indent=2))
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+image_derivatives.py
+
+Builds the image variants the site expects from each full-size source:
+
+    full/<base>_full.jpg                 -> fav/<base>_fav.jpg, wall/<base>_wall.jpg
+    annotated_full/<base>_full_annotated -> annotated_fav, annotated_wall,
+                                            thumbs/<base>_thumb.jpg (gallery)
+
+Sources are processed across a process pool. A source is skipped when its
+content hash, the variant settings and all of its outputs are unchanged since
+the last run (tracked in .derivatives.json in the images directory). Outputs
+are written atomically. WebP/AVIF copies go in a per-format subdirectory of
+each variant directory (e.g. fav/webp/<base>_fav.webp) so the slideshow and
+orphan scanner, which list only files directly in each directory, don't see
+them as extra images.
+
+Existing variants that this script did not create are left alone unless
+--overwrite is given, so hand-made crops are preserved.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image, ImageOps, features
+from image_index import BASE_PATH, extract_base_name
+
+# Full-size source directories and their filename suffixes
+SOURCES = {
+    "full": "_full",
+    "annotated_full": "_full_annotated",
+}
+
+# Output directory -> (source directory, filename suffix, bounding box, JPEG quality).
+# Images are scaled down to fit the bounding box, keeping their aspect ratio.
+VARIANTS = {
+    "wall": ("full", "_wall", (3840, 2160), 92),
+    "fav": ("full", "_fav", (1920, 1920), 90),
+    "annotated_wall": ("annotated_full", "_wall_annotated", (3840, 2160), 92),
+    "annotated_fav": ("annotated_full", "_fav_annotated", (1920, 1920), 90),
+    "thumbs": ("annotated_full", "_thumb", (480, 480), 82),
+}
+
+# Output formats: name -> (extension, subdirectory or "" for the variant directory, Pillow save options)
+FORMATS = {
+    "jpeg": (".jpg", "", {"format": "JPEG", "optimize": True, "progressive": True}),
+    "webp": (".webp", "webp", {"format": "WEBP", "method": 4}),
+    "avif": (".avif", "avif", {"format": "AVIF", "speed": 6}),
+}
+
+MANIFEST_NAME = ".derivatives.json"
+MANIFEST_VERSION = 1
+
+
+def available_formats() -> set[str]:
+    """Formats the installed Pillow can write."""
+    formats = {"jpeg"}
+    if features.check("webp"):
+        formats.add("webp")
+    if features.check("avif"):
+        formats.add("avif")
+    return formats
+
+
+def settings_hash(formats: list[str]) -> str:
+    """Hash of everything that affects output bytes besides the source itself."""
+    data = json.dumps([VARIANTS, sorted(formats)], sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_paths(base_path: Path, source_dir: str, base_name: str, formats: list[str]) -> list[Path]:
+    """Every output file built from one source, largest variant first."""
+    paths = []
+    for out_dir, (src_dir, suffix, _, _) in VARIANTS.items():
+        if src_dir != source_dir:
+            continue
+        for fmt in formats:
+            ext, subdir, _ = FORMATS[fmt]
+            paths.append(base_path / out_dir / subdir / f"{base_name}{suffix}{ext}")
+    return paths
+
+
+def save_atomic(image: Image.Image, path: Path, options: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        image.save(tmp, **options)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def build_source(task: dict) -> dict:
+    """
+    Pool task: decode one source once and write all of its variants.
+
+    Variants are produced largest first, each downscaled from the previous one.
+
+    Returns:
+        {"source", "written": [paths], "skipped": [paths], "error"}
+    """
+    base_path = Path(task["base_path"])
+    source = base_path / task["source"]
+    result = {"source": task["source"], "written": [], "skipped": [], "error": None}
+
+    try:
+        with Image.open(source) as original:
+            largest = max(VARIANTS[d][2] for d in task["variants"])
+            # Let the JPEG decoder do most of the downscaling (DCT scaling)
+            original.draft("RGB", largest)
+            image = ImageOps.exif_transpose(original).convert("RGB")
+            icc_profile = original.info.get("icc_profile")
+
+        for out_dir in task["variants"]:
+            _, suffix, box, quality = VARIANTS[out_dir]
+            image.thumbnail(box, Image.Resampling.LANCZOS)
+            for fmt in task["formats"]:
+                ext, subdir, options = FORMATS[fmt]
+                path = base_path / out_dir / subdir / f"{task['base_name']}{suffix}{ext}"
+                rel = path.relative_to(base_path).as_posix()
+                if path.exists() and rel not in task["owned"] and not task["overwrite"]:
+                    result["skipped"].append(rel)
+                    continue
+                options = dict(options, quality=quality)
+                if icc_profile:
+                    options["icc_profile"] = icc_profile
+                save_atomic(image, path, options)
+                result["written"].append(rel)
+    except Exception as e:
+        result["error"] = str(e)
+
+    return result
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "settings": None, "sources": {}}
+
+
+def save_manifest(manifest: dict, manifest_path: Path) -> None:
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, manifest_path)
+
+
+def plan_tasks(base_path: Path, manifest: dict, formats: list[str], overwrite: bool) -> list[dict]:
+    """
+    Work out which sources need building.
+
+    A source is rebuilt when its content hash or the settings changed, or when
+    any of its outputs is missing. Hashes are only recomputed for sources whose
+    size or mtime changed since the last run.
+    """
+    settings = settings_hash(formats)
+    tasks = []
+    seen = set()
+
+    for source_dir, suffix in SOURCES.items():
+        dir_path = base_path / source_dir
+        if not dir_path.is_dir():
+            continue
+        variants = [d for d, spec in VARIANTS.items() if spec[0] == source_dir]
+
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                base_name = extract_base_name(entry.name, suffix)
+                if not base_name:
+                    continue
+
+                rel = f"{source_dir}/{entry.name}"
+                seen.add(rel)
+                stat = entry.stat()
+                record = manifest["sources"].get(rel, {})
+
+                if record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns:
+                    sha = record["sha256"]
+                else:
+                    sha = file_sha256(Path(entry.path))
+
+                outputs = output_paths(base_path, source_dir, base_name, formats)
+                up_to_date = (
+                    not overwrite
+                    and record.get("sha256") == sha
+                    and manifest.get("settings") == settings
+                    and all(p.exists() for p in outputs)
+                )
+                manifest["sources"][rel] = dict(record, size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=sha)
+                if up_to_date:
+                    continue
+
+                tasks.append({
+                    "base_path": str(base_path),
+                    "source": rel,
+                    "base_name": base_name,
+                    "variants": variants,
+                    "formats": formats,
+                    "owned": record.get("outputs", []),
+                    "overwrite": overwrite,
+                })
+
+    # Forget sources that were removed
+    for rel in set(manifest["sources"]) - seen:
+        del manifest["sources"][rel]
+
+    return tasks
+
+
+def build_derivatives(base_path: Path, formats: list[str], workers: int | None = None,
+                      overwrite: bool = False) -> dict:
+    """
+    Build all missing or outdated variants under base_path.
+
+    Returns:
+        Summary dict with counts plus per-source errors
+    """
+    manifest_path = base_path / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    tasks = plan_tasks(base_path, manifest, formats, overwrite)
+
+    summary = {"sources": len(manifest["sources"]), "built": 0, "written": 0, "skipped": [], "errors": []}
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(build_source, tasks, chunksize=4):
+                record = manifest["sources"][result["source"]]
+                if result["error"]:
+                    # Forget the hash so the source is retried next run
+                    manifest["sources"][result["source"]] = {"outputs": record.get("outputs", [])}
+                    summary["errors"].append({"source": result["source"], "error": result["error"]})
+                    continue
+                record["outputs"] = sorted(set(record.get("outputs", [])) | set(result["written"]))
+                summary["built"] += 1
+                summary["written"] += len(result["written"])
+                summary["skipped"].extend(result["skipped"])
+
+    manifest["settings"] = settings_hash(formats)
+    save_manifest(manifest, manifest_path)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build fav/wall/thumbnail variants from full-size images")
+    parser.add_argument("--base-path", type=Path, default=BASE_PATH,
+                        help="Directory containing the image directories")
+    parser.add_argument("--formats", default="jpeg",
+                        help="Comma-separated output formats: jpeg, webp, avif (default: jpeg)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Rebuild everything, replacing variants this script did not create")
+    args = parser.parse_args()
+
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    unsupported = [f for f in formats if f in FORMATS and f not in available_formats()]
+    if unknown or unsupported or "jpeg" not in formats:
+        print(json.dumps({
+            "success": False,
+            "error": f"Unknown formats {unknown}, unsupported by this Pillow {unsupported}; "
+                     f"jpeg is always required (site pages link the .jpg variants)"
+        }))
+        sys.exit(1)
+
+    summary = build_derivatives(args.base_path, formats, args.workers, args.overwrite)
+    print(json.dumps(dict(summary, success=not summary["errors"]), indent=2))
+    if summary["errors"]:
+        sys.exit(1)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+image_index.py
+
+Persistent index of the image library: base name -> which of the 6 variants
+exist (fav, full, wall and their annotated versions), with size and mtime.
+
+The index is stored as a JSON manifest. On refresh, a directory is only
+re-listed when its own mtime differs from the one recorded in the manifest
+(entries added, removed or renamed); directories are scanned concurrently with
+os.scandir. Use full=True to also catch files overwritten in place.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Default image library location
+BASE_PATH = Path(r"C:\laragon7\www\astro\public\images")
+
+# Directory names and their corresponding filename suffixes
+DIRECTORIES = {
+    "fav": "_fav",
+    "full": "_full",
+    "wall": "_wall",
+    "annotated_fav": "_fav_annotated",
+    "annotated_full": "_full_annotated",
+    "annotated_wall": "_wall_annotated",
+}
+
+VALID_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+MANIFEST_NAME = ".image_index.json"
+MANIFEST_VERSION = 1
+
+
+def extract_base_name(filename: str, suffix: str) -> str | None:
+    """
+    Extract the base name from a filename by removing the suffix and extension.
+
+    Example: "M31_20250113_fav.jpg" with suffix "_fav" -> "M31_20250113"
+    """
+    path = Path(filename)
+
+    # Check if valid image extension
+    if path.suffix.lower() not in VALID_EXTENSIONS:
+        return None
+
+    # Remove extension first
+    name_without_ext = path.stem
+
+    # Check if the name ends with the expected suffix
+    if not name_without_ext.endswith(suffix):
+        return None
+
+    # Remove the suffix to get base name
+    base_name = name_without_ext[: -len(suffix)]
+
+    return base_name if base_name else None
+
+
+def scan_directory(dir_path: Path, suffix: str) -> dict:
+    """
+    List one image directory with os.scandir.
+
+    Returns:
+        {"mtime_ns": directory mtime or None if missing,
+         "files": {base_name: {"file", "size", "mtime_ns"}}}
+    """
+    try:
+        dir_mtime = dir_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {"mtime_ns": None, "files": {}}
+
+    files = {}
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            base_name = extract_base_name(entry.name, suffix)
+            if base_name:
+                stat = entry.stat()
+                files[base_name] = {
+                    "file": entry.name,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+
+    return {"mtime_ns": dir_mtime, "files": files}
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    """Load a manifest, returning an empty one if missing, unreadable or outdated."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "directories": {}}
+
+
+def save_manifest(manifest: dict, manifest_path: Path) -> None:
+    """Write the manifest atomically."""
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, manifest_path)
+
+
+def refresh_index(base_path: Path, manifest_path: Path | None = None, full: bool = False) -> dict:
+    """
+    Bring the manifest up to date with the image directories and save it.
+
+    Args:
+        base_path: Directory containing the 6 image directories
+        manifest_path: Manifest location (default: base_path / MANIFEST_NAME)
+        full: Re-list every directory even if its mtime is unchanged
+
+    Returns:
+        The manifest, with a "rescanned" list naming the directories re-listed
+    """
+    if manifest_path is None:
+        manifest_path = base_path / MANIFEST_NAME
+
+    manifest = load_manifest(manifest_path)
+    if manifest.get("base_path") != str(base_path):
+        manifest = {"version": MANIFEST_VERSION, "directories": {}}
+    manifest["base_path"] = str(base_path)
+    known = manifest["directories"]
+
+    def current_mtime(dir_name):
+        try:
+            return (base_path / dir_name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    stale = [
+        dir_name for dir_name in DIRECTORIES
+        if full or dir_name not in known or known[dir_name]["mtime_ns"] != current_mtime(dir_name)
+    ]
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+            results = pool.map(lambda d: scan_directory(base_path / d, DIRECTORIES[d]), stale)
+            for dir_name, result in zip(stale, results):
+                known[dir_name] = result
+        save_manifest(manifest, manifest_path)
+
+    manifest["rescanned"] = stale
+    return manifest
+
+
+def image_sets(manifest: dict) -> dict[str, dict[str, dict]]:
+    """
+    Group manifest entries by base name.
+
+    Returns:
+        {base_name: {dir_name: {"file", "size", "mtime_ns"}}}
+    """
+    sets = {}
+    for dir_name, listing in manifest["directories"].items():
+        for base_name, entry in listing["files"].items():
+            sets.setdefault(base_name, {})[dir_name] = entry
+    return sets
+
+
+def file_path(base_path: Path, dir_name: str, entry: dict) -> Path:
+    """Full path of a manifest entry."""
+    return base_path / dir_name / entry["file"]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh the image library index")
+    parser.add_argument("base_path", help="Directory containing the image directories")
+    parser.add_argument("--full", action="store_true", help="Re-list every directory")
+    args = parser.parse_args()
+
+    result = refresh_index(Path(args.base_path), full=args.full)
+    sets = image_sets(result)
+    print(json.dumps({
+        "rescanned": result["rescanned"],
+        "image_sets": len(sets),
+        "complete_sets": sum(1 for dirs in sets.values() if len(dirs) == len(DIRECTORIES)),
+    }, indent=2))
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Incremental visibility windows over a run of nights.
+
+A fixed target's altitude and azimuth depend only on its hour angle, so each
+night repeats the previous night's tracks about 3m56s earlier (a sidereal day
+is 1436.07 minutes), give or take the slow drift of the apparent place. Instead
+of running the Skyfield chain for every object over every night:
+
+    - reference_day() evaluates every object exactly over one sidereal day,
+    - evaluate_night() looks each sample of a later night up in the reference
+      by local sidereal time. A sample further from the altitude and azimuth
+      thresholds than the reference grid's own step plus the object's apparent
+      place drift since the reference day is classified from the reference,
+    - the remaining samples, near a predicted crossing, are evaluated with
+      Skyfield, but only where they could move the first or last visible
+      sample.
+
+Objects that stay close to a threshold (grazing the altitude floor, or near
+the zenith where azimuth swings fast) simply get more samples evaluated
+exactly; in the limit that is full evaluation. The first/last visible samples
+are the ones todays_dsos_web.evaluate_targets() finds. Compare both over a
+date range:
+
+    python night_series.py --start 2025-11-01 --nights 30 --catalog data/dso_catalog.npz
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+import numpy as np
+from zoneinfo import ZoneInfo
+from skyfield.api import Angle, Star, Topos
+import ephemeris_data
+from fast_altaz import apparent_radec
+from profile_manager import load_profile
+from todays_dsos_web import (evaluate_targets, get_viewing_window, load_targets, observer_grid,
+                             skyfield_internals_available)
+
+# Reference samples (1 minute apart) cover one sidereal day of local sidereal time
+REFERENCE_MINUTES = 1440
+
+# Degrees added to each object's apparent place drift for what apparent_radec()
+# leaves out (light deflection, diurnal aberration, change within a night)
+DRIFT_MARGIN = 0.005
+
+
+def _neighbour_step(values, wrap=False):
+    """(N, J) largest change from each sample to either neighbouring sample."""
+    diff = np.diff(values, axis=1)
+    if wrap:
+        diff = (diff + 180.0) % 360.0 - 180.0
+    diff = np.abs(diff)
+    step = np.empty_like(values)
+    step[:, 0] = diff[:, 0]
+    step[:, -1] = diff[:, -1]
+    np.maximum(diff[:, :-1], diff[:, 1:], out=step[:, 1:-1])
+    return step
+
+
+def reference_day(target_date, profile, ra_deg, dec_deg, ts, eph):
+    """
+    Evaluate every target exactly over one sidereal day from local noon.
+
+    Args:
+        target_date: First night of the run
+        profile: Observing profile (location and criteria)
+        ra_deg, dec_deg: float64 arrays of target coordinates
+        ts, eph: Skyfield timescale and ephemeris
+
+    Returns:
+        dict with the profile's longitude and criteria, lst ((J,) increasing
+        local sidereal time in degrees), alt_ok/az_ok ((N, J) criteria met),
+        alt_slack/az_slack ((N, J) float32 on-sky degrees from the threshold,
+        less the change to a neighbouring sample) and the apparent RA/Dec at
+        the middle of the day
+    """
+    min_alt, az_min, az_max = profile['min_altitude'], profile['az_min'], profile['az_max']
+    noon = datetime.datetime.combine(target_date, datetime.time(12), ZoneInfo(profile['timezone']))
+    start = ts.from_datetime(noon)
+    time_range = ts.tt_jd(start.tt + np.arange(REFERENCE_MINUTES) / 1440.0)
+
+    observer_pos = eph['earth'] + Topos(profile['latitude'], profile['longitude'])
+    _, _, tracks = evaluate_targets(observer_pos.at(time_range), ra_deg, dec_deg, min_alt, az_min, az_max,
+                                    track_step=1)
+    alt = tracks[:, :, 0]
+    az = tracks[:, :, 1]
+    cos_alt = np.cos(np.radians(alt))
+
+    if az_min <= 0 and az_max >= 360:
+        az_slack = np.full(alt.shape, np.inf, dtype=np.float32)
+    else:
+        to_min = np.abs((az - az_min + 180.0) % 360.0 - 180.0)
+        to_max = np.abs((az - az_max + 180.0) % 360.0 - 180.0)
+        az_slack = (np.minimum(to_min, to_max) - _neighbour_step(az, wrap=True)) * cos_alt
+
+    lst = np.degrees(np.unwrap(np.radians(time_range.gast * 15.0 + profile['longitude'])))
+    ra, dec = apparent_radec(ra_deg, dec_deg, time_range[len(time_range) // 2], eph)
+    return {
+        'longitude': profile['longitude'],
+        'criteria': (min_alt, az_min, az_max),
+        'lst': lst - 360.0 * np.floor(lst[0] / 360.0),
+        'alt_ok': alt >= min_alt,
+        'az_ok': (az >= az_min) & (az <= az_max),
+        'alt_slack': (np.abs(alt - min_alt) - _neighbour_step(alt)).astype(np.float32),
+        'az_slack': az_slack.astype(np.float32),
+        'ra': ra,
+        'dec': dec,
+    }
+
+
+def drift(reference, t, ra_deg, dec_deg, eph):
+    """Per-object angle (degrees) between the apparent place at t and at the reference day, plus DRIFT_MARGIN."""
+    ra, dec = apparent_radec(ra_deg, dec_deg, t, eph)
+    cos_sep = (np.sin(dec) * np.sin(reference['dec'])
+               + np.cos(dec) * np.cos(reference['dec']) * np.cos(ra - reference['ra']))
+    return np.degrees(np.arccos(np.clip(cos_sep, -1.0, 1.0))) + DRIFT_MARGIN
+
+
+def observer_subset(observer_at, samples, observer_pos=None):
+    """
+    The observer position at some samples of the grid, without recomputing the
+    ephemeris (see observer_grid(), which falls back to
+    observer_pos.at() when Skyfield's internals are not available).
+    """
+    if not skyfield_internals_available():
+        return observer_grid(None, None, observer_at.t[samples], None, observer_pos=observer_pos)
+    return observer_grid(observer_at.xyz.au[:, samples], observer_at.velocity.au_per_d[:, samples],
+                         observer_at.t[samples], observer_at._ephemeris, observer_at._observer_gcrs_au[:, samples],
+                         observer_at._altaz_rotation[:, :, samples], observer_pos)
+
+
+def evaluate_night(reference, observer_at, ra_deg, dec_deg, eph, observer_pos=None):
+    """
+    First/last visible sample of every target, predicted from the reference day.
+
+    Args:
+        reference: reference_day() result for the same targets and profile
+        observer_at: Skyfield Barycentric observer position over the night's
+            time grid, as for todays_dsos_web.evaluate_targets()
+        ra_deg, dec_deg: Target coordinates
+        eph: Ephemeris
+        observer_pos: earth + Topos vector observer_at was computed from, used
+            if this Skyfield cannot rebuild sample subsets of observer_at
+
+    Returns:
+        (indices, exact) where indices is the (N, 2) int32 array
+        evaluate_targets() returns and exact is the number of object samples
+        evaluated with Skyfield
+    """
+    time_range = observer_at.t
+    min_alt, az_min, az_max = reference['criteria']
+
+    # Nearest reference sample by local sidereal time
+    ref_lst = reference['lst']
+    lst = (time_range.gast * 15.0 + reference['longitude']) % 360.0
+    lst = ref_lst[0] + (lst - ref_lst[0]) % 360.0
+    j = np.clip(np.searchsorted(ref_lst, lst), 1, len(ref_lst) - 1)
+    j -= (lst - ref_lst[j - 1]) < (ref_lst[j] - lst)
+
+    shift = drift(reference, time_range[len(time_range) // 2], ra_deg, dec_deg, eph)[:, None]
+    alt_sure = reference['alt_slack'][:, j] > shift
+    az_sure = reference['az_slack'][:, j] > shift
+    alt_ok = reference['alt_ok'][:, j]
+    az_ok = reference['az_ok'][:, j]
+    visible = alt_sure & az_sure & alt_ok & az_ok
+    ambiguous = ~(visible | (alt_sure & ~alt_ok) | (az_sure & ~az_ok))
+
+    count = len(ra_deg)
+    indices = np.full((count, 2), -1, dtype=np.int32)
+    exact = 0
+    for i in range(count):
+        sure = np.flatnonzero(visible[i])
+        unsure = np.flatnonzero(ambiguous[i])
+        if sure.size:
+            # Only samples outside the predicted span can change its ends
+            unsure = unsure[(unsure < sure[0]) | (unsure > sure[-1])]
+            sure = sure[[0, -1]]
+        if unsure.size:
+            star = Star(ra=Angle(degrees=ra_deg[i]), dec=Angle(degrees=dec_deg[i]))
+            alt, az, _ = observer_subset(observer_at, unsure, observer_pos).observe(star).apparent().altaz()
+            seen = (alt.degrees >= min_alt) & (az.degrees >= az_min) & (az.degrees <= az_max)
+            sure = np.concatenate([sure, unsure[seen]])
+            exact += unsure.size
+        if sure.size:
+            indices[i] = (sure.min(), sure.max())
+    return indices, exact
+
+
+def compare(profile_name, start_date, count, catalog_path=None):
+    """
+    Evaluate count nights both exactly and incrementally.
+
+    Returns:
+        dict with the number of objects, total object samples, samples
+        evaluated exactly by the incremental path, seconds for each path
+        (the incremental one including the reference day) and the nights
+        whose windows differ
+    """
+    profile = load_profile(profile_name)
+    criteria = (profile['min_altitude'], profile['az_min'], profile['az_max'])
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    _, ra_deg, dec_deg = load_targets([], catalog_path)
+    observer = Topos(profile['latitude'], profile['longitude'])
+    observer_pos = eph['earth'] + observer
+
+    start = time.perf_counter()
+    reference = reference_day(start_date, profile, ra_deg, dec_deg, ts, eph)
+    incremental_seconds = time.perf_counter() - start
+    exact_seconds = 0.0
+    samples = exact = 0
+    mismatches = []
+    for n in range(count):
+        target_date = start_date + datetime.timedelta(days=n)
+        viewing_start, viewing_end = get_viewing_window(target_date, ts, eph, observer)
+        if viewing_start is None or viewing_end is None:
+            continue
+        minutes = int((viewing_end.utc_datetime() - viewing_start.utc_datetime()).total_seconds() / 60)
+        observer_at = observer_pos.at(ts.linspace(viewing_start, viewing_end, minutes))
+
+        start = time.perf_counter()
+        expected, _, _ = evaluate_targets(observer_at, ra_deg, dec_deg, *criteria)
+        exact_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        indices, evaluated = evaluate_night(reference, observer_at, ra_deg, dec_deg, eph, observer_pos)
+        incremental_seconds += time.perf_counter() - start
+
+        samples += len(ra_deg) * minutes
+        exact += evaluated
+        if not np.array_equal(indices, expected):
+            mismatches.append(target_date.isoformat())
+
+    return {
+        'objects': len(ra_deg),
+        'samples': samples,
+        'exact_samples': exact,
+        'exact_seconds': round(exact_seconds, 3),
+        'incremental_seconds': round(incremental_seconds, 3),
+        'mismatches': mismatches,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check incremental night evaluation against the exact engine')
+    parser.add_argument('--start', help='First night YYYY-MM-DD (default: today)')
+    parser.add_argument('--nights', type=int, default=30, help='Number of nights (default: 30)')
+    parser.add_argument('--profile', default='default', help='Profile name (default: default)')
+    parser.add_argument('--catalog', help='Load targets from a dso_catalog.py catalog')
+    parser.add_argument('--data-dir', help='Data directory (default: $DSO_DATA_DIR or pythonscripts/data)')
+    parser.add_argument('--ephemeris', help='Kernel file name inside the data directory')
+    parser.add_argument('--offline', action='store_true', default=None, help='Never download ephemeris files')
+    args = parser.parse_args()
+    ephemeris_data.configure(args.data_dir, args.ephemeris, args.offline)
+
+    try:
+        start_date = datetime.date.fromisoformat(args.start) if args.start else datetime.date.today()
+        result = compare(args.profile, start_date, args.nights, args.catalog)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result['mismatches'] else 0)
@@ -0,0 +1,131 @@
+"""
+Observing quality of each object over the night's visible samples.
+
+Two objects visible for the same three hours can be very different targets if
+one stays at 20 degrees and the other passes 70. summarize() condenses an
+object's altitude at every sample where it meets the criteria into
+
+    airmass      time-weighted mean airmass while visible (Kasten & Young 1989)
+    best_block   longest stretch of consecutive visible samples, in minutes
+    tier minutes visible minutes at or above each altitude tier
+    quality      a weighted score, by default the visible hours each scaled
+                 by 1 / airmass ("zenith-equivalent" hours)
+
+It works on the (N, T) altitude array and visibility mask the engines and the
+visibility cache already have, so it adds no ephemeris work. A profile may
+change the tiers and the score's weighting:
+
+    "quality": {"tiers": [30, 45, 60], "tier_weights": [0, 0.5, 1],
+                "airmass_power": 2, "airmass_weight": 1, "block_weight": 0.5}
+
+    quality = airmass_weight * sum over visible hours of (1 / airmass) ** airmass_power
+            + block_weight * best block hours
+            + sum of tier_weights * hours at or above each tier
+"""
+import numpy as np
+
+DEFAULT_SETTINGS = {
+    'tiers': [30.0, 45.0, 60.0],
+    'tier_weights': [0.0, 0.0, 0.0],
+    'airmass_power': 1.0,
+    'airmass_weight': 1.0,
+    'block_weight': 0.0,
+}
+
+# Leading summarize() columns; one column of minutes per tier follows
+FIELDS = ('airmass', 'best_block', 'quality')
+
+
+def settings(profile):
+    """
+    Quality settings for a profile: its "quality" entry over DEFAULT_SETTINGS.
+
+    Tier weights default to 0 for every tier.
+
+    Raises:
+        ValueError: If tier_weights does not match tiers
+    """
+    custom = dict(profile.get('quality') or {})
+    result = {**DEFAULT_SETTINGS, **custom}
+    result['tiers'] = [float(tier) for tier in result['tiers']]
+    if 'tier_weights' not in custom:
+        result['tier_weights'] = [0.0] * len(result['tiers'])
+    result['tier_weights'] = [float(weight) for weight in result['tier_weights']]
+    if len(result['tier_weights']) != len(result['tiers']):
+        raise ValueError('quality tier_weights must have one weight per tier')
+    for key in ('airmass_power', 'airmass_weight', 'block_weight'):
+        result[key] = float(result[key])
+    return result
+
+
+def airmass(alt_deg):
+    """Kasten & Young (1989) relative airmass at an altitude in degrees (finite down to the horizon)."""
+    alt = np.maximum(alt_deg, 0.0)
+    return 1.0 / (np.sin(np.radians(alt)) + 0.50572 * (alt + 6.07995) ** -1.6364)
+
+
+def sample_step(minutes):
+    """Minutes per sample of a time grid (its usual spacing, ignoring gaps)."""
+    if len(minutes) < 2:
+        return 1.0
+    # Rounded so Skyfield times and cached datetimes give the same step
+    return round(float(np.median(np.diff(minutes))), 4)
+
+
+def summarize(alt, mask, minutes, quality_settings):
+    """
+    Quality columns for a block of objects.
+
+    Args:
+        alt: (B, T) altitude in degrees at every sample
+        mask: (B, T) bool, samples where the object meets the criteria
+        minutes: (T,) sample times in minutes; gaps longer than the usual
+            step (e.g. between time windows) break a contiguous block
+        quality_settings: settings() result
+
+    Returns:
+        (B, len(FIELDS) + tiers) float64 array: mean airmass (NaN when never
+        visible), best block minutes, quality score, minutes above each tier
+    """
+    # float32 like the visibility cache, so report and cache variants agree
+    alt = np.asarray(alt, dtype=np.float32)
+    mask = np.asarray(mask, dtype=bool)
+    minutes = np.asarray(minutes, dtype=np.float64)
+    step = sample_step(minutes)
+    count, samples = mask.shape
+    tiers = quality_settings['tiers']
+
+    result = np.zeros((count, len(FIELDS) + len(tiers)), dtype=np.float64)
+    visible = mask.sum(axis=1)
+    x = np.where(mask, airmass(alt), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result[:, 0] = np.where(visible > 0, x.sum(axis=1) / visible, np.nan)
+        weighted = np.where(mask, x, 1.0) ** -quality_settings['airmass_power']
+    weighted[~mask] = 0.0
+
+    # Run length ending at each sample: samples since the last one outside
+    # the mask, restarting after a gap in the grid
+    index = np.arange(samples)
+    gap = np.zeros(samples, dtype=bool)
+    gap[1:] = np.diff(minutes) > 1.5 * step
+    reset = np.where(~mask, index, np.where(gap, index - 1, -1))
+    runs = np.where(mask, index - np.maximum.accumulate(reset, axis=1), 0)
+    longest = runs.max(axis=1) if samples else np.zeros(count, dtype=np.int64)
+    result[:, 1] = np.maximum(longest - 1, 0) * step
+
+    hours = np.zeros(count)
+    for k, tier in enumerate(tiers):
+        result[:, len(FIELDS) + k] = ((alt >= tier) & mask).sum(axis=1) * step
+        hours += quality_settings['tier_weights'][k] * result[:, len(FIELDS) + k] / 60
+    result[:, 2] = (quality_settings['airmass_weight'] * weighted.sum(axis=1) * step / 60
+                    + quality_settings['block_weight'] * result[:, 1] / 60
+                    + hours)
+    return result
+
+
+def object_fields(values, quality_settings):
+    """Visible-object dict entries for one row of summarize()."""
+    fields = {key: float(value) for key, value in zip(FIELDS, values)}
+    fields['tier_minutes'] = {f'{tier:g}': float(value)
+                              for tier, value in zip(quality_settings['tiers'], values[len(FIELDS):])}
+    return fields
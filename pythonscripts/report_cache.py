@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Maintenance of the report cache in public/cache.
+
+vis.php caches one set of files per (profile, date):
+
+    dso_report_<profile>_<date>.html         report page
+    dso_report_<profile>_<date>.json         columnar payload
+    dso_report_<profile>_<date>.tracks.bin   alt/az track sidecar
+    dso_report_<profile>_<date>.vis.npz      visibility cache for variants
+
+This module keeps that directory bounded and cheap to serve:
+
+    - the payload and track files (which vis.php sends verbatim) get gzip and,
+      when the brotli package is installed, brotli siblings (.gz, .br), so
+      vis.php can send precompressed bytes,
+    - a total-size / entry-count / age budget is enforced by evicting the
+      least recently used reports,
+    - index.json records every report's files and sizes, hit count, last use
+      and a hash of its inputs (profile, catalog, ephemeris), so
+      cache-manager.php can list the cache without stat-ing every file,
+    - and the content hash of each page, payload, track and visibility file.
+      vis.php sends the payload and track hashes as their ETags (the
+      generator versions their URLs with the same hash) and derives the
+      page's ETag from the others (see page_etag()), so a revalidation is
+      answered without reading the page.
+
+vis.php appends "<report>\\t<unix time>" to hits.log on each cache hit; the
+next update folds those lines into the index. After generating a report,
+vis.php runs:
+
+    python report_cache.py add dso_report_default_2025-11-21 --profile default --date 2025-11-21
+
+Compress, refresh the index and evict by hand (or from cron):
+
+    python report_cache.py update --max-mb 200 --max-entries 500 --max-age-days 60
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+import ephemeris_data
+from report_renderer import content_hash, file_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / 'public' / 'cache'
+PROFILE_DIR = Path(__file__).resolve().parent / 'profiles'
+
+INDEX_NAME = 'index.json'
+INDEX_VERSION = 1
+HITS_NAME = 'hits.log'
+
+REPORT_PATTERN = re.compile(r'^(dso_report_(?P<profile>[A-Za-z0-9_-]+)_(?P<date>\d{4}-\d{2}-\d{2}))'
+                            r'(?P<suffix>\.html|\.json|\.tracks\.bin|\.vis\.npz)(?P<encoding>\.gz|\.br)?$')
+
+# Report files vis.php sends unchanged, and so worth precompressing
+COMPRESSED_SUFFIXES = ('.json', '.tracks.bin')
+
+# Report files whose content hash the index records for ETags
+ETAG_SUFFIXES = ('.html', '.json', '.tracks.bin', '.vis.npz')
+
+DEFAULT_MAX_MB = 256
+
+
+def available_encodings():
+    """Precompressed sibling extensions this installation can write."""
+    return ['.gz', '.br'] if brotli is not None else ['.gz']
+
+
+def compress_file(path, encodings=None):
+    """
+    Write precompressed siblings of one file (path + '.gz', path + '.br').
+
+    Siblings newer than the file are kept. Writes are atomic.
+
+    Returns:
+        Number of siblings written
+    """
+    path = Path(path)
+    encodings = available_encodings() if encodings is None else encodings
+    source_mtime = path.stat().st_mtime_ns
+    data = None
+    written = 0
+    for extension in encodings:
+        target = path.with_name(path.name + extension)
+        if target.exists() and target.stat().st_mtime_ns >= source_mtime:
+            continue
+        if data is None:
+            data = path.read_bytes()
+        # mtime=0 keeps the gzip bytes (and so their hash) reproducible
+        packed = gzip.compress(data, compresslevel=9, mtime=0) if extension == '.gz' else \
+            brotli.compress(data, quality=11)
+        tmp = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+        try:
+            tmp.write_bytes(packed)
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        written += 1
+    return written
+
+
+def input_hash(profile_name, target_date, catalog_path=None):
+    """
+    Hash of what a report was generated from: the date, the profile file,
+    the catalog (when one was used) and the ephemeris file name.
+
+    A report whose recorded hash differs from the current one is stale.
+    """
+    parts = [str(target_date), ephemeris_data.EPHEMERIS_FILE]
+    profile_path = PROFILE_DIR / f'{profile_name}.json'
+    parts.append(file_hash(profile_path) if profile_path.exists() else '')
+    parts.append(file_hash(catalog_path) if catalog_path else '')
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:16]
+
+
+def load_index(cache_dir):
+    """index.json of a cache directory, or an empty index."""
+    try:
+        with open(Path(cache_dir) / INDEX_NAME, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {'version': INDEX_VERSION, 'updated': None, 'total_bytes': 0, 'entries': {}}
+
+
+def save_index(cache_dir, index):
+    """Write index.json atomically."""
+    path = Path(cache_dir) / INDEX_NAME
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def artifact_etag(cache_dir, name, suffix, index=None):
+    """
+    Content hash of one report file, as vis.php sends it in the ETag header.
+
+    Taken from the index while the file's modification time and size still
+    match it, otherwise hashed from the file.
+
+    Args:
+        cache_dir: Cache directory
+        name: Report name, e.g. dso_report_default_2025-11-21
+        suffix: One of ETAG_SUFFIXES
+        index: load_index() result (default: read it)
+    """
+    path = Path(cache_dir) / (name + suffix)
+    index = load_index(cache_dir) if index is None else index
+    known = index['entries'].get(name, {}).get('etags', {}).get(suffix)
+    stat = path.stat()
+    if known and known['mtime'] == int(stat.st_mtime) and known['bytes'] == stat.st_size:
+        return known['etag']
+    return file_hash(path)
+
+
+def profile_names(profile_dir=PROFILE_DIR):
+    """Profile names in the order vis.php lists them in its controls."""
+    return sorted(path.stem for path in Path(profile_dir).glob('*.json') if path.is_file())
+
+
+def page_etag(html_etag, profiles=(), variant='', vis_etag=''):
+    """
+    ETag vis.php sends for a report page, quoted and weak.
+
+    The page served is the cached one plus vis.php's controls (which list the
+    profiles) and a cache status, which is left out as its wording changes
+    between requests. A variant is derived from the night's visibility cache.
+
+    Args:
+        html_etag: artifact_etag() of the .html file
+        profiles: profile_names()
+        variant: vis.php's variant arguments, '' for the stored report
+        vis_etag: artifact_etag() of the .vis.npz a variant is derived from
+    """
+    key = '\n'.join([html_etag, ','.join(profiles), variant, vis_etag])
+    return f'W/"{content_hash(key.encode())}"'
+
+
+def take_hits(cache_dir):
+    """
+    Consume hits.log.
+
+    The log is renamed before reading, so hits vis.php appends meanwhile go to
+    a new log and are picked up by the next update.
+
+    Returns:
+        dict of report name -> (hit count, last hit unix time)
+    """
+    log = Path(cache_dir) / HITS_NAME
+    taken = log.with_name(f'.{HITS_NAME}.{os.getpid()}')
+    try:
+        os.replace(log, taken)
+    except FileNotFoundError:
+        return {}
+    hits = {}
+    try:
+        for line in taken.read_text(encoding='utf-8', errors='replace').splitlines():
+            name, _, stamp = line.partition('\t')
+            try:
+                stamp = float(stamp)
+            except ValueError:
+                continue
+            count, last = hits.get(name, (0, 0.0))
+            hits[name] = (count + 1, max(last, stamp))
+    finally:
+        taken.unlink(missing_ok=True)
+    return hits
+
+
+def scan(cache_dir, index):
+    """
+    Refresh the index's entries from the files in the cache directory.
+
+    Hit counts, last use and input hashes of existing entries are kept;
+    entries whose files are gone are dropped. Content hashes (etags) are only
+    recomputed for files whose modification time or size changed.
+    """
+    entries = {}
+    with os.scandir(cache_dir) as it:
+        for item in it:
+            match = REPORT_PATTERN.match(item.name)
+            if not match or not item.is_file():
+                continue
+            name = match.group(1)
+            stat = item.stat()
+            previous = index['entries'].get(name, {})
+            entry = entries.setdefault(name, {
+                'profile': match.group('profile'),
+                'date': match.group('date'),
+                'files': {},
+                'bytes': 0,
+                'modified': 0,
+                'hits': previous.get('hits', 0),
+                'last_access': previous.get('last_access'),
+                'inputs': previous.get('inputs'),
+                'etags': {},
+            })
+            suffix = match.group('suffix')
+            entry['files'][suffix + (match.group('encoding') or '')] = stat.st_size
+            entry['bytes'] += stat.st_size
+            if match.group('encoding'):
+                continue
+            entry['modified'] = max(entry['modified'], int(stat.st_mtime))
+            if suffix in ETAG_SUFFIXES:
+                known = previous.get('etags', {}).get(suffix)
+                if not known or known['mtime'] != int(stat.st_mtime) or known['bytes'] != stat.st_size:
+                    known = {'etag': file_hash(item.path), 'mtime': int(stat.st_mtime), 'bytes': stat.st_size}
+                entry['etags'][suffix] = known
+    index['entries'] = entries
+    return index
+
+
+def evict(cache_dir, index, max_bytes=None, max_entries=None, max_age_days=None, keep=(), now=None):
+    """
+    Delete least recently used reports until the cache is within budget.
+
+    Reports unused (not hit, or generated) for more than max_age_days go
+    first, then the least recently used until both the size and entry budgets
+    hold.
+
+    Args:
+        cache_dir: Cache directory
+        index: scan() result, updated in place
+        max_bytes, max_entries, max_age_days: Budgets (None = unlimited)
+        keep: Report names never evicted (e.g. the one just generated)
+        now: Current unix time (default: time.time())
+
+    Returns:
+        list of evicted report names
+    """
+    now = time.time() if now is None else now
+    entries = index['entries']
+
+    def last_use(name):
+        entry = entries[name]
+        return max(entry['last_access'] or 0, entry['modified'])
+
+    order = sorted((name for name in entries if name not in keep), key=last_use)
+    total = sum(entry['bytes'] for entry in entries.values())
+    count = len(entries)
+    evicted = []
+    for name in order:
+        expired = max_age_days is not None and now - last_use(name) > max_age_days * 86400
+        over = (max_bytes is not None and total > max_bytes) or (max_entries is not None and count > max_entries)
+        if not (expired or over):
+            continue
+        for file_name in entries[name]['files']:
+            (Path(cache_dir) / (name + file_name)).unlink(missing_ok=True)
+        total -= entries[name]['bytes']
+        count -= 1
+        evicted.append(name)
+        del entries[name]
+    return evicted
+
+
+def update(cache_dir=CACHE_DIR, max_bytes=None, max_entries=None, max_age_days=None, added=None):
+    """
+    Compress, fold in hits, evict and rewrite the index.
+
+    Args:
+        cache_dir: Cache directory
+        max_bytes, max_entries, max_age_days: Budgets for evict()
+        added: Optional (report name, input hash) of a just-generated report;
+            it counts as used now and is never evicted by this update
+
+    Returns:
+        dict summary: entries, total_bytes, compressed (siblings written),
+        evicted (report names)
+    """
+    cache_dir = Path(cache_dir)
+    index = scan(cache_dir, load_index(cache_dir))
+    now = time.time()
+
+    compressed = 0
+    for name, entry in index['entries'].items():
+        for suffix in COMPRESSED_SUFFIXES:
+            if suffix in entry['files']:
+                compressed += compress_file(cache_dir / (name + suffix))
+    if compressed:
+        index = scan(cache_dir, index)
+
+    for name, (count, last) in take_hits(cache_dir).items():
+        if name in index['entries']:
+            entry = index['entries'][name]
+            entry['hits'] += count
+            entry['last_access'] = max(entry['last_access'] or 0, last)
+
+    keep = ()
+    if added is not None:
+        name, inputs = added
+        if name in index['entries']:
+            index['entries'][name].update(inputs=inputs, last_access=now)
+        keep = (name,)
+
+    evicted = evict(cache_dir, index, max_bytes, max_entries, max_age_days, keep, now)
+    index['total_bytes'] = sum(entry['bytes'] for entry in index['entries'].values())
+    index['updated'] = now
+    save_index(cache_dir, index)
+    return {'entries': len(index['entries']), 'total_bytes': index['total_bytes'],
+            'compressed': compressed, 'evicted': evicted}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compress, index and bound the report cache')
+    parser.add_argument('--cache-dir', default=str(CACHE_DIR), help=f'Cache directory (default: {CACHE_DIR})')
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_MB,
+                        help=f'Total size budget in MB, 0 for none (default: {DEFAULT_MAX_MB})')
+    parser.add_argument('--max-entries', type=int, help='Keep at most this many reports')
+    parser.add_argument('--max-age-days', type=float, help='Evict reports unused for this many days')
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    subparsers.add_parser('update', help='Compress new files, fold in hits, evict and rewrite the index')
+
+    add_parser = subparsers.add_parser('add', help='Record a just-generated report, then update')
+    add_parser.add_argument('report', help='Report name, e.g. dso_report_default_2025-11-21')
+    add_parser.add_argument('--profile', required=True, help='Profile the report was generated for')
+    add_parser.add_argument('--date', required=True, help='Report date YYYY-MM-DD')
+    add_parser.add_argument('--catalog', help='Catalog file the report was generated from')
+    add_parser.add_argument('--ephemeris', help='Kernel file name the report was generated with')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        sys.exit(1)
+
+    try:
+        added = None
+        if args.command == 'add':
+            ephemeris_data.configure(ephemeris_file=args.ephemeris)
+            target_date = datetime.date.fromisoformat(args.date)
+            added = (args.report, input_hash(args.profile, target_date, args.catalog))
+        result = update(args.cache_dir, int(args.max_mb * (1 << 20)) or None, args.max_entries,
+                        args.max_age_days, added)
+    except (OSError, ValueError) as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+    print(json.dumps({'success': True, **result}))
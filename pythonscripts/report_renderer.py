@@ -0,0 +1,523 @@
+"""
+Streaming HTML renderer for DSO visibility reports.
+
+Writes the page head as soon as the night's parameters are known, so it reaches
+stdout while the targets are still being evaluated, then writes the table data
+column by column instead of building the page as one string. The rows need every
+visible object (the payload carries their sort orders), so only the head goes out
+early. Styles live in public/css/report.css instead of being repeated in every
+cached report.
+"""
+import hashlib
+import html
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+def safe_float(value, default=0.0):
+    if pd.isna(value) or value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        try:
+            return float(str(value))
+        except Exception:
+            return default
+
+
+def safe_str(value, default=''):
+    if pd.isna(value) or value is None:
+        return default
+    # Handle numeric numpy and python types cleanly
+    try:
+        if isinstance(value, (float, int, np.floating, np.integer)):
+            if float(value).is_integer():
+                return str(int(value))
+            return str(value)
+    except Exception:
+        pass
+    return str(value)
+
+
+def optional_float(value, digits=2):
+    """Rounded float, or None (JSON null) for missing/NaN values."""
+    if value is None or pd.isna(value):
+        return None
+    return round(float(value), digits)
+
+
+def safe_time_str(value):
+    """Return HH:MM for datetimes/timestamps, or empty string for missing/invalid."""
+    if hasattr(value, 'strftime'):
+        try:
+            return value.strftime('%H:%M')
+        except Exception:
+            pass
+    try:
+        ts = pd.to_datetime(value, errors='coerce')
+        if not pd.isna(ts):
+            return ts.strftime('%H:%M')
+    except Exception:
+        pass
+    return ''
+
+
+# Report payload columns and how each is derived from a visible-object dict.
+# start/end HH:MM strings are rebuilt in the browser from the minute columns.
+PAYLOAD_COLUMNS = {
+    'do_me': lambda obj: 1 if obj.get('do_me') else 0,
+    'name': lambda obj: safe_str(obj.get('name', '')),
+    'aka': lambda obj: safe_str(obj.get('aka', '')),
+    'start_minutes': lambda obj: int(obj.get('start_minutes') or 0),
+    'end_minutes': lambda obj: int(obj.get('end_minutes') or 0),
+    'duration': lambda obj: round(safe_float(obj.get('duration')), 2),
+    'size': lambda obj: safe_float(obj.get('size')),
+    'magnitude': lambda obj: safe_float(obj.get('magnitude')),
+    'constellation': lambda obj: safe_str(obj.get('constellation')),
+    'type_desc': lambda obj: safe_str(obj.get('type_desc')),
+    'start_alt': lambda obj: round(safe_float(obj.get('start_alt')), 2),
+    'start_az': lambda obj: round(safe_float(obj.get('start_az')), 2),
+    'end_alt': lambda obj: round(safe_float(obj.get('end_alt')), 2),
+    'end_az': lambda obj: round(safe_float(obj.get('end_az')), 2),
+    'transit_minutes': lambda obj: optional_float(obj.get('transit_minutes'), None),
+    'transit_alt': lambda obj: optional_float(obj.get('transit_alt')),
+    'max_alt': lambda obj: optional_float(obj.get('max_alt')),
+    'airmass': lambda obj: optional_float(obj.get('airmass'), 3),
+    'best_block': lambda obj: optional_float(obj.get('best_block'), 1),
+    'tier_minutes': lambda obj: {tier: round(minutes, 1) for tier, minutes in obj.get('tier_minutes', {}).items()},
+    'quality': lambda obj: optional_float(obj.get('quality'), 3),
+}
+
+# Sort options offered by the report's sortOrder dropdown: (column, descending)
+SORT_ORDERS = {
+    'duration': ('duration', True),
+    'start': ('start_minutes', False),
+    'end': ('end_minutes', False),
+    'start_az': ('start_az', False),
+    'start_alt': ('start_alt', True),
+    'transit': ('transit_minutes', False),
+    'max_alt': ('max_alt', True),
+    'quality': ('quality', True),
+    'magnitude': ('magnitude', False),
+    'size': ('size', True),
+    'name': ('name', False),
+    'aka': ('aka', False),
+}
+
+
+def sort_permutation(values, descending=False):
+    """
+    Return the row order for one sort option.
+
+    Numeric sorts are stable, like Array.prototype.sort in the browser; text
+    sorts are case-insensitive to approximate localeCompare().
+    """
+    if values and isinstance(values[0], str):
+        return sorted(range(len(values)), key=lambda i: values[i].casefold())
+    keys = np.asarray(values, dtype=np.float64)
+    return np.argsort(-keys if descending else keys, kind='stable').tolist()
+
+
+def write_payload(out, objects, tracks=None):
+    """
+    Write the columnar report payload as compact JSON.
+
+    The payload holds one array per column plus a precomputed row order for
+    each sort option, so the browser never sorts and every sort order of a
+    report shares the same data. Columns are serialized one at a time.
+
+    Args:
+        out: Writable text stream
+        objects: Sequence of visible-object dicts from calculate_visibility()
+        tracks: Track sidecar description from write_tracks(), or None
+    """
+    sort_columns = {column for column, _ in SORT_ORDERS.values()}
+    columns = {}
+
+    out.write(f'{{"count":{len(objects)},"columns":{{')
+    for i, (key, convert) in enumerate(PAYLOAD_COLUMNS.items()):
+        values = [convert(obj) for obj in objects]
+        if key in sort_columns:
+            columns[key] = values
+        out.write(f'{"," if i else ""}"{key}":{json.dumps(values, separators=(",", ":"))}')
+    out.write('},"order":{')
+    for i, (option, (column, descending)) in enumerate(SORT_ORDERS.items()):
+        order = sort_permutation(columns[column], descending)
+        out.write(f'{"," if i else ""}"{option}":{json.dumps(order, separators=(",", ":"))}')
+    out.write('}')
+    if tracks is not None:
+        out.write(f',"tracks":{json.dumps(tracks, separators=(",", ":"))}')
+    out.write('}')
+
+
+# Altitude/azimuth tracks are stored as little-endian int16 in hundredths of a
+# degree; azimuth is offset by -180 degrees to fit.
+TRACK_SCALE = 100
+TRACK_AZ_OFFSET = 180.0
+
+
+def quantize_tracks(alt_deg, az_deg):
+    """
+    Pack altitude/azimuth arrays into the int16 track layout.
+
+    Args:
+        alt_deg, az_deg: (N, S) float arrays in degrees
+
+    Returns:
+        (N, S, 2) int16 array of [alt, az - 180] in hundredths of a degree
+    """
+    tracks = np.empty(alt_deg.shape + (2,), dtype=np.int16)
+    tracks[..., 0] = np.rint(alt_deg * TRACK_SCALE)
+    tracks[..., 1] = np.rint((az_deg - TRACK_AZ_OFFSET) * TRACK_SCALE)
+    return tracks
+
+
+def write_tracks(out, tracks, sample_minutes, step_minutes, url=None):
+    """
+    Write tracks as a raw binary sidecar and describe it for the payload.
+
+    The sidecar is a plain int16 array (rows in payload order, then samples,
+    then alt/az), so the browser can read it straight into an Int16Array.
+
+    Args:
+        out: Writable binary stream
+        tracks: (N, S, 2) int16 array from quantize_tracks()
+        sample_minutes: Clock minute of each sample, on the same scale as the
+            start_minutes column (past midnight is +1440)
+        step_minutes: Nominal spacing between samples
+        url: URL the browser fetches the sidecar from; the sidecar's content
+            hash is appended as a v= parameter
+
+    Returns:
+        dict for write_payload(tracks=...), including the sidecar size in bytes
+        and its content hash (etag)
+    """
+    data = np.ascontiguousarray(tracks, dtype='<i2').tobytes()
+    out.write(data)
+    etag = content_hash(data)
+    return {
+        'url': versioned_url(url, etag),
+        'etag': etag,
+        'shape': list(tracks.shape),
+        'dtype': 'int16',
+        'scale': TRACK_SCALE,
+        'az_offset': TRACK_AZ_OFFSET,
+        'step_minutes': step_minutes,
+        'sample_minutes': [int(m) for m in sample_minutes],
+        'bytes': len(data),
+    }
+
+
+def content_hash(data):
+    """
+    Stable content hash of an artifact's bytes: 16 hex digits of SHA-256.
+
+    Used as the artifact's ETag and as the v= parameter of versioned URLs, so
+    regenerating identical content keeps both unchanged.
+    """
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def file_hash(path):
+    """content_hash() of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def versioned_url(url, etag):
+    """url with a v=<content hash> parameter (None stays None)."""
+    if url is None:
+        return None
+    return f"{url}{'&' if '?' in url else '?'}v={etag}"
+
+
+@contextmanager
+def report_output(path=None, binary=False):
+    """
+    Open the report destination.
+
+    With no path, yields stdout. With a path, yields a temporary file next to it
+    that is renamed over the target only once the report is complete, so readers
+    never see a half-written cache file.
+
+    Args:
+        path: Output file path or None for stdout
+        binary: Open for bytes instead of text
+    """
+    if path is None:
+        yield sys.stdout.buffer if binary else sys.stdout
+        return
+
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with (open(tmp, 'wb') if binary else open(tmp, 'w', encoding='utf-8', newline='\n')) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def write_head(out, report):
+    """
+    Write everything up to the results table and flush it.
+
+    Args:
+        out: Writable text stream
+        report: dict with date, profile, location, window_start, window_end,
+            min_altitude, az_min, az_max and optionally min_duration and
+            time_windows (text, e.g. '23:00-02:00')
+    """
+    duration = f", Visible &gt;= {report['min_duration']:g} min" if report.get('min_duration') is not None else ''
+    if report.get('time_windows'):
+        duration += f", Between {report['time_windows']}"
+    out.write(f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>DSO Visibility Report - {report['date']}</title>
+    <link rel="icon" type="image/png" href="/images/favicon.png">
+    <link rel="stylesheet" href="/css/report.css?ver=2">
+</head>
+<body>
+    <h1>DSO Visibility Report</h1>
+    <div class="info">
+        <p><strong>Location:</strong> {report['location']}</p>
+        <p><strong>Viewing Window:</strong> {report['window_start'].strftime('%H:%M %Z')} to {report['window_end'].strftime('%H:%M %Z')}</p>
+        <p><strong>Criteria:</strong> Altitude &gt;= {report['min_altitude']}&deg;, Azimuth {report['az_min']}&deg;-{report['az_max']}&deg;{duration}</p>
+    </div>
+
+    <div class="controls">
+        <label for="sortOrder">Sort by:</label>
+        <select id="sortOrder" onchange="sortTable()">
+            <option value="duration">Duration (longest first)</option>
+            <option value="start">Start Time (earliest first)</option>
+            <option value="end">End Time (earliest first)</option>
+            <option value="start_az">Starting Azimuth (lowest first)</option>
+            <option value="start_alt">Starting Altitude (highest first)</option>
+            <option value="transit">Transit Time (earliest first)</option>
+            <option value="max_alt">Maximum Altitude (highest first)</option>
+            <option value="quality">Quality (best first)</option>
+            <option value="magnitude">Magnitude (brightest first)</option>
+            <option value="size">Size (largest first)</option>
+            <option value="name">Name (A-Z)</option>
+            <option value="aka">Friendly Name</option>
+        </select>
+        <button id="force-rebuild-btn" onclick="window.location.href=window.location.pathname + '?date={report['date']}&profile={report['profile']}&rebuild=1'">Force Rebuild</button>
+    </div>
+
+\n""")
+    out.flush()
+
+
+def write_objects(out, objects, data_url=None, tracks=None):
+    """
+    Write the results table and its script.
+
+    Args:
+        out: Writable text stream
+        objects: Sequence of visible-object dicts from calculate_visibility()
+        data_url: URL of a payload written separately with write_payload();
+            when None the payload is embedded in the page
+        tracks: Track sidecar description for the embedded payload
+    """
+    if not objects:
+        out.write("<p>No objects meet the visibility criteria for this date.</p>\n")
+        return
+
+    out.write(TABLE_HTML)
+    if data_url is None:
+        out.write('        let reportData = ')
+        write_payload(out, objects, tracks)
+        out.write(';\n        const reportDataUrl = null;\n')
+    else:
+        out.write(f'        let reportData = null;\n        const reportDataUrl = {json.dumps(data_url)};\n')
+    out.write(TABLE_SCRIPT)
+
+
+def format_clock(minutes):
+    """Report clock minutes (past midnight is +1440) as HH:MM."""
+    minutes = int(minutes) % 1440
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def write_schedule(out, blocks, settings):
+    """
+    Write the suggested imaging session (see session_scheduler.py).
+
+    Args:
+        out: Writable text stream
+        blocks: Blocks from session_scheduler.schedule()
+        settings: dict with min_block and overhead minutes
+    """
+    if not blocks:
+        return
+    total = sum(block['minutes'] for block in blocks)
+    out.write(f"""    <div class="schedule">
+        <h2>Suggested Imaging Session</h2>
+        <p>{len(blocks)} blocks, {total / 60:.1f}h imaging (blocks &gt;= {settings['min_block']} min, {settings['overhead']} min slew/settle between blocks)</p>
+        <table id="scheduleTable">
+            <thead>
+                <tr>
+                    <th>Start</th>
+                    <th>End</th>
+                    <th>Duration</th>
+                    <th>Name</th>
+                    <th>Also Known As</th>
+                </tr>
+            </thead>
+            <tbody>
+""")
+    for block in blocks:
+        out.write(f"""                <tr>
+                    <td class="time">{format_clock(block['start_minutes'])}</td>
+                    <td class="time">{format_clock(block['end_minutes'])}</td>
+                    <td class="duration">{block['minutes']}m</td>
+                    <td>{html.escape(block['name'])}</td>
+                    <td>{html.escape(block['aka'])}</td>
+                </tr>
+""")
+    out.write("""            </tbody>
+        </table>
+    </div>
+""")
+
+
+def render_report(out, report, objects, data_url=None, tracks=None, schedule=None):
+    """
+    Write a complete report: head first, then the suggested session when
+    given as (blocks, settings), then the table (see write_objects).
+    """
+    write_head(out, report)
+    if schedule is not None:
+        write_schedule(out, *schedule)
+    write_objects(out, objects, data_url, tracks)
+
+
+TABLE_HTML = """
+    <table id="dsoTable">
+        <thead>
+            <tr>
+                <th>Priority</th>
+                <th>Name</th>
+                <th>Also Known As</th>
+                <th>Start</th>
+                <th>Start Alt</th>
+                <th>Start Az</th>
+                <th>End</th>
+                <th>End Alt</th>
+                <th>End Az</th>
+                <th>Transit</th>
+                <th>Max Alt</th>
+                <th>Duration</th>
+                <th>Airmass</th>
+                <th>Quality</th>
+                <th>Size (sq')</th>
+                <th>Mag</th>
+                <th>Constellation</th>
+                <th>Type</th>
+            </tr>
+        </thead>
+        <tbody id="tableBody">
+        </tbody>
+    </table>
+    <div class="info" style="margin-top: 20px;">
+        <p><strong>Total visible objects:</strong> <span id="totalCount"></span></p>
+        <p><strong>&#9733;</strong> = Priority target (not recently observed)</p>
+    </div>
+
+    <script>
+"""
+
+TABLE_SCRIPT = """
+        function formatDuration(minutes) {
+            const hours = minutes / 60;
+            return hours >= 1 ? `${hours.toFixed(1)}h` : `${minutes.toFixed(0)}m`;
+        }
+
+        function formatMinutes(minutes) {
+            const m = minutes % 1440;
+            return String(Math.floor(m / 60)).padStart(2, '0') + ':' + String(m % 60).padStart(2, '0');
+        }
+
+        function qualityNote(i) {
+            const c = reportData.columns;
+            if (c.best_block[i] === null) return '';
+            const tiers = Object.entries(c.tier_minutes[i]).map(([tier, minutes]) =>
+                `${tier}&deg;+ ${formatDuration(minutes)}`);
+            return [`Best block ${formatDuration(c.best_block[i])}`, ...tiers].join(', ');
+        }
+
+        function renderTable(order) {
+            const tbody = document.getElementById('tableBody');
+            const c = reportData.columns;
+            const rows = [];
+
+            order.forEach(i => {
+                rows.push(`<tr>
+                    <td class="priority">${c.do_me[i] ? '&#9733;' : ''}</td>
+                    <td><strong>${c.name[i]}</strong></td>
+                    <td>${c.aka[i]}</td>
+                    <td class="time">${formatMinutes(c.start_minutes[i])}</td>
+                    <td>${c.start_alt[i].toFixed(0)}&deg;</td>
+                    <td>${c.start_az[i].toFixed(0)}&deg;</td>
+                    <td class="time">${formatMinutes(c.end_minutes[i])}</td>
+                    <td>${c.end_alt[i].toFixed(0)}&deg;</td>
+                    <td>${c.end_az[i].toFixed(0)}&deg;</td>
+                    <td class="time">${c.transit_minutes[i] === null ? '' :
+                        `${formatMinutes(c.transit_minutes[i])} (${c.transit_alt[i].toFixed(0)}&deg;)`}</td>
+                    <td>${c.max_alt[i] === null ? '' : c.max_alt[i].toFixed(0) + '&deg;'}</td>
+                    <td class="duration">${formatDuration(c.duration[i])}</td>
+                    <td>${c.airmass[i] === null ? '' : c.airmass[i].toFixed(2)}</td>
+                    <td title="${qualityNote(i)}">${c.quality[i] === null ? '' : c.quality[i].toFixed(2)}</td>
+                    <td>${c.size[i].toFixed(0)}</td>
+                    <td>${c.magnitude[i].toFixed(1)}</td>
+                    <td>${c.constellation[i]}</td>
+                    <td>${c.type_desc[i]}</td>
+                </tr>`);
+            });
+            tbody.innerHTML = rows.join('');
+
+            document.getElementById('totalCount').textContent = reportData.count;
+        }
+
+        function sortTable() {
+            // Row orders are precomputed server-side for every dropdown option
+            const sortBy = document.getElementById('sortOrder').value;
+            renderTable(reportData.order[sortBy]);
+        }
+
+        function initTable() {
+            // ?sort=<option> picks the initial order; all orders share one payload
+            const requested = new URLSearchParams(window.location.search).get('sort');
+            if (requested && reportData.order[requested]) {
+                document.getElementById('sortOrder').value = requested;
+            }
+            sortTable();
+        }
+
+        if (reportData) {
+            initTable();
+        } else {
+            fetch(reportDataUrl)
+                .then(response => response.json())
+                .then(data => {
+                    reportData = data;
+                    initTable();
+                });
+        }
+    </script>
+</body>
+</html>
+
+"""
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for vis.php's cached endpoints, and a revalidation check.
+
+Serves the report cache the way vis.php does, without PHP or a web server:
+
+    /vis?date=YYYY-MM-DD&profile=NAME                   cached report page
+    /vis?date=YYYY-MM-DD&profile=NAME&format=json       columnar payload
+    /vis?date=YYYY-MM-DD&profile=NAME&format=tracks     track sidecar
+
+Payloads and track files carry their content hash as the ETag (from
+cache/index.json, see report_cache.py); pages carry report_cache.page_etag(),
+the tag vis.php sends for the same page. A conditional request with a matching
+If-None-Match gets 304 Not Modified. Payload and track URLs carrying the
+current hash as v= (as the generator writes them) are immutable; other
+responses for past dates may be cached for a week, and today's and future
+dates must revalidate. The .br/.gz siblings are sent to clients that accept
+them, with "-br"/"-gz" appended to the ETag. The page body is served as
+stored: vis.php additionally injects its controls and cache status.
+
+Browse a cache locally:
+
+    python report_server.py --cache-dir ../public/cache --port 8000
+
+Check revalidation of every cached report (exits non-zero on a failure) and
+report the bytes a conditional request saves. The cache is only read:
+
+    python report_server.py --cache-dir ../public/cache --check
+"""
+import argparse
+import datetime
+import json
+import re
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+import report_cache
+
+FORMATS = {
+    None: ('.html', 'text/html; charset=utf-8'),
+    'json': ('.json', 'application/json; charset=utf-8'),
+    'tracks': ('.tracks.bin', 'application/octet-stream'),
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+PAST_DATE = 'public, max-age=604800'
+REVALIDATE = 'no-cache'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match test (weak comparison, as for GET)."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
+
+
+def cache_control(date, versioned, today=None):
+    """
+    Cache-Control for a cached artifact.
+
+    Args:
+        date: Report date YYYY-MM-DD
+        versioned: The request's v= matches the artifact's content hash
+        today: Current date YYYY-MM-DD (default: today)
+    """
+    if versioned:
+        return IMMUTABLE
+    today = datetime.date.today().isoformat() if today is None else today
+    return PAST_DATE if date < today else REVALIDATE
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    Serves one cache directory (the server's cache_dir), taking ETags from the
+    server's index (a report_cache.scan() result) or, when that is None, from
+    the cache's index.json.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        date, profile, fmt = query.get('date', ''), query.get('profile', 'default'), query.get('format')
+        if url.path.rstrip('/') != '/vis' or fmt not in FORMATS or \
+                not re.fullmatch(r'\d{4}-\d{2}-\d{2}', date) or not re.fullmatch(r'[A-Za-z0-9_-]+', profile):
+            self.send_error(400)
+            return
+
+        suffix, content_type = FORMATS[fmt]
+        name = f'dso_report_{profile}_{date}'
+        path = Path(self.server.cache_dir) / (name + suffix)
+        if not path.exists():
+            self.send_error(404)
+            return
+        etag = report_cache.artifact_etag(self.server.cache_dir, name, suffix, self.server.index)
+        versioned = fmt is not None and query.get('v') == etag
+        if fmt is None:
+            tag = report_cache.page_etag(etag, report_cache.profile_names(self.server.profile_dir))
+        else:
+            tag = f'"{etag}"'
+
+        accept = self.headers.get('Accept-Encoding', '')
+        encoding = None
+        if suffix in report_cache.COMPRESSED_SUFFIXES:
+            for coding, extension in (('br', '.br'), ('gzip', '.gz')):
+                sibling = path.with_name(path.name + extension)
+                if re.search(rf'\b{coding}\b', accept, re.I) and sibling.exists() and \
+                        sibling.stat().st_mtime >= path.stat().st_mtime:
+                    encoding, path, tag = coding, sibling, f'"{etag}-{extension[1:]}"'
+                    break
+
+        not_modified = etag_matches(self.headers.get('If-None-Match'), tag)
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', tag)
+        self.send_header('Cache-Control', cache_control(date, versioned))
+        if suffix in report_cache.COMPRESSED_SUFFIXES:
+            self.send_header('Vary', 'Accept-Encoding')
+        if not_modified:
+            self.end_headers()
+            return
+        data = path.read_bytes()
+        self.send_header('Content-Type', content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(cache_dir, port=0, quiet=False, index=None, profile_dir=report_cache.PROFILE_DIR):
+    """
+    ThreadingHTTPServer on localhost serving cache_dir (port 0 picks a free one).
+
+    Args:
+        index: report_cache.scan() result to take ETags from (default: read
+            index.json on each request)
+        profile_dir: Profiles listed by vis.php's controls, for page ETags
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), ReportHandler)
+    server.cache_dir = str(cache_dir)
+    server.quiet = quiet
+    server.index = index
+    server.profile_dir = profile_dir
+    return server
+
+
+def _get(url, headers):
+    """(status, headers, body) of a GET, 304 included."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def check(cache_dir, profile_dir=report_cache.PROFILE_DIR):
+    """
+    Fetch every cached artifact through a local server, then revalidate it.
+
+    Nothing in the cache is written: the index is refreshed in memory
+    (report_cache.scan()) and the server takes its ETags from that copy. For
+    each page, payload and track file: the first response must carry an ETag
+    (for the page, the report_cache.page_etag() vis.php sends), a conditional
+    request with it must get an empty 304, and one with a different tag a
+    full 200. The page's payload URL must carry the payload's current hash and
+    be served immutable.
+
+    Returns:
+        dict with requests, full_bytes (first responses), revalidated_bytes
+        (304 responses), bytes_saved and failures (messages)
+    """
+    index = report_cache.scan(cache_dir, report_cache.load_index(cache_dir))
+    entries = index['entries']
+    profiles = report_cache.profile_names(profile_dir)
+    server = make_server(cache_dir, quiet=True, index=index, profile_dir=profile_dir)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_address[1]}/vis'
+    accept = {'Accept-Encoding': 'br, gzip' if report_cache.brotli is not None else 'gzip'}
+    summary = {'requests': 0, 'full_bytes': 0, 'revalidated_bytes': 0, 'bytes_saved': 0, 'failures': []}
+    try:
+        for name, entry in sorted(entries.items()):
+            query = f"?date={entry['date']}&profile={entry['profile']}"
+            for fmt, (suffix, _) in FORMATS.items():
+                if suffix not in entry['files']:
+                    continue
+                url = base + query + (f'&format={fmt}' if fmt else '')
+                status, headers, body = _get(url, accept)
+                etag = headers.get('ETag')
+                revalidated, _, again = _get(url, {**accept, 'If-None-Match': etag or ''})
+                changed, _, _ = _get(url, {**accept, 'If-None-Match': '"0000000000000000"'})
+                summary['requests'] += 3
+                summary['full_bytes'] += len(body)
+                summary['revalidated_bytes'] += len(again)
+                if status != 200 or not etag:
+                    summary['failures'].append(f'{name}{suffix}: {status} without ETag')
+                elif fmt is None and etag != report_cache.page_etag(entry['etags']['.html']['etag'], profiles):
+                    summary['failures'].append(f'{name}.html: ETag {etag} is not the one vis.php sends')
+                elif revalidated != 304 or again:
+                    summary['failures'].append(f'{name}{suffix}: If-None-Match gave {revalidated}, {len(again)} bytes')
+                elif changed != 200:
+                    summary['failures'].append(f'{name}{suffix}: a different ETag gave {changed}')
+                else:
+                    summary['bytes_saved'] += len(body) - len(again)
+
+                match = re.search(rb'const reportDataUrl = "([^"]*)"', body) if fmt is None else None
+                if match and '.json' in entry['etags']:
+                    data_url = match.group(1).decode()
+                    status, headers, _ = _get(base + data_url, accept)
+                    summary['requests'] += 1
+                    if f"v={entry['etags']['.json']['etag']}" not in data_url or \
+                            headers.get('Cache-Control') != IMMUTABLE:
+                        summary['failures'].append(f'{name}.html: payload URL {data_url} is not versioned '
+                                                   f'by the current payload ({headers.get("Cache-Control")})')
+    finally:
+        server.shutdown()
+        server.server_close()
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the report cache like vis.php, or check its revalidation")
+    parser.add_argument('--cache-dir', default=str(report_cache.CACHE_DIR),
+                        help=f'Cache directory (default: {report_cache.CACHE_DIR})')
+    parser.add_argument('--profile-dir', default=str(report_cache.PROFILE_DIR),
+                        help=f'Profiles vis.php lists, for page ETags (default: {report_cache.PROFILE_DIR})')
+    parser.add_argument('--port', type=int, default=8000, help='Port to serve on (default: 8000)')
+    parser.add_argument('--check', action='store_true',
+                        help='Revalidate every cached artifact through a local server and report bytes saved')
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            result = check(args.cache_dir, args.profile_dir)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'success': False, 'error': str(e)}))
+            sys.exit(1)
+        print(json.dumps({'success': not result['failures'], **result}, indent=2))
+        sys.exit(1 if result['failures'] else 0)
+
+    server = make_server(args.cache_dir, args.port, profile_dir=args.profile_dir)
+    print(f'Serving {args.cache_dir} on http://127.0.0.1:{args.port}/vis')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
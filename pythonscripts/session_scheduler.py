@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Imaging session scheduler.
+
+Packs the night's visible objects into non-overlapping imaging blocks that
+maximize total priority-weighted imaging time, given a minimum (and maximum)
+block length and a slew/settle overhead between blocks.
+
+Each object contributes candidate blocks inside its visibility window (starts
+and lengths on a `step`-minute grid, min_block..max_block long). Candidates
+are solved as weighted interval scheduling: sort by end time, binary-search
+each candidate's latest compatible predecessor (end + overhead <= start) and
+run the O(n) DP. The DP may use an object more than once; when it does, the
+object's best block is kept, its other candidates are dropped, and the DP is
+re-run (each pass settles at least one object, usually one or two passes).
+
+Times are report clock minutes (start_minutes/end_minutes: minutes since
+local midnight, +1440 after midnight).
+"""
+import argparse
+import json
+import math
+import sys
+import time
+import numpy as np
+
+# Scheduling defaults (minutes)
+MIN_BLOCK = 60
+MAX_BLOCK = 180
+STEP = 15
+SLEW_OVERHEAD = 5
+
+# Priority weighting: want-better multiplier and the magnitude/size ranges
+# mapped onto 0..1 (missing values score 0.5)
+WANT_BETTER_WEIGHT = 2.0
+MAG_FAINT, MAG_BRIGHT = 14.0, 4.0
+SIZE_SMALL, SIZE_LARGE = 1.0, 1000.0  # square arcminutes
+
+
+def _scale(value, low, high):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 0.5
+    return min(1.0, max(0.1, (value - low) / (high - low)))
+
+
+def priority(obj):
+    """
+    Priority weight of one object (per minute of imaging time).
+
+    Args:
+        obj: Visible-object dict or payload row with do_me, magnitude, size,
+            or an explicit 'weight' (used by campaign_planner.py)
+
+    Returns:
+        float weight: (2 if do_me else 1) * mean of brightness and size scores
+    """
+    if 'weight' in obj:
+        return float(obj['weight'])
+    magnitude = obj.get('magnitude')
+    size = obj.get('size')
+    brightness = _scale(MAG_FAINT - float(magnitude) if magnitude not in (None, '') else None,
+                        0.0, MAG_FAINT - MAG_BRIGHT)
+    size_score = _scale(math.log10(float(size)) if size not in (None, '') and float(size) > 0 else None,
+                        math.log10(SIZE_SMALL), math.log10(SIZE_LARGE))
+    return (WANT_BETTER_WEIGHT if obj.get('do_me') else 1.0) * (brightness + size_score) / 2
+
+
+def candidate_blocks(objects, min_block=MIN_BLOCK, max_block=MAX_BLOCK, step=STEP):
+    """
+    Candidate imaging blocks for every object.
+
+    An object's optional 'max_minutes' caps its block length (but never below
+    min_block).
+
+    Returns:
+        (obj_idx, start, end, value) numpy arrays; value = priority * minutes
+    """
+    obj_idx, starts, ends, values = [], [], [], []
+    all_lengths = np.arange(min_block, max(min_block, max_block) + 1, step)
+    for i, obj in enumerate(objects):
+        window_start, window_end = int(obj['start_minutes']), int(obj['end_minutes'])
+        if window_end - window_start < min_block:
+            continue
+        weight = priority(obj)
+        longest = max(min_block, min(max_block, int(obj.get('max_minutes', max_block))))
+        lengths = all_lengths[all_lengths <= longest]
+        block_starts = np.arange(window_start, window_end - min_block + 1, step)
+        s = np.repeat(block_starts, len(lengths))
+        e = s + np.tile(lengths, len(block_starts))
+        keep = e <= window_end
+        s, e = s[keep], e[keep]
+        # The block running to the end of the window, if the grid missed it
+        if len(e) == 0 or e.max() < min(window_end, window_start + longest):
+            tail_start = max(window_start, window_end - longest)
+            s = np.append(s, tail_start)
+            e = np.append(e, window_end)
+        obj_idx.append(np.full(len(s), i))
+        starts.append(s)
+        ends.append(e)
+        values.append(weight * (e - s))
+
+    if not obj_idx:
+        empty = np.zeros(0)
+        return empty.astype(np.intp), empty, empty, empty
+    return (np.concatenate(obj_idx), np.concatenate(starts).astype(np.float64),
+            np.concatenate(ends).astype(np.float64), np.concatenate(values))
+
+
+def _solve(starts, ends, values, overhead):
+    """Weighted interval scheduling; returns indices of the chosen intervals (sorted by end)."""
+    order = np.argsort(ends, kind='stable')
+    s, e, v = starts[order], ends[order], values[order]
+    # Latest interval j with e[j] + overhead <= s[i]
+    pred = np.searchsorted(e + overhead, s, side='right') - 1
+
+    n = len(order)
+    best = np.zeros(n + 1)
+    take = np.zeros(n, dtype=bool)
+    for i in range(n):
+        with_i = v[i] + best[pred[i] + 1]
+        if with_i > best[i]:
+            best[i + 1] = with_i
+            take[i] = True
+        else:
+            best[i + 1] = best[i]
+
+    chosen = []
+    i = n - 1
+    while i >= 0:
+        if take[i]:
+            chosen.append(order[i])
+            i = pred[i]
+        else:
+            i -= 1
+    return chosen[::-1]
+
+
+def schedule(objects, min_block=MIN_BLOCK, max_block=MAX_BLOCK, step=STEP, overhead=SLEW_OVERHEAD):
+    """
+    Build an imaging schedule for the night.
+
+    Args:
+        objects: Visible-object dicts (or payload rows) with name, aka,
+            start_minutes, end_minutes, do_me, magnitude and size
+        min_block, max_block: Block length limits in minutes
+        step: Grid for block starts and lengths in minutes
+        overhead: Slew/settle minutes required between blocks
+
+    Returns:
+        List of blocks in time order: {name, aka, start_minutes, end_minutes,
+        minutes, priority, index} where index points into objects
+    """
+    obj_idx, starts, ends, values = candidate_blocks(objects, min_block, max_block, step)
+    active = np.ones(len(obj_idx), dtype=bool)
+
+    while True:
+        candidates = np.flatnonzero(active)
+        chosen = candidates[_solve(starts[candidates], ends[candidates], values[candidates], overhead)]
+        used = {}
+        for c in chosen:
+            used.setdefault(obj_idx[c], []).append(c)
+        repeated = {obj: blocks for obj, blocks in used.items() if len(blocks) > 1}
+        if not repeated:
+            break
+        # Keep each repeated object's best block only
+        for obj, blocks in repeated.items():
+            keep = max(blocks, key=lambda c: values[c])
+            active &= (obj_idx != obj) | (np.arange(len(obj_idx)) == keep)
+
+    blocks = []
+    for c in chosen:
+        obj = objects[obj_idx[c]]
+        blocks.append({
+            'name': str(obj.get('name', '')),
+            'aka': str(obj.get('aka', '') or ''),
+            'start_minutes': int(starts[c]),
+            'end_minutes': int(ends[c]),
+            'minutes': int(ends[c] - starts[c]),
+            'priority': round(float(priority(obj)), 3),
+            'index': int(obj_idx[c]),
+        })
+    return blocks
+
+
+def objects_from_payload(payload):
+    """Rows of a report payload (write_payload() JSON) as object dicts."""
+    columns = payload['columns']
+    return [{key: values[i] for key, values in columns.items()} for i in range(payload['count'])]
+
+
+def write_schedule_json(out, blocks, settings):
+    """Write a schedule as JSON."""
+    json.dump({'settings': settings, 'blocks': blocks,
+               'imaging_minutes': sum(block['minutes'] for block in blocks)}, out, indent=2)
+
+
+def benchmark(count, seed=0, **kwargs):
+    """Schedule `count` random objects and return (seconds, candidates, blocks)."""
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(1200, 1700, count)
+    objects = [{
+        'name': f'OBJ{i}',
+        'start_minutes': int(start),
+        'end_minutes': int(min(1980, start + rng.integers(60, 500))),
+        'do_me': bool(rng.random() < 0.2),
+        'magnitude': float(rng.uniform(3, 15)),
+        'size': float(rng.uniform(1, 2000)),
+    } for i, start in enumerate(starts)]
+    t0 = time.perf_counter()
+    blocks = schedule(objects, **kwargs)
+    elapsed = time.perf_counter() - t0
+    return elapsed, len(candidate_blocks(objects, kwargs.get('min_block', MIN_BLOCK),
+                                         kwargs.get('max_block', MAX_BLOCK), kwargs.get('step', STEP))[0]), blocks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Schedule imaging blocks from a report payload')
+    parser.add_argument('payload', nargs='?', help='Report payload JSON (todays_dsos_web.py --data-output)')
+    parser.add_argument('--min-block', type=int, default=MIN_BLOCK, help=f'Minimum block minutes (default: {MIN_BLOCK})')
+    parser.add_argument('--max-block', type=int, default=MAX_BLOCK, help=f'Maximum block minutes (default: {MAX_BLOCK})')
+    parser.add_argument('--step', type=int, default=STEP, help=f'Block grid minutes (default: {STEP})')
+    parser.add_argument('--overhead', type=int, default=SLEW_OVERHEAD,
+                        help=f'Slew/settle minutes between blocks (default: {SLEW_OVERHEAD})')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='Time scheduling N random objects instead')
+    args = parser.parse_args()
+
+    settings = {'min_block': args.min_block, 'max_block': args.max_block,
+                'step': args.step, 'overhead': args.overhead}
+
+    if args.benchmark:
+        elapsed, candidates, blocks = benchmark(args.benchmark, **settings)
+        print(json.dumps({'objects': args.benchmark, 'candidates': candidates,
+                          'blocks': len(blocks), 'seconds': round(elapsed, 4)}, indent=2))
+    elif args.payload:
+        with open(args.payload, 'r', encoding='utf-8') as f:
+            objects = objects_from_payload(json.load(f))
+        write_schedule_json(sys.stdout, schedule(objects, **settings), settings)
+        print()
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Declination/RA index over catalog coordinates for sky-region queries.
+
+dso_catalog.py stores the index with the catalog: object rows sorted by
+declination band (BAND_DEGREES tall) and RA within each band. For a profile's
+latitude, altitude floor and azimuth range and a span of local sidereal time,
+candidates() returns only the rows whose band and RA range can reach the
+usable sky during that span:
+
+    - per band, the hour angles where a point within the band (plus a margin
+      for the band height, the hour-angle grid and catalog vs apparent
+      coordinates) meets the criteria are found on an HA_STEP grid,
+    - an RA cell is usable if any hour angle it passes through during the
+      sidereal span is,
+    - runs of usable RA cells are cut out of the band's sorted RA column.
+
+The test is conservative (a candidate may still turn out not to be visible,
+but no visible object is left out), and its cost depends on the number of
+bands and usable RA runs, not on the catalog size. Compare candidates with
+full evaluation:
+
+    python sky_index.py --catalog data/dso_catalog.npz --date 2025-11-21 --check
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+import numpy as np
+import ephemeris_data
+from fast_altaz import SIDEREAL_RATE
+
+BAND_DEGREES = 1.0
+HA_STEP = 0.5
+
+# Degrees between catalog (J2000) and apparent coordinates: precession
+# (~0.014 degrees a year, so good to about 2060), nutation and aberration
+POSITION_MARGIN = 1.0
+
+
+def build_index(ra_deg, dec_deg):
+    """
+    Index catalog rows by declination band and RA.
+
+    Rows without coordinates (NaN) are left out.
+
+    Returns:
+        dict of catalog columns: sky_order (int32 rows sorted by band, then
+        RA), sky_ra (float64 RA of those rows) and sky_bands (int32 offset of
+        each band's first row in sky_order, plus the total)
+    """
+    rows = np.flatnonzero(~(np.isnan(ra_deg) | np.isnan(dec_deg)))
+    bands = band_of(dec_deg[rows])
+    ra = ra_deg[rows] % 360.0
+    sort = np.lexsort((ra, bands))
+    return {
+        'sky_order': rows[sort].astype(np.int32),
+        'sky_ra': ra[sort].astype(np.float64),
+        'sky_bands': np.searchsorted(bands[sort], np.arange(band_count() + 1)).astype(np.int32),
+    }
+
+
+def band_count():
+    return int(np.ceil(180.0 / BAND_DEGREES))
+
+
+def band_of(dec_deg):
+    return np.clip(((np.asarray(dec_deg) + 90.0) // BAND_DEGREES).astype(np.int64), 0, band_count() - 1)
+
+
+def usable_hour_angles(latitude, min_alt, az_min, az_max):
+    """
+    (bands, HA cells) mask of hour angles where some point within the margin
+    of each band's centre line meets the criteria.
+    """
+    margin = BAND_DEGREES / 2 + HA_STEP / 2 + POSITION_MARGIN
+    dec = np.radians(-90.0 + (np.arange(band_count()) + 0.5) * BAND_DEGREES)[:, None]
+    ha = np.radians(np.arange(0.0, 360.0, HA_STEP))[None, :]
+    lat = np.radians(latitude)
+
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)
+    alt = np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+    usable = alt >= min_alt - margin
+    if az_min <= 0 and az_max >= 360:
+        return usable
+
+    az = np.degrees(np.arctan2(-np.cos(dec) * np.sin(ha),
+                               np.cos(lat) * np.sin(dec) - np.sin(lat) * np.cos(dec) * np.cos(ha))) % 360.0
+    to_edge = np.minimum(np.abs((az - az_min + 180.0) % 360.0 - 180.0),
+                         np.abs((az - az_max + 180.0) % 360.0 - 180.0))
+    # An azimuth offset shrinks on the sky by cos(alt); use the highest
+    # altitude within the margin so nothing near the zenith is dropped
+    near = to_edge * np.cos(np.radians(np.minimum(np.abs(alt) + margin, 90.0))) <= margin
+    return usable & (((az >= az_min) & (az <= az_max)) | near)
+
+
+def usable_ra_cells(hour_angles, lst_start, lst_span):
+    """
+    (bands, RA cells) mask of RA cells that pass through a usable hour angle
+    while local sidereal time runs from lst_start for lst_span degrees.
+    """
+    cells = hour_angles.shape[1]
+    ra_lo = np.arange(cells) * HA_STEP
+    # Objects in cell c cover hour angles (lst_start - ra_lo - HA_STEP, lst_start + lst_span - ra_lo]
+    first = np.floor((lst_start - ra_lo - HA_STEP) / HA_STEP).astype(np.int64)
+    last = np.ceil((lst_start + lst_span - ra_lo) / HA_STEP).astype(np.int64)
+    if (last - first + 1).min() >= cells:
+        return np.repeat(hour_angles.any(axis=1, keepdims=True), cells, axis=1)
+
+    # Circular range sums over the hour-angle cells
+    doubled = np.concatenate([hour_angles, hour_angles], axis=1).astype(np.int32)
+    totals = np.concatenate([np.zeros((len(doubled), 1), dtype=np.int32), np.cumsum(doubled, axis=1)], axis=1)
+    start = first % cells
+    count = np.minimum(last - first + 1, cells)
+    return (totals[:, start + count] - totals[:, start]) > 0
+
+
+def candidates(index, latitude, min_alt, az_min, az_max, lst_start, lst_span):
+    """
+    Catalog rows that can meet the criteria during a span of sidereal time.
+
+    Args:
+        index: Catalog (or build_index() result) with the sky_* columns
+        latitude: Observer latitude in degrees
+        min_alt, az_min, az_max: Visibility criteria in degrees
+        lst_start: Local sidereal time at the start of the span, in degrees
+        lst_span: Length of the span in sidereal degrees
+
+    Returns:
+        Sorted int64 array of catalog rows
+    """
+    cells = usable_ra_cells(usable_hour_angles(latitude, min_alt, az_min, az_max), lst_start % 360.0, lst_span)
+    order, sky_ra, bands = index['sky_order'], index['sky_ra'], index['sky_bands']
+
+    selected = []
+    for band in np.flatnonzero(cells.any(axis=1) & (bands[1:] > bands[:-1])):
+        lo, hi = bands[band], bands[band + 1]
+        # Runs of usable cells as [start, stop) cell numbers
+        edges = np.diff(np.concatenate([[0], cells[band].astype(np.int8), [0]]))
+        for run_start, run_stop in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            first, last = np.searchsorted(sky_ra[lo:hi], [run_start * HA_STEP, run_stop * HA_STEP])
+            selected.append(order[lo + first:lo + last])
+
+    if not selected:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.concatenate(selected).astype(np.int64))
+
+
+def night_region(time_range, latitude, longitude, min_alt, az_min, az_max):
+    """candidates() keyword arguments for a Skyfield time grid."""
+    return {
+        'latitude': latitude,
+        'min_alt': min_alt,
+        'az_min': az_min,
+        'az_max': az_max,
+        'lst_start': float(time_range[0].gast * 15.0 + longitude) % 360.0,
+        'lst_span': float(time_range[-1].tt - time_range[0].tt) * SIDEREAL_RATE,
+    }
+
+
+def check(catalog_path, target_date, profile_name='default', evaluate=True):
+    """
+    Query the index for one night and optionally compare with full evaluation.
+
+    Returns:
+        dict with object and candidate counts and query milliseconds; with
+        evaluate also the visible objects and the visible objects the index
+        left out (should be 0)
+    """
+    from skyfield.api import Topos
+    from dso_catalog import load_catalog
+    from profile_manager import load_profile
+    from todays_dsos_web import evaluate_targets, get_viewing_window
+
+    profile = load_profile(profile_name)
+    criteria = (profile['min_altitude'], profile['az_min'], profile['az_max'])
+    catalog = load_catalog(catalog_path)
+    if 'sky_order' not in catalog:
+        raise ValueError(f'{catalog_path} has no sky index; rebuild it with dso_catalog.py')
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    observer = Topos(profile['latitude'], profile['longitude'])
+    viewing_start, viewing_end = get_viewing_window(target_date, ts, eph, observer)
+    if viewing_start is None or viewing_end is None:
+        raise ValueError(f'No astronomical night on {target_date}')
+    minutes = int((viewing_end.utc_datetime() - viewing_start.utc_datetime()).total_seconds() / 60)
+    time_range = ts.linspace(viewing_start, viewing_end, minutes)
+
+    start = time.perf_counter()
+    rows = candidates(catalog, **night_region(time_range, profile['latitude'], profile['longitude'], *criteria))
+    query_ms = (time.perf_counter() - start) * 1000
+    result = {'objects': len(catalog['sky_order']), 'candidates': len(rows), 'query_ms': round(query_ms, 3)}
+    if not evaluate:
+        return result
+
+    indexed = catalog['sky_order']
+    indices, _, _ = evaluate_targets((eph['earth'] + observer).at(time_range), catalog['ra_deg'][indexed],
+                                     catalog['dec_deg'][indexed], *criteria)
+    visible = indexed[indices[:, 0] >= 0]
+    result.update({'visible': len(visible), 'missed': int(len(np.setdiff1d(visible, rows)))})
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the catalog sky index for one night')
+    parser.add_argument('--catalog', help='Catalog file (default: <data dir>/dso_catalog.npz)')
+    parser.add_argument('--date', help='Date in YYYY-MM-DD format (default: today)')
+    parser.add_argument('--profile', default='default', help='Profile name (default: default)')
+    parser.add_argument('--check', action='store_true', help='Also evaluate every object and count misses')
+    parser.add_argument('--data-dir', help='Data directory (default: $DSO_DATA_DIR or pythonscripts/data)')
+    parser.add_argument('--ephemeris', help='Kernel file name inside the data directory')
+    parser.add_argument('--offline', action='store_true', default=None, help='Never download ephemeris files')
+    args = parser.parse_args()
+    ephemeris_data.configure(args.data_dir, args.ephemeris, args.offline)
+
+    try:
+        target_date = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today()
+        result = check(args.catalog, target_date, args.profile, args.check)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result.get('missed') else 0)
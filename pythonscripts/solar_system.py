@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Solar-system targets: the Moon and planets from the SPK kernel, comets and
+minor planets from Minor Planet Center orbital-element files.
+
+Unlike watchlist objects these move, so they cannot go through the fixed-RA/Dec
+engines. todays_dsos_web.py evaluates them with evaluate_bodies() over the
+same observer position and time grid as the DSOs (one observe() per body for
+the whole grid) and appends them to the same rows, so they are sorted, cached
+and tracked like everything else:
+
+    python todays_dsos_web.py --date 2025-11-21 --planets --elements data/CometEls.txt
+
+Element files are read in either MPC layout: CometEls.txt (comets) or
+MPCORB.DAT (minor planets, with or without its header). Bodies fainter than
+the magnitude limit at the middle of the night are skipped before the grid
+pass. List what a file would add for one night:
+
+    python solar_system.py --date 2025-11-21 --elements data/CometEls.txt --mag-limit 12
+"""
+import argparse
+import datetime
+import io
+import json
+import sys
+from zoneinfo import ZoneInfo
+import numpy as np
+from skyfield.api import Topos, load_constellation_map, load_constellation_names
+from skyfield.constants import GM_SUN_Pitjeva_2005_km3_s2 as GM_SUN
+from skyfield.data import mpc
+from skyfield.magnitudelib import planetary_magnitude
+import ephemeris_data
+
+# Display name, SPK target and mean radius in km. Barycenters stand in for
+# the planets (the offset is far below what visibility needs) so a trimmed
+# kernel only has to keep the 0 -> N segments.
+PLANETS = (
+    ('Moon', 301, 1737.4),
+    ('Mercury', 1, 2439.7),
+    ('Venus', 2, 6051.8),
+    ('Mars', 4, 3389.5),
+    ('Jupiter', 5, 69911.0),
+    ('Saturn', 6, 58232.0),
+    ('Uranus', 7, 25362.0),
+    ('Neptune', 8, 24622.0),
+)
+PLANET_BODIES = tuple(code for _, code, _ in PLANETS)
+
+# Default magnitude limit for element-file bodies
+MAG_LIMIT = 15.0
+
+AU_KM = 149597870.7
+
+
+def read_elements(path):
+    """
+    Load an MPC orbital-elements file.
+
+    Returns:
+        (kind, dataframe) where kind is 'comet' or 'minor planet'
+    """
+    with open(path, 'rb') as f:
+        text = f.read()
+    # MPCORB.DAT starts with a free-form header ending in a line of dashes
+    marker = text.find(b'\n-----')
+    if marker >= 0:
+        text = text[text.index(b'\n', marker + 1) + 1:]
+    first = next((line for line in text.splitlines() if line.strip()), b'')
+    # Comet lines carry the perihelion date as 'YYYY MM DD.dddd' from column 15
+    if first[14:18].isdigit() and first[19:21].strip().isdigit():
+        return 'comet', mpc.load_comets_dataframe(io.BytesIO(text))
+    return 'minor planet', mpc.load_mpcorb_dataframe(io.BytesIO(text))
+
+
+def load_bodies(eph, ts, planets=False, element_paths=(), log=None):
+    """
+    Collect solar-system bodies to evaluate.
+
+    Args:
+        eph: Ephemeris
+        ts: Skyfield timescale (for the orbits' epochs)
+        planets: Include the Moon and planets
+        element_paths: MPC element files
+        log: List that skipped bodies are reported to
+
+    Returns:
+        list of dicts with name, type_desc, kind ('planet', 'comet' or
+        'minor planet'), body (Skyfield target), radius_km (planets only) and
+        the magnitude parameters of the kind
+    """
+    log = [] if log is None else log
+    bodies = []
+    if planets:
+        for name, code, radius in PLANETS:
+            if code not in eph:
+                log.append(f'Ephemeris {ephemeris_data.EPHEMERIS_FILE} has no {name}')
+                continue
+            bodies.append({'name': name, 'type_desc': 'Moon' if code == 301 else 'Planet', 'kind': 'planet',
+                           'body': eph[code], 'code': code, 'radius_km': radius})
+
+    sun = eph['sun']
+    for path in element_paths:
+        kind, elements = read_elements(path)
+        for _, row in elements.iterrows():
+            try:
+                if kind == 'comet':
+                    orbit = mpc.comet_orbit(row, ts, GM_SUN)
+                    params = (row.magnitude_g, row.magnitude_k)
+                else:
+                    orbit = mpc.mpcorb_orbit(row, ts, GM_SUN)
+                    params = (row.magnitude_H, row.magnitude_G)
+            except (ValueError, TypeError, AttributeError) as e:
+                log.append(f'Skipping {row.designation} in {path}: {e}')
+                continue
+            bodies.append({'name': str(row.designation).strip(), 'type_desc': kind.capitalize(), 'kind': kind,
+                           'body': sun + orbit, 'magnitude_params': params})
+    return bodies
+
+
+def _magnitude(entry, astrometric, r, delta, phase):
+    """Visual magnitude estimate (NaN where the model does not apply)."""
+    if entry['kind'] == 'planet':
+        if entry['code'] == 301:
+            # Allen's Astrophysical Quantities, full Moon -12.73
+            return -12.73 + 0.026 * phase + 4e-9 * phase ** 4
+        return float(planetary_magnitude(astrometric))
+    if entry['kind'] == 'comet':
+        g, k = entry['magnitude_params']
+        return g + 5 * np.log10(delta) + 2.5 * k * np.log10(r)
+    # IAU H-G system
+    h, g = entry['magnitude_params']
+    tan_half = np.tan(np.radians(phase) / 2)
+    phi1 = np.exp(-3.33 * tan_half ** 0.63)
+    phi2 = np.exp(-1.87 * tan_half ** 1.22)
+    return h + 5 * np.log10(r * delta) - 2.5 * np.log10((1 - g) * phi1 + g * phi2)
+
+
+def describe(bodies, observer_pos, sun, t):
+    """
+    Per-body report metadata and position at one time (the middle of the night).
+
+    Args:
+        bodies: load_bodies() result
+        observer_pos: earth + Topos vector
+        sun: Ephemeris Sun
+        t: Skyfield Time
+
+    Returns:
+        (rows, ra_deg, dec_deg) as todays_dsos_web.resolve_targets(), with the
+        astrometric RA/Dec at t; size is the apparent disc in square arcminutes
+        (0 for comets and minor planets)
+    """
+    constellation_at = load_constellation_map()
+    constellation_names = dict(load_constellation_names())
+    observer_at = observer_pos.at(t)
+    sun_at = sun.at(t)
+    rows, ra_deg, dec_deg = [], [], []
+    for entry in bodies:
+        astrometric = observer_at.observe(entry['body'])
+        geo = astrometric.position.au
+        helio = entry['body'].at(t).position.au - sun_at.position.au
+        delta, r = np.linalg.norm(geo), np.linalg.norm(helio)
+        phase = np.degrees(np.arccos(np.clip(np.dot(geo, helio) / (delta * r), -1.0, 1.0)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            magnitude = float(_magnitude(entry, astrometric, r, delta, phase))
+        size = 0.0
+        if 'radius_km' in entry:
+            radius_arcmin = np.degrees(np.arcsin(entry['radius_km'] / (delta * AU_KM))) * 60
+            size = float(np.pi * radius_arcmin ** 2)
+
+        ra, dec, _ = astrometric.radec()
+        rows.append({
+            'do_me': '',
+            'name': entry['name'],
+            'aka': '',
+            'size': size,
+            'magnitude': magnitude,
+            'constellation': constellation_names.get(str(constellation_at(astrometric)), ''),
+            'type_desc': entry['type_desc'],
+        })
+        ra_deg.append(ra._degrees)
+        dec_deg.append(dec.degrees)
+    return rows, np.array(ra_deg, dtype=np.float64), np.array(dec_deg, dtype=np.float64)
+
+
+def bright_bodies(bodies, rows, ra_deg, dec_deg, mag_limit=MAG_LIMIT):
+    """
+    Drop element-file bodies fainter than mag_limit (planets are always kept).
+
+    Returns:
+        (bodies, rows, ra_deg, dec_deg) filtered alike
+    """
+    keep = [i for i, (entry, row) in enumerate(zip(bodies, rows))
+            if entry['kind'] == 'planet' or row['magnitude'] <= mag_limit]
+    return [bodies[i] for i in keep], [rows[i] for i in keep], ra_deg[keep], dec_deg[keep]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='List solar-system targets for one night')
+    parser.add_argument('--date', help='Date in YYYY-MM-DD format (default: today)')
+    parser.add_argument('--profile', default='default', help='Profile name (default: default)')
+    parser.add_argument('--planets', action='store_true', help='Include the Moon and planets')
+    parser.add_argument('--elements', action='append', default=[], metavar='FILE',
+                        help='MPC comet or minor-planet elements file (repeatable)')
+    parser.add_argument('--mag-limit', type=float, default=MAG_LIMIT,
+                        help=f'Skip element-file bodies fainter than this (default: {MAG_LIMIT})')
+    parser.add_argument('--data-dir', help='Data directory (default: $DSO_DATA_DIR or pythonscripts/data)')
+    parser.add_argument('--ephemeris', help='Kernel file name inside the data directory')
+    parser.add_argument('--offline', action='store_true', default=None, help='Never download ephemeris files')
+    args = parser.parse_args()
+    ephemeris_data.configure(args.data_dir, args.ephemeris, args.offline)
+
+    from profile_manager import load_profile
+
+    try:
+        target_date = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today()
+        profile = load_profile(args.profile)
+        ts = ephemeris_data.load_timescale()
+        eph = ephemeris_data.load_ephemeris()
+        log = []
+        bodies = load_bodies(eph, ts, args.planets, args.elements, log)
+        midnight = ts.from_datetime(datetime.datetime.combine(target_date + datetime.timedelta(days=1),
+                                                              datetime.time(), ZoneInfo(profile['timezone'])))
+        observer_pos = eph['earth'] + Topos(profile['latitude'], profile['longitude'])
+        rows, ra_deg, dec_deg = describe(bodies, observer_pos, eph['sun'], midnight)
+        _, rows, ra_deg, dec_deg = bright_bodies(bodies, rows, ra_deg, dec_deg, args.mag_limit)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+    print(json.dumps({'bodies': [{**row, 'ra_deg': round(float(ra), 4), 'dec_deg': round(float(dec), 4)}
+                                 for row, ra, dec in zip(rows, ra_deg, dec_deg)],
+                      'log': log}, indent=2))
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Large public catalogs (NGC/IC, Sharpless, Abell, LDN, ...) in a compact
+binary format, for discovering targets beyond the curated watchlist.
+
+'ingest' converts a CSV into a <name>.dsocat directory of .npy columns:
+
+    ra_deg, dec_deg          float64 degrees (J2000)
+    magnitude, size          float32 (size in square arcminutes, NaN if unknown)
+    type, constellation      uint16 codes into the type/constellation tables
+    name, aka                string tables: UTF-8 bytes plus uint32 offsets
+    sky_order, sky_ra, ...   sky_index.py declination/RA index
+
+plus meta.json (row count, code tables, source). Every column is opened with
+np.load(mmap_mode='r'), so opening a 100k-row catalog takes milliseconds and
+only the rows a query touches are read. Filter expressions select rows before
+the visibility engine runs:
+
+    python survey_catalog.py ingest NGC.csv data/openngc.dsocat --preset openngc
+    python survey_catalog.py ingest sh2.csv data/sh2.dsocat --name Name --ra RAJ2000 --dec DEJ2000 --size Diam
+    python survey_catalog.py query data/openngc.dsocat --filter "mag < 12" --filter "size > 10" --filter "type in {G, PN}"
+    python todays_dsos_web.py --survey data/openngc.dsocat --filter "mag < 11"
+
+Filters are 'column op value' with op one of < <= > >= == != or 'in {a, b}';
+columns are mag, size, dec, ra, type and const. Unknown magnitudes or sizes
+never pass a numeric filter.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import dso_info
+import sky_index
+
+SURVEY_VERSION = 1
+SUFFIX = '.dsocat'
+
+NUMBER_COLUMNS = {'ra_deg': np.float64, 'dec_deg': np.float64, 'magnitude': np.float32, 'size': np.float32}
+CODE_COLUMNS = ('type', 'constellation')
+STRING_COLUMNS = ('name', 'aka')
+
+# OpenNGC (github.com/mattiaverga/OpenNGC) type codes
+OPENNGC_TYPES = {
+    '*': 'Star', '**': 'Double star', '*Ass': 'Association of stars', 'OCl': 'Open Cluster',
+    'GCl': 'Globular Cluster', 'Cl+N': 'Star cluster + Nebula', 'G': 'Galaxy', 'GPair': 'Galaxy Pair',
+    'GTrpl': 'Galaxy Triplet', 'GGroup': 'Group of galaxies', 'PN': 'Planetary Nebula',
+    'HII': 'HII Ionized region', 'DrkN': 'Dark Nebula', 'EmN': 'Emission Nebula', 'Neb': 'Nebula',
+    'RfN': 'Reflection Nebula', 'SNR': 'Supernova remnant', 'Nova': 'Nova star', 'Other': 'Other',
+}
+
+# Source column names per known catalog layout; magnitude may list fallbacks
+PRESETS = {
+    'openngc': {
+        'delimiter': ';', 'name': 'Name', 'aka': 'Common names', 'ra': 'RA', 'dec': 'Dec',
+        'ra_hours': True, 'magnitude': ['V-Mag', 'B-Mag'], 'major': 'MajAx', 'minor': 'MinAx',
+        'type': 'Type', 'constellation': 'Const', 'types': OPENNGC_TYPES, 'skip_types': ['Dup', 'NonEx'],
+    },
+}
+
+FILTER_PATTERN = re.compile(r'^\s*([a-z_]+)\s*(<=|>=|==|!=|<|>|in)\s*(.+?)\s*$', re.IGNORECASE)
+FILTER_COLUMNS = {'mag': 'magnitude', 'magnitude': 'magnitude', 'size': 'size', 'dec': 'dec_deg',
+                  'ra': 'ra_deg', 'type': 'type', 'const': 'constellation', 'constellation': 'constellation'}
+OPERATORS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+             '==': np.equal, '!=': np.not_equal}
+
+
+def parse_angles(values, hours=False):
+    """
+    Decimal or sexagesimal ('05 35 17.3', '-05:23:28', '+41d16m09s') angles to degrees.
+
+    Args:
+        values: Sequence of strings
+        hours: Values are hours of RA (x15), whether decimal or sexagesimal
+
+    Returns:
+        float64 array, NaN where a value cannot be parsed
+    """
+    result = np.full(len(values), np.nan)
+    for i, text in enumerate(values):
+        text = str(text).strip()
+        if not text:
+            continue
+        sign = -1.0 if text.startswith('-') else 1.0
+        parts = [part for part in re.split(r'[\s:hdms°\'"+\-]+', text) if part]
+        try:
+            numbers = [float(part) for part in parts[:3]]
+        except ValueError:
+            continue
+        if not numbers:
+            continue
+        value = numbers[0] + sum(n / 60.0 ** (k + 1) for k, n in enumerate(numbers[1:]))
+        result[i] = sign * value * (15.0 if hours else 1.0)
+    return result
+
+
+def _numbers(frame, columns):
+    """First parseable number across the given columns, row by row."""
+    result = np.full(len(frame), np.nan)
+    for column in columns:
+        values = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+        result = np.where(np.isnan(result), values, result)
+    return result
+
+
+def _codes(values):
+    """(uint16 codes, table) for a column of strings; '' is code 0."""
+    table, codes = np.unique(np.concatenate([[''], np.asarray(values, dtype=str)]), return_inverse=True)
+    return codes[1:].astype(np.uint16), table.tolist()
+
+
+def _string_table(values):
+    """(uint8 UTF-8 blob, uint32 offsets) for a column of strings."""
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def read_source(path, mapping):
+    """
+    Read a catalog CSV into column arrays.
+
+    Args:
+        path: CSV file (delimiter sniffed unless the mapping gives one)
+        mapping: Source column names: name, ra, dec (required), aka,
+            magnitude (one or a list of fallbacks), size (square arcminutes)
+            or major/minor axes (arcminutes), type, constellation; ra_hours,
+            types ({code: description}) and skip_types
+
+    Returns:
+        dict of column arrays for write_survey()
+    """
+    frame = pd.read_csv(path, sep=mapping.get('delimiter'), engine='python', dtype=str,
+                        keep_default_na=False, encoding='utf-8-sig')
+    frame.columns = [column.strip() for column in frame.columns]
+    missing = [mapping[key] for key in ('name', 'ra', 'dec') if mapping.get(key) not in frame.columns]
+    if missing:
+        raise ValueError(f"{path} has no column(s) {', '.join(map(str, missing))}; "
+                         f"columns are {', '.join(frame.columns)}")
+
+    def column(key):
+        return frame[mapping[key]].str.strip() if mapping.get(key) in frame.columns else pd.Series([''] * len(frame))
+
+    types = column('type')
+    if mapping.get('skip_types'):
+        keep = ~types.isin(mapping['skip_types'])
+        frame, types = frame[keep].reset_index(drop=True), types[keep].reset_index(drop=True)
+
+    magnitude = mapping.get('magnitude') or []
+    magnitude = [magnitude] if isinstance(magnitude, str) else magnitude
+    if mapping.get('size') in frame.columns:
+        size = _numbers(frame, [mapping['size']])
+    elif mapping.get('major') in frame.columns:
+        major = _numbers(frame, [mapping['major']])
+        minor = _numbers(frame, [mapping['minor']]) if mapping.get('minor') in frame.columns else major
+        size = major * np.where(np.isnan(minor), major, minor)
+    else:
+        size = np.full(len(frame), np.nan)
+
+    return {
+        'name': column('name').tolist(),
+        'aka': column('aka').tolist(),
+        'ra_deg': parse_angles(frame[mapping['ra']].tolist(), mapping.get('ra_hours', False)),
+        'dec_deg': parse_angles(frame[mapping['dec']].tolist()),
+        'magnitude': _numbers(frame, [m for m in magnitude if m in frame.columns]),
+        'size': size,
+        'type': types.tolist(),
+        'constellation': column('constellation').tolist(),
+        'type_descriptions': mapping.get('types') or {},
+    }
+
+
+def write_survey(columns, output, source=''):
+    """
+    Write read_source() columns as a .dsocat directory.
+
+    Rows without coordinates are dropped. Columns are written under temporary
+    names and renamed into place, meta.json last.
+
+    Returns:
+        Number of rows written
+    """
+    keep = ~(np.isnan(columns['ra_deg']) | np.isnan(columns['dec_deg']))
+    rows = np.flatnonzero(keep)
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    arrays = {key: np.asarray(columns[key])[rows].astype(dtype) for key, dtype in NUMBER_COLUMNS.items()}
+    arrays['ra_deg'] %= 360.0
+    tables = {}
+    for key in CODE_COLUMNS:
+        arrays[key], tables[key] = _codes(np.asarray(columns[key], dtype=str)[rows])
+    for key in STRING_COLUMNS:
+        arrays[f'{key}_bytes'], arrays[f'{key}_offsets'] = _string_table(np.asarray(columns[key], dtype=str)[rows])
+    arrays.update(sky_index.build_index(arrays['ra_deg'], arrays['dec_deg']))
+
+    for key, value in arrays.items():
+        tmp = output / f'.{key}.tmp.npy'
+        np.save(tmp, value)
+        tmp.replace(output / f'{key}.npy')
+
+    descriptions = columns.get('type_descriptions') or {}
+    meta = {
+        'version': SURVEY_VERSION,
+        'rows': len(rows),
+        'source': str(source),
+        'columns': sorted(arrays),
+        'type': tables['type'],
+        'type_description': [descriptions.get(code, code) for code in tables['type']],
+        'constellation': tables['constellation'],
+    }
+    tmp = output / '.meta.tmp.json'
+    tmp.write_text(json.dumps(meta, indent=1), encoding='utf-8')
+    tmp.replace(output / 'meta.json')
+    return len(rows)
+
+
+def open_survey(path):
+    """
+    Open a .dsocat catalog with every column memory-mapped.
+
+    Returns:
+        dict of column arrays plus 'meta'
+
+    Raises:
+        FileNotFoundError: If the catalog does not exist
+        ValueError: If it was written by an incompatible version
+    """
+    path = Path(path)
+    meta = json.loads((path / 'meta.json').read_text(encoding='utf-8'))
+    if meta.get('version') != SURVEY_VERSION:
+        raise ValueError(f'{path} is not a version {SURVEY_VERSION} survey catalog; ingest it again')
+    survey = {key: np.load(path / f'{key}.npy', mmap_mode='r') for key in meta['columns']}
+    survey['meta'] = meta
+    return survey
+
+
+def strings(survey, column, rows):
+    """Decoded values of a string-table column for the given rows."""
+    data, offsets = survey[f'{column}_bytes'], survey[f'{column}_offsets']
+    return [bytes(data[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in rows]
+
+
+def parse_filter(text):
+    """
+    Parse 'mag < 12', 'size >= 10' or 'type in {G, PN}'.
+
+    Returns:
+        (column, operator, value) with value a float, or a set of strings for 'in'
+
+    Raises:
+        ValueError: If the expression is malformed or the column unknown
+    """
+    match = FILTER_PATTERN.match(text)
+    if not match or match.group(1).lower() not in FILTER_COLUMNS:
+        raise ValueError(f"Invalid filter '{text}'; use e.g. 'mag < 12', 'size > 10' or 'type in {{G, PN}}' "
+                         f"with a column of {', '.join(sorted(FILTER_COLUMNS))}")
+    column, operator, value = FILTER_COLUMNS[match.group(1).lower()], match.group(2).lower(), match.group(3)
+    if operator == 'in':
+        return column, operator, {item.strip() for item in value.strip('{}[]()').split(',') if item.strip()}
+    if column in CODE_COLUMNS:
+        return column, operator, value.strip('\'"')
+    try:
+        return column, operator, float(value)
+    except ValueError:
+        raise ValueError(f"Filter '{text}' compares {column} with a non-number") from None
+
+
+def filter_rows(survey, filters, rows=None):
+    """
+    Rows passing every filter (ANDed).
+
+    Args:
+        survey: open_survey() result
+        filters: parse_filter() tuples
+        rows: Sorted candidate rows to start from (default: all)
+
+    Returns:
+        Sorted int64 array of rows
+    """
+    rows = np.arange(survey['meta']['rows']) if rows is None else np.asarray(rows, dtype=np.int64)
+    for column, operator, value in filters:
+        values = survey[column][rows]
+        if column in CODE_COLUMNS:
+            table = survey['meta'][column]
+            names = table if column != 'type' else [f'{code}\0{desc}' for code, desc in
+                                                    zip(table, survey['meta']['type_description'])]
+            wanted = value if operator == 'in' else {value}
+            hit = np.array([any(part in wanted for part in name.split('\0')) for name in names], dtype=bool)
+            keep = hit[values] if operator in ('in', '==') else ~hit[values]
+        else:
+            keep = OPERATORS[operator](values, value)
+        rows = rows[keep]
+    return rows
+
+
+def survey_targets(path, log, filters=(), region=None, exclude=()):
+    """
+    Survey objects in the same form as todays_dsos_web.resolve_targets().
+
+    Args:
+        path: .dsocat catalog
+        log: List for messages (kept for the load_targets() signature)
+        filters: parse_filter() tuples
+        region: sky_index.candidates() keyword arguments, to skip objects that
+            cannot reach the usable sky
+        exclude: Names already loaded (e.g. from the watchlist), compared
+            with dso_info.normalize_name()
+
+    Returns:
+        (rows, ra_deg, dec_deg)
+    """
+    survey = open_survey(path)
+    candidates = sky_index.candidates(survey, **region) if region is not None else None
+    selected = filter_rows(survey, filters, candidates)
+
+    names = strings(survey, 'name', selected)
+    exclude = {dso_info.normalize_name(str(name)) for name in exclude}
+    keep = [k for k, name in enumerate(names) if dso_info.normalize_name(name) not in exclude]
+    selected = selected[keep]
+    names = [names[k] for k in keep]
+
+    meta = survey['meta']
+    rows = [{
+        'do_me': '',
+        'name': name,
+        'aka': aka,
+        'size': float(size),
+        'magnitude': float(magnitude),
+        'constellation': meta['constellation'][constellation],
+        'type_desc': meta['type_description'][type_code],
+    } for name, aka, size, magnitude, constellation, type_code in zip(
+        names, strings(survey, 'aka', selected), survey['size'][selected], survey['magnitude'][selected],
+        survey['constellation'][selected], survey['type'][selected])]
+    return rows, np.array(survey['ra_deg'][selected], dtype=np.float64), \
+        np.array(survey['dec_deg'][selected], dtype=np.float64)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert and query large catalogs')
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    ingest_parser = subparsers.add_parser('ingest', help='Convert a catalog CSV to a .dsocat directory')
+    ingest_parser.add_argument('source', help='Catalog CSV')
+    ingest_parser.add_argument('output', help=f'Output directory (conventionally <name>{SUFFIX})')
+    ingest_parser.add_argument('--preset', choices=sorted(PRESETS), help='Known column layout')
+    for key in ('name', 'aka', 'ra', 'dec', 'size', 'major', 'minor', 'type', 'constellation', 'delimiter'):
+        ingest_parser.add_argument(f'--{key}', help=f'Source column for {key}' if key != 'delimiter'
+                                   else 'Field delimiter (default: sniffed)')
+    ingest_parser.add_argument('--magnitude', nargs='+', help='Magnitude column(s), first non-empty wins')
+    ingest_parser.add_argument('--ra-hours', action='store_true', default=None, help='RA is in hours')
+
+    query_parser = subparsers.add_parser('query', help='Count rows passing filters')
+    query_parser.add_argument('survey', help=f'{SUFFIX} catalog')
+    query_parser.add_argument('--filter', action='append', default=[], metavar='EXPR',
+                              help="Filter expression, e.g. 'mag < 12' (repeatable)")
+    query_parser.add_argument('--show', type=int, default=10, help='Print the first N matching names')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'ingest':
+            mapping = dict(PRESETS.get(args.preset, {}))
+            for key in ('name', 'aka', 'ra', 'dec', 'size', 'major', 'minor', 'type', 'constellation',
+                        'delimiter', 'magnitude', 'ra_hours'):
+                if getattr(args, key) is not None:
+                    mapping[key] = getattr(args, key)
+            start = time.perf_counter()
+            count = write_survey(read_source(args.source, mapping), args.output, args.source)
+            size = sum(f.stat().st_size for f in Path(args.output).iterdir())
+            print(json.dumps({'success': True, 'output': args.output, 'rows': count, 'bytes': size,
+                              'seconds': round(time.perf_counter() - start, 3)}))
+        elif args.command == 'query':
+            filters = [parse_filter(text) for text in args.filter]
+            start = time.perf_counter()
+            survey = open_survey(args.survey)
+            open_ms = (time.perf_counter() - start) * 1000
+            rows = filter_rows(survey, filters)
+            print(json.dumps({'rows': survey['meta']['rows'], 'matching': len(rows), 'open_ms': round(open_ms, 2),
+                              'filter_ms': round((time.perf_counter() - start) * 1000 - open_ms, 2),
+                              'names': strings(survey, 'name', rows[:args.show])}, indent=2))
+        else:
+            parser.print_help()
+            sys.exit(1)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
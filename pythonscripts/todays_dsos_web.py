@@ -4,16 +4,33 @@ Web version with sortable output: Outputs HTML for browser display with dropdown
 """
 import csv
 import datetime
+import math
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
 import numpy as np
 import pandas as pd
 from zoneinfo import ZoneInfo
-from skyfield.api import load, Topos, Star, Angle
+from skyfield.api import Topos, Star, Angle
+from skyfield.positionlib import Barycentric
+from skyfield.timelib import Time
 from skyfield.almanac import dark_twilight_day, find_discrete
 from astropy.coordinates import SkyCoord
 import sys
-import json
 import argparse
 from profile_manager import load_profile
+import ephemeris_data
+import fast_altaz
+import quality
+import session_scheduler
+import sky_index
+import solar_system
+import survey_catalog
+from report_renderer import (report_output, write_head, write_schedule, write_objects, write_payload, quantize_tracks,
+                             write_tracks, file_hash, versioned_url)
+from dso_catalog import catalog_targets, load_catalog
+import visibility_cache
 
 # No longer hardcoded - these come from profiles now
 # See profile_manager.py for profile management
@@ -25,6 +42,23 @@ MIN_ALTITUDE_DEG = 25.0
 AZ_MIN_DEG = 10.0  # Due North
 AZ_MAX_DEG = 145.0  # Due South (Eastern Sky)
 
+# Objects must stay visible at least this long (minutes) to be listed;
+# profiles may override it with 'min_duration'
+MIN_DURATION = 60
+
+# Serial by default; --workers N shards objects across a process pool
+DEFAULT_WORKERS = 1
+
+# Alt/az engines: the full Skyfield apparent-place chain, or fast_altaz.py's
+# NumPy approximation (about 0.0001 degrees off, far faster)
+ENGINES = ('skyfield', 'fast')
+DEFAULT_ENGINE = 'skyfield'
+
+# Altitude/azimuth track export: sample spacing (time grid points, ~1 minute
+# each) and the sidecar size above which samples are thinned further
+TRACK_STEP = 5
+TRACK_MAX_BYTES = 1 << 20
+
 def get_viewing_window(target_date, ts, eph, observer):
     """
     Determines the viewing window from astronomical twilight end to astronomical sunrise.
@@ -56,13 +90,472 @@ def get_viewing_window(target_date, ts, eph, observer):
     return viewing_start, viewing_end
 
 
-def calculate_visibility(target_date=None, profile_name='default'):
+def clock_minutes(local_time):
+    """Minutes since local midnight, +24h for times after midnight so a night sorts in order."""
+    minutes = local_time.hour * 60 + local_time.minute
+    if local_time.hour < 12:
+        minutes += 24 * 60  # Adjust for sorting past midnight
+    return minutes
+
+
+def load_watchlist():
+    """
+    Load the DSO watchlist from the shared Google Sheet.
+
+    Returns:
+        pandas.DataFrame with one row per watchlist object
+    """
+    sheet_id = '1ntqVhvlPvBZFG59KJVQgiIdV65MeYnYBin5CT0alpsA'
+    sheet_name = 'dso_watchlist'
+    csv_url = f'https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}'
+    return pd.read_csv(csv_url)
+
+
+def resolve_targets(df, log):
+    """
+    Resolve watchlist names to coordinates.
+
+    Args:
+        df: Watchlist DataFrame from load_watchlist()
+        log: List that resolution errors are appended to
+
+    Returns:
+        (rows, ra_deg, dec_deg) where rows is a list of per-object metadata dicts
+        in watchlist order and ra_deg/dec_deg are matching float64 arrays
+    """
+    rows = []
+    ra_deg = []
+    dec_deg = []
+
+    for index, row in df.iterrows():
+        name = row['Name']
+        want_better = row.get('WantBetter', False)
+
+        try:
+            obj = SkyCoord.from_name(str(name))
+        except Exception as e:
+            log.append(f"Error resolving {name}: {e}")
+            continue
+
+        rows.append({
+            'do_me': '&#9733;' if str(want_better).upper() == 'TRUE' else '',
+            'name': name,
+            'aka': row['Aka'],
+            'size': row['SqArcMins'],
+            'magnitude': row['Mag'],
+            'constellation': row['Constellation'],
+            'type_desc': row['TypeDesc'],
+        })
+        ra_deg.append(obj.ra.deg)
+        dec_deg.append(obj.dec.deg)
+
+    return rows, np.array(ra_deg, dtype=np.float64), np.array(dec_deg, dtype=np.float64)
+
+
+def load_targets(log, catalog_path=None, region=None, surveys=(), filters=()):
+    """
+    Watchlist objects and coordinates, from the prebuilt catalog when given
+    (see dso_catalog.py), otherwise from the Google Sheet with name resolution.
+
+    Args:
+        log: List that resolution errors are appended to
+        catalog_path: dso_catalog.py catalog, or None for the Google Sheet
+        region: sky_index.candidates() keyword arguments; with a catalog that
+            has a sky index only objects that can reach that region are loaded
+        surveys: survey_catalog.py .dsocat catalogs whose objects are added
+            after the watchlist (skipping names already on it)
+        filters: survey_catalog.parse_filter() tuples applied to the surveys
+
+    Returns:
+        (rows, ra_deg, dec_deg) as resolve_targets()
+    """
+    if catalog_path is not None:
+        catalog = load_catalog(catalog_path)
+        candidates = None
+        if region is not None and 'sky_order' in catalog:
+            candidates = sky_index.candidates(catalog, **region)
+        rows, ra_deg, dec_deg = catalog_targets(catalog, log, candidates)
+        # The whole watchlist, including objects outside the region
+        watchlist = catalog['name'][catalog['in_watchlist']].tolist()
+    else:
+        rows, ra_deg, dec_deg = resolve_targets(load_watchlist(), log)
+        watchlist = [row['name'] for row in rows]
+
+    for path in surveys:
+        extra_rows, extra_ra, extra_dec = survey_catalog.survey_targets(path, log, filters, region, watchlist)
+        rows += extra_rows
+        ra_deg = np.concatenate([ra_deg, extra_ra])
+        dec_deg = np.concatenate([dec_deg, extra_dec])
+    return rows, ra_deg, dec_deg
+
+
+def evaluate_targets(observer_at, ra_deg, dec_deg, min_alt, az_min, az_max, track_step=0, quality_settings=None):
+    """
+    Evaluate visibility of fixed targets over the time grid.
+
+    Returns compact arrays instead of per-object dicts so results are cheap to
+    ship back from worker processes.
+
+    Args:
+        observer_at: Skyfield Barycentric observer position over the time grid
+            (``(earth + topos).at(time_range)``)
+        ra_deg, dec_deg: float64 arrays of target coordinates
+        min_alt, az_min, az_max: Visibility criteria in degrees
+        track_step: Also keep alt/az every track_step grid points (0 = no tracks)
+        quality_settings: quality.settings() to also summarize each object's
+            visible samples with quality.summarize()
+
+    Returns:
+        (indices, altaz, tracks) where indices is an (N, 2) int32 array of
+        first/last visible sample (-1 when never visible), altaz is an (N, 4)
+        float64 array of start_alt, start_az, end_alt, end_az, and tracks is an
+        (N, S, 2) float32 array of alt/az degrees (S = 0 without track_step).
+        With quality_settings a fourth item, the (N, Q) quality.summarize()
+        array, follows.
+    """
+    stars = [Star(ra=Angle(degrees=ra), dec=Angle(degrees=dec)) for ra, dec in zip(ra_deg, dec_deg)]
+    return evaluate_bodies(observer_at, stars, min_alt, az_min, az_max, track_step, quality_settings)
+
+
+def evaluate_bodies(observer_at, bodies, min_alt, az_min, az_max, track_step=0, quality_settings=None):
+    """
+    Evaluate visibility of any Skyfield targets (stars, planets, orbits) over the time grid.
+
+    Each body is observed once for the whole grid from the shared observer
+    position.
+
+    Args:
+        observer_at: As for evaluate_targets()
+        bodies: Sequence of Skyfield targets for observer_at.observe()
+        min_alt, az_min, az_max, track_step, quality_settings: As for
+            evaluate_targets()
+
+    Returns:
+        As evaluate_targets()
+    """
+    count = len(bodies)
+    indices = np.full((count, 2), -1, dtype=np.int32)
+    altaz = np.zeros((count, 4), dtype=np.float64)
+    samples = np.arange(0, observer_at.t.shape[0], track_step) if track_step else np.arange(0)
+    tracks = np.zeros((count, len(samples), 2), dtype=np.float32)
+    if quality_settings is not None:
+        grid_minutes = (observer_at.t.tt - observer_at.t.tt[0]) * 1440.0
+        scores = np.zeros((count, len(quality.FIELDS) + len(quality_settings['tiers'])), dtype=np.float64)
+
+    for i, body in enumerate(bodies):
+        alt, az, _ = observer_at.observe(body).apparent().altaz()
+
+        if track_step:
+            tracks[i, :, 0] = alt.degrees[samples]
+            tracks[i, :, 1] = az.degrees[samples]
+
+        is_visible = (alt.degrees >= min_alt) & \
+                     (az.degrees >= az_min) & \
+                     (az.degrees <= az_max)
+
+        if quality_settings is not None:
+            scores[i] = quality.summarize(alt.degrees[None, :], is_visible[None, :], grid_minutes,
+                                          quality_settings)[0]
+
+        visible_indices = np.where(is_visible)[0]
+
+        if len(visible_indices) > 0:
+            start_idx = visible_indices[0]
+            end_idx = visible_indices[-1]
+            indices[i] = (start_idx, end_idx)
+            altaz[i] = (alt.degrees[start_idx], az.degrees[start_idx],
+                        alt.degrees[end_idx], az.degrees[end_idx])
+
+    if quality_settings is not None:
+        return indices, altaz, tracks, scores
+    return indices, altaz, tracks
+
+
+# Skyfield internals that observer_grid() relies on to rebuild an observer
+# position without recomputing it (checked against Skyfield 1.45-1.55, see
+# the upper bound in requirements.txt):
+#   _ephemeris          ephemeris used for light deflection by the planets
+#   _observer_gcrs_au   geocentric observer position (Earth deflection, horizon frame)
+#   _altaz_rotation     @reify-cached horizon rotation matrices, seeded via __dict__
+SKYFIELD_OBSERVER_INTERNALS = ('_ephemeris', '_observer_gcrs_au', '_altaz_rotation')
+
+
+def skyfield_internals_available():
+    """Whether this Skyfield still defines the attributes observer_grid() sets."""
+    return all(hasattr(Barycentric, name) for name in SKYFIELD_OBSERVER_INTERNALS)
+
+
+def observer_grid(position_au, velocity_au_per_d, t, eph, gcrs_au=None, altaz_rotation=None, observer_pos=None):
+    """
+    Skyfield observer position over t rebuilt from precomputed arrays.
+
+    The result behaves like observer_pos.at(t), so observe().apparent().altaz()
+    runs the usual Skyfield code, but the Earth and observer ephemeris and the
+    horizon rotation are not recomputed. When the geocentric arrays are not
+    given or this Skyfield lacks the internals (SKYFIELD_OBSERVER_INTERNALS),
+    observer_pos.at(t) is computed instead.
+
+    Args:
+        position_au, velocity_au_per_d: (3, T) barycentric observer state
+        t: Skyfield Time of the T samples
+        eph: Ephemeris, used for light deflection by the Sun and planets
+        gcrs_au: (3, T) geocentric observer position, or None
+        altaz_rotation: (3, 3, T) horizon rotation matrices, or None
+        observer_pos: earth + Topos vector for the fallback
+
+    Raises:
+        ValueError: If the fallback is needed but observer_pos is None
+    """
+    if gcrs_au is not None and altaz_rotation is not None and skyfield_internals_available():
+        observer_at = Barycentric(position_au, velocity_au_per_d, t, center=0)
+        observer_at._ephemeris = eph
+        observer_at._observer_gcrs_au = gcrs_au
+        # Seed the @reify cache so altaz() reuses the precomputed rotation matrices
+        observer_at.__dict__['_altaz_rotation'] = altaz_rotation
+        return observer_at
+    if observer_pos is None:
+        raise ValueError('This Skyfield version cannot reuse observer positions; an observer location is required')
+    return observer_pos.at(t)
+
+
+def publish_night_grid(observer_at):
+    """
+    Copy the per-night observer precomputation into one shared memory block.
+
+    The block holds the TT time array, the observer's barycentric position and
+    velocity, its geocentric position (for Earth deflection) and the horizon
+    rotation matrices, which fold in precession, nutation and sidereal time.
+
+    Args:
+        observer_at: Skyfield Barycentric observer position over the time grid
+
+    Returns:
+        (shm, layout) where shm is the SharedMemory block (caller must close and
+        unlink it) and layout is a list of (key, shape, offset) float64 views
+    """
+    arrays = {
+        'tt_whole': observer_at.t.whole,
+        'tt_fraction': observer_at.t.tt_fraction,
+        'position': observer_at.xyz.au,
+        'velocity': observer_at.velocity.au_per_d,
+    }
+    # Without these workers recompute the observer (see observer_grid())
+    if skyfield_internals_available():
+        arrays['gcrs'] = observer_at._observer_gcrs_au
+        arrays['altaz_rotation'] = observer_at._altaz_rotation
+
+    layout = []
+    offset = 0
+    for key, value in arrays.items():
+        layout.append((key, value.shape, offset))
+        offset += value.size * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=offset)
+    for key, shape, start in layout:
+        view = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=start)
+        view[...] = arrays[key]
+
+    return shm, layout
+
+
+def attach_night_grid(shm, layout, ts, eph, location):
+    """
+    Rebuild the observer position over the time grid from a shared memory block.
+
+    The returned object is a normal Skyfield Barycentric position whose arrays
+    are views into ``shm``, so observe().apparent().altaz() runs the same code
+    as in the parent without recomputing the Earth or observer ephemeris.
+
+    Args:
+        shm: SharedMemory block from publish_night_grid()
+        layout: Layout list from publish_night_grid()
+        ts: Skyfield timescale
+        eph: Ephemeris, used only for light deflection by the Sun and planets
+        location: (latitude, longitude) of the observer, for observer_grid()'s
+            fallback
+
+    Returns:
+        Skyfield Barycentric position
+    """
+    grid = {key: np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=start)
+            for key, shape, start in layout}
+
+    t = Time(ts, grid['tt_whole'], grid['tt_fraction'])
+    return observer_grid(grid['position'], grid['velocity'], t, eph, grid.get('gcrs'), grid.get('altaz_rotation'),
+                         eph['earth'] + Topos(*location))
+
+
+# Per-process state for pool workers, populated once by _init_worker
+_worker_state = {}
+
+
+def _init_worker(data_settings, shm_name, layout, location, criteria):
+    """Attach the shared night grid once per worker process."""
+    ephemeris_data.configure(*data_settings)
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_state['shm'] = shm  # Keep the mapping alive for the worker's lifetime
+    _worker_state['observer_at'] = attach_night_grid(shm, layout, ts, eph, location)
+    _worker_state['criteria'] = criteria
+
+
+def _evaluate_chunk(coords):
+    """Pool task: evaluate one shard of (ra_deg, dec_deg)."""
+    ra_deg, dec_deg = coords
+    return evaluate_targets(_worker_state['observer_at'], ra_deg, dec_deg,
+                            *_worker_state['criteria'])
+
+
+def evaluate_targets_parallel(workers, observer_at, location, ra_deg, dec_deg, min_alt, az_min, az_max, track_step=0,
+                              quality_settings=None):
+    """
+    Shard evaluate_targets() across a process pool.
+
+    The observer grid is computed once by the caller and published to workers
+    through shared memory, so per-worker memory does not grow with the grid.
+    Shards are returned in submission order, so the concatenated result is
+    identical to a serial run.
+
+    Args:
+        workers: Number of worker processes
+        observer_at: Skyfield Barycentric observer position over the time grid
+        location: (latitude, longitude) of the observer
+        ra_deg, dec_deg: float64 arrays of target coordinates
+        min_alt, az_min, az_max: Visibility criteria in degrees
+        track_step, quality_settings: As for evaluate_targets()
+
+    Returns:
+        (indices, altaz, tracks[, quality]) as from evaluate_targets()
+    """
+    # Several shards per worker keeps the pool busy when objects vary in cost
+    n_chunks = max(1, min(len(ra_deg), workers * 4))
+    chunks = list(zip(np.array_split(ra_deg, n_chunks), np.array_split(dec_deg, n_chunks)))
+
+    shm, layout = publish_night_grid(observer_at)
+    try:
+        initargs = (ephemeris_data.settings(), shm.name, layout, tuple(location),
+                    (min_alt, az_min, az_max, track_step, quality_settings))
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = pool.map(_evaluate_chunk, chunks)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return tuple(np.concatenate([r[k] for r in results]) for k in range(len(results[0])))
+
+
+def rss_note():
+    peak = fast_altaz.peak_rss_mb()
+    return '' if peak is None else f'  peak RSS {peak:.0f} MB'
+
+
+def benchmark_workers(target_date=None, profile_name='default', max_workers=None, catalog_path=None,
+                      memory_budget=fast_altaz.DEFAULT_MEMORY_BUDGET):
+    """
+    Time target evaluation with 1..max_workers processes and print a plain-text table.
+
+    Coordinates are resolved once up front so only the visibility math is timed.
+    Every run is checked against the serial result. Peak RSS is the process
+    high-water mark so far (not available on Windows).
+    """
+    if target_date is None:
+        target_date = datetime.date.today()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    profile = load_profile(profile_name)
+    ts = ephemeris_data.load_timescale()
+    eph = ephemeris_data.load_ephemeris()
+    observer = Topos(profile['latitude'], profile['longitude'])
+    observer_pos = eph['earth'] + observer
+
+    viewing_start, viewing_end = get_viewing_window(target_date, ts, eph, observer)
+    duration_minutes = int((viewing_end.utc_datetime() - viewing_start.utc_datetime()).total_seconds() / 60)
+    time_range = ts.linspace(viewing_start, viewing_end, duration_minutes)
+
+    log = []
+    rows, ra_deg, dec_deg = load_targets(log, catalog_path)
+    criteria = (profile['min_altitude'], profile['az_min'], profile['az_max'])
+
+    print(f"Benchmark: {len(rows)} objects x {duration_minutes} samples, profile '{profile_name}'")
+
+    start = time.perf_counter()
+    observer_at = observer_pos.at(time_range)
+    serial = evaluate_targets(observer_at, ra_deg, dec_deg, *criteria)
+    baseline = time.perf_counter() - start
+    print(f"  serial     {baseline:8.2f}s  1.00x{rss_note()}")
+
+    for dtype in (np.float64, np.float32):
+        start = time.perf_counter()
+        fast = fast_altaz.evaluate_targets(time_range, eph, profile['latitude'], profile['longitude'],
+                                           ra_deg, dec_deg, *criteria, memory_budget=memory_budget, dtype=dtype)
+        elapsed = time.perf_counter() - start
+        spans = np.abs(fast[0].astype(np.int64) - serial[0]).max(initial=0)
+        print(f"  fast/{np.dtype(dtype).itemsize * 8}    {elapsed:8.2f}s  {baseline / elapsed:4.2f}x  "
+              f"spans within {spans} sample(s){rss_note()}")
+
+    counts = sorted({n for n in (1, 2, 4, 8, 16, 32, max_workers) if n <= max_workers})
+    for n in counts:
+        start = time.perf_counter()
+        observer_at = observer_pos.at(time_range)
+        result = evaluate_targets_parallel(n, observer_at, (profile['latitude'], profile['longitude']),
+                                           ra_deg, dec_deg, *criteria)
+        elapsed = time.perf_counter() - start
+        match = all(np.array_equal(a, b) for a, b in zip(result, serial))
+        print(f"  workers={n:<3} {elapsed:8.2f}s  {baseline / elapsed:4.2f}x  {'match' if match else 'MISMATCH'}"
+              f"{rss_note()}")
+
+
+class _ReportAborted(Exception):
+    """Raised inside report_output() so a failed report does not replace the cached one."""
+
+
+def calculate_visibility(target_date=None, profile_name='default', workers=DEFAULT_WORKERS,
+                         output_path=None, data_output_path=None, data_url=None, catalog_path=None,
+                         track_output_path=None, track_url=None, track_step=TRACK_STEP,
+                         schedule_settings=None, schedule_output_path=None,
+                         min_duration=None, visibility_output_path=None, windows=None,
+                         engine=DEFAULT_ENGINE, memory_budget=fast_altaz.DEFAULT_MEMORY_BUDGET,
+                         float32=False, surveys=(), survey_filters=(), planets=False, element_paths=(),
+                         body_mag_limit=solar_system.MAG_LIMIT):
     """
     Main function to calculate visibility of objects and output HTML with sorting capability.
     
     Args:
         target_date: datetime.date object or None for today
         profile_name: Name of location profile to use
+        workers: Number of processes used to evaluate objects (1 = serial)
+        output_path: Write the report atomically to this file instead of stdout
+        data_output_path: Write the columnar table payload to this file instead of
+            embedding it in the page
+        data_url: URL the page fetches the payload from (with data_output_path);
+            the payload's content hash is appended as a v= parameter
+        catalog_path: Load objects from this dso_catalog.py catalog instead of the watchlist
+        track_output_path: Write downsampled alt/az tracks of the visible objects
+            to this binary sidecar, described in the payload's "tracks" entry
+        track_url: URL the page fetches the track sidecar from
+        track_step: Track sample spacing in time grid points (~minutes)
+        schedule_settings: session_scheduler.schedule() keyword arguments; when
+            given, the report opens with a suggested imaging session
+        schedule_output_path: Also write the session as JSON to this file
+        min_duration: Minimum visible minutes (default: the profile's
+            'min_duration', else MIN_DURATION)
+        visibility_output_path: Also store the per-minute alt/az of every
+            object that rises above visibility_cache.FLOOR_ALT that night, for
+            visibility_cache.py threshold queries
+        windows: Only count time inside these (start, end) clock-minute
+            windows (visibility_cache.parse_window()); durations are clipped
+            to them. Only their samples are evaluated unless the whole night
+            is being stored with visibility_output_path.
+        engine: 'skyfield' or 'fast' (fast_altaz.py; workers are not used)
+        memory_budget: Working memory in bytes per block of objects (fast engine)
+        float32: Compute in float32 (fast engine)
+        surveys: survey_catalog.py catalogs to search alongside the watchlist
+        survey_filters: survey_catalog.parse_filter() tuples for the surveys
+        planets: Also evaluate the Moon and planets (solar_system.py)
+        element_paths: MPC comet/minor-planet element files to evaluate
+        body_mag_limit: Skip element-file bodies fainter than this
     """
     if target_date is None:
         target_date = datetime.date.today()
@@ -81,10 +574,29 @@ def calculate_visibility(target_date=None, profile_name='default'):
     MIN_ALTITUDE_DEG = profile['min_altitude']
     AZ_MIN_DEG = profile['az_min']
     AZ_MAX_DEG = profile['az_max']
+    if min_duration is None:
+        min_duration = profile.get('min_duration', MIN_DURATION)
+    try:
+        quality_settings = quality.settings(profile)
+    except (TypeError, ValueError) as e:
+        print(f"<p>Error: Invalid quality settings in profile '{profile_name}': {e}</p>")
+        return
 
     # Setup Skyfield
-    ts = load.timescale(builtin=True)
-    eph = load('de421.bsp')
+    try:
+        ts = ephemeris_data.load_timescale()
+        eph = ephemeris_data.load_ephemeris()
+    except OSError as e:
+        print(f"<p>Error: {e}</p>")
+        return
+
+    required = ephemeris_data.KERNEL_BODIES + (solar_system.PLANET_BODIES if planets else ())
+    missing = ephemeris_data.check_coverage(eph, *ephemeris_data.night_span_jd(target_date), required)
+    if missing:
+        print(f"<p>Error: Ephemeris {ephemeris_data.EPHEMERIS_FILE} does not cover {target_date} "
+              f"for SPK targets {missing}.</p>")
+        return
+
     observer = Topos(LAT_DEG, LON_DEG)
     earth = eph['earth']
     observer_pos = earth + observer
@@ -105,447 +617,259 @@ def calculate_visibility(target_date=None, profile_name='default'):
     duration_minutes = int((viewing_end.utc_datetime() - viewing_start.utc_datetime()).total_seconds() / 60)
     time_range = ts.linspace(viewing_start, viewing_end, duration_minutes)
 
+    report = {
+        'date': target_date.strftime('%Y-%m-%d'),
+        'profile': profile_name,
+        'location': LOCATION_NAME,
+        'window_start': start_local,
+        'window_end': end_local,
+        'min_altitude': MIN_ALTITUDE_DEG,
+        'az_min': AZ_MIN_DEG,
+        'az_max': AZ_MAX_DEG,
+        'min_duration': min_duration,
+        'quality': quality_settings,
+    }
+
+    # Per-sample clock minutes, for time windows and the visibility cache
+    grid_minutes = None
+    if windows or visibility_output_path is not None:
+        grid_minutes = np.array([clock_minutes(t) for t in time_range.astimezone(tz)])
+
+    if windows:
+        windows = visibility_cache.merge_windows(windows)
+        in_windows = visibility_cache.window_samples(grid_minutes, windows)
+        if not in_windows.any():
+            print(f"<p>Error: {visibility_cache.format_windows(windows)} is outside the viewing window "
+                  f"({start_local.strftime('%H:%M')}-{end_local.strftime('%H:%M')}).</p>")
+            return
+        if visibility_output_path is None:
+            # Only the samples inside the windows need evaluating
+            keep = np.flatnonzero(in_windows)
+            time_range = time_range[keep]
+            grid_minutes = grid_minutes[keep]
+
+    if windows:
+        report['time_windows'] = visibility_cache.format_windows(windows)
+
     visible_objects = []
+    night = None
 
+    # The head goes out as soon as the viewing window is known. Written to a file,
+    # the page only replaces the cached report once it is complete, and an error
+    # below discards it (see report_output).
     try:
-        log = []
-        sheet_id = '1ntqVhvlPvBZFG59KJVQgiIdV65MeYnYBin5CT0alpsA'
-        sheet_name = 'dso_watchlist'
-        csv_url = f'https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&sheet={sheet_name}'
-        df = pd.read_csv(csv_url)
-
-        for index, row in df.iterrows():
-            name = row['Name']
-            aka = row['Aka']
-            type_desc = row['TypeDesc']
-            constellation = row['Constellation']
-            size = row['SqArcMins']
-            magnitude = row['Mag']
-            want_better = row.get('WantBetter', False)
-            do_me = '&#9733;' if str(want_better).upper() == 'TRUE' else ''
-
+        with report_output(output_path) as out:
+            write_head(out, report)
             try:
-                obj = SkyCoord.from_name(str(name))
-                star = Star(ra=Angle(degrees=obj.ra.deg), dec=Angle(degrees=obj.dec.deg))
+                log = []
+                criteria = (MIN_ALTITUDE_DEG, AZ_MIN_DEG, AZ_MAX_DEG)
+                # The visibility cache keeps every object that clears its floor in any
+                # azimuth, for variants with looser criteria
+                floor = None
+                if visibility_output_path is None:
+                    region = sky_index.night_region(time_range, LAT_DEG, LON_DEG, *criteria)
+                else:
+                    floor = min(visibility_cache.FLOOR_ALT, MIN_ALTITUDE_DEG)
+                    region = sky_index.night_region(time_range, LAT_DEG, LON_DEG, floor, 0.0, 360.0)
+                rows, ra_deg, dec_deg = load_targets(log, catalog_path, region, surveys, survey_filters)
+                fixed = len(rows)
+
+                bodies = []
+                if planets or element_paths:
+                    bodies = solar_system.load_bodies(eph, ts, planets, element_paths, log)
+                    body_rows, body_ra, body_dec = solar_system.describe(bodies, observer_pos, eph['sun'],
+                                                                         time_range[len(time_range) // 2])
+                    bodies, body_rows, body_ra, body_dec = solar_system.bright_bodies(
+                        bodies, body_rows, body_ra, body_dec, body_mag_limit)
+                    # Moving targets follow the fixed ones; their transit comes from the mid-night place
+                    rows += body_rows
+                    ra_deg = np.concatenate([ra_deg, body_ra])
+                    dec_deg = np.concatenate([dec_deg, body_dec])
+
+                # Transit and highest altitude between dusk and dawn, in closed form
+                transit_days, transit_alt, max_alt = fast_altaz.transit_terms(viewing_start, viewing_end, eph,
+                                                                              LAT_DEG, LON_DEG, ra_deg, dec_deg)
+                transit_times = ts.tt_jd(viewing_start.tt + transit_days).astimezone(tz) if len(rows) else []
+                for row, transit_time, alt_at_transit, highest in zip(rows, transit_times, transit_alt, max_alt):
+                    row['transit_minutes'] = clock_minutes(transit_time)
+                    row['transit_alt'] = float(alt_at_transit)
+                    row['max_alt'] = float(highest)
+
+                track_step = track_step if track_output_path is not None else 0
+                # The visibility cache and time windows use every sample; report tracks are a subset
+                eval_step = 1 if visibility_output_path is not None or windows else track_step
+
+                # One observer position over the grid for the Skyfield paths and moving targets
+                observer_at = observer_pos.at(time_range) if engine != 'fast' or bodies else None
+                if engine == 'fast':
+                    results = fast_altaz.evaluate_targets(
+                        time_range, eph, LAT_DEG, LON_DEG, ra_deg[:fixed], dec_deg[:fixed], *criteria, eval_step,
+                        memory_budget=memory_budget, dtype=np.float32 if float32 else np.float64,
+                        quality_settings=quality_settings)
+                elif workers > 1 and fixed > 1:
+                    results = evaluate_targets_parallel(workers, observer_at, (LAT_DEG, LON_DEG),
+                                                        ra_deg[:fixed], dec_deg[:fixed], *criteria, eval_step,
+                                                        quality_settings)
+                else:
+                    results = evaluate_targets(observer_at, ra_deg[:fixed], dec_deg[:fixed],
+                                               *criteria, eval_step, quality_settings)
+                if bodies:
+                    body_results = evaluate_bodies(observer_at, [entry['body'] for entry in bodies],
+                                                   *criteria, eval_step, quality_settings)
+                    results = [np.concatenate(pair) for pair in zip(results, body_results)]
+                indices, altaz, all_tracks, scores = results
+
+                if visibility_output_path is not None or windows:
+                    origin = viewing_start.utc_datetime()
+                    night = visibility_cache.night_data(
+                        {**report, 'timezone': TIME_ZONE}, rows, all_tracks,
+                        [(t - origin).total_seconds() for t in time_range.utc_datetime()], grid_minutes, floor)
+
+                if windows:
+                    report, visible_objects, track_rows = visibility_cache.query(night, windows=windows)
+                else:
+                    track_rows = []
+                    for i, (row, (start_idx, end_idx), (start_alt, start_az, end_alt, end_az), values) in enumerate(
+                            zip(rows, indices, altaz, scores)):
+                        if start_idx < 0:
+                            continue
+
+                        obj_start = time_range[start_idx].astimezone(tz)
+                        obj_end = time_range[end_idx].astimezone(tz)
+                        time_span = (obj_end - obj_start).total_seconds() / 60
+                        start_minutes = clock_minutes(obj_start)
+                        end_minutes = clock_minutes(obj_end)
+
+                        if time_span >= min_duration:
+                            track_rows.append(i)
+                            visible_objects.append({
+                                'do_me': row['do_me'],
+                                'name': row['name'],
+                                'aka': row['aka'],
+                                'start': obj_start,
+                                'start_minutes': start_minutes,  # For sorting
+                                'end': obj_end,
+                                'end_minutes': end_minutes,
+                                'duration': time_span,
+                                'size': row['size'],
+                                'magnitude': row['magnitude'],
+                                'constellation': row['constellation'],
+                                'type_desc': row['type_desc'],
+                                'start_alt': start_alt,
+                                'start_az': start_az,
+                                'end_alt': end_alt,
+                                'end_az': end_az,
+                                'transit_minutes': row['transit_minutes'],
+                                'transit_alt': row['transit_alt'],
+                                'max_alt': row['max_alt'],
+                                **quality.object_fields(values, quality_settings),
+                            })
+                if len(log) > 0:
+                    # write log to dso_visibility.log
+                    with open('dso_visibility.log', 'a') as log_file:
+                        for entry in log:
+                            log_file.write(f"{datetime.datetime.now().isoformat()} - {entry}\n")
+
+                tracks = None
+                if track_step:
+                    alt, az = all_tracks[track_rows, ::track_step // eval_step].transpose(2, 0, 1)
+                    selected = quantize_tracks(alt, az)
+                    # Thin the samples further if the sidecar would exceed TRACK_MAX_BYTES
+                    stride = max(1, math.ceil(selected.nbytes / TRACK_MAX_BYTES))
+                    sample_idx = np.arange(0, len(time_range), track_step)[::stride]
+                    sample_minutes = [clock_minutes(t) for t in time_range[sample_idx].astimezone(tz)]
+                    with report_output(track_output_path, binary=True) as track_out:
+                        tracks = write_tracks(track_out, selected[:, ::stride], sample_minutes,
+                                              track_step * stride, track_url)
             except Exception as e:
-                log.append(f"Error resolving {name}: {e}")
-                continue
-
-            astrometric = observer_pos.at(time_range).observe(star)
-            alt, az, _ = astrometric.apparent().altaz()
-
-            is_visible = (alt.degrees >= MIN_ALTITUDE_DEG) & \
-                         (az.degrees >= AZ_MIN_DEG) & \
-                         (az.degrees <= AZ_MAX_DEG)
-
-            visible_indices = np.where(is_visible)[0]
-
-            if len(visible_indices) > 0:
-                start_idx = visible_indices[0]
-                end_idx = visible_indices[-1]
-
-                obj_start = time_range[start_idx].astimezone(tz)
-                obj_end = time_range[end_idx].astimezone(tz)
-                time_span = (obj_end - obj_start).total_seconds() / 60
-                start_minutes = obj_start.hour * 60 + obj_start.minute
-                if obj_start.hour < 12:
-                    start_minutes += 24 * 60  # Adjust for sorting past midnight
-                end_minutes = obj_end.hour * 60 + obj_end.minute
-                if obj_end.hour < 12:
-                    end_minutes += 24 * 60  # Adjust for sorting past midnight
-                
-                # Get altitude and azimuth at start and end times
-                start_alt = alt.degrees[start_idx]
-                start_az = az.degrees[start_idx]
-                end_alt = alt.degrees[end_idx]
-                end_az = az.degrees[end_idx]
-                
-                if time_span >= 60:
-                    visible_objects.append({
-                        'do_me': do_me,
-                        'name': name,
-                        'aka': aka,
-                        'start': obj_start,
-                        'start_minutes': start_minutes,  # For sorting
-                        'end': obj_end,
-                        'end_minutes': end_minutes,
-                        'duration': time_span,
-                        'size': size,
-                        'magnitude': magnitude,
-                        'constellation': constellation,
-                        'type_desc': type_desc,
-                        'start_alt': start_alt,
-                        'start_az': start_az,
-                        'end_alt': end_alt,
-                        'end_az': end_az
-                    })
-        if len(log) > 0:
-            # write log to dso_visibility.log
-            with open('dso_visibility.log', 'a') as log_file:
-                for entry in log:
-                    log_file.write(f"{datetime.datetime.now().isoformat()} - {entry}\n")
-    except Exception as e:
-        print(f"<p>Error reading data: {e}</p>")
+                print(f"<p>Error reading data: {e}</p>")
+                raise _ReportAborted from e
+
+            if visibility_output_path is not None:
+                visibility_cache.save_visibility(visibility_output_path, night)
+
+            if data_output_path is not None:
+                with report_output(data_output_path) as data_out:
+                    write_payload(data_out, visible_objects, tracks)
+                # Versioned by content, so the page always fetches the payload it was built with
+                data_url = versioned_url(data_url, file_hash(data_output_path))
+            else:
+                data_url = None
+
+            if schedule_settings is not None:
+                blocks = session_scheduler.schedule(visible_objects, **schedule_settings)
+                if schedule_output_path is not None:
+                    with report_output(schedule_output_path) as schedule_out:
+                        session_scheduler.write_schedule_json(schedule_out, blocks, schedule_settings)
+                write_schedule(out, blocks, schedule_settings)
+
+            write_objects(out, visible_objects, data_url, tracks)
+    except _ReportAborted:
         return
 
-    def safe_float(value, default=0.0):
-        if pd.isna(value) or value is None or value == '':
-            return default
-        try:
-            return float(value)
-        except (ValueError, TypeError):
-            try:
-                return float(str(value))
-            except Exception:
-                return default
-
-    def safe_str(value, default=''):
-        if pd.isna(value) or value is None:
-            return default
-        # Handle numeric numpy and python types cleanly
-        try:
-            if isinstance(value, (float, int, np.floating, np.integer)):
-                if float(value).is_integer():
-                    return str(int(value))
-                return str(value)
-        except Exception:
-            pass
-        return str(value)
-
-    def safe_time_str(value):
-        """Return HH:MM for datetimes/timestamps, or empty string for missing/invalid."""
-        if hasattr(value, 'strftime'):
-            try:
-                return value.strftime('%H:%M')
-            except Exception:
-                pass
-        try:
-            ts = pd.to_datetime(value, errors='coerce')
-            if not pd.isna(ts):
-                return ts.strftime('%H:%M')
-        except Exception:
-            pass
-        return ''
-
-    # If you still have the `most_recent = row['MostRecent'] + row['S50Date']` line,
-    # replace it with a safe concatenation like:
-    # most_recent = safe_str(row.get('MostRecent')) + safe_str(row.get('S50Date'))
-
-    objects_json = json.dumps([{
-        'do_me': safe_str(obj.get('do_me', '')),
-        'name': safe_str(obj.get('name', '')),
-        'aka': safe_str(obj.get('aka', '')),
-        'start': safe_time_str(obj.get('start')),
-        'start_minutes': int(obj.get('start_minutes') or 0),
-        'end': safe_time_str(obj.get('end')),
-        'end_minutes': int(obj.get('end_minutes') or 0),
-        'duration': safe_float(obj.get('duration')),
-        'size': safe_float(obj.get('size')),
-        'magnitude': safe_float(obj.get('magnitude')),
-        'constellation': safe_str(obj.get('constellation')),
-        'type_desc': safe_str(obj.get('type_desc')),
-        'start_alt': safe_float(obj.get('start_alt')),
-        'start_az': safe_float(obj.get('start_az')),
-        'end_alt': safe_float(obj.get('end_alt')),
-        'end_az': safe_float(obj.get('end_az'))
-    } for obj in visible_objects])
-
-
-    # Output HTML
-    target_date_str = target_date.strftime('%Y-%m-%d')
-
-    print(f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>DSO Visibility Report - {target_date_str}</title>
-    <link rel="icon" type="image/png" href="/images/favicon.png">
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            max-width: 1400px;
-            margin: 0 auto;
-            padding: 20px;
-            background: #0a0e27;
-            color: #e0e0e0;
-        }}
-        h1 {{
-            color: #4a9eff;
-            border-bottom: 2px solid #4a9eff;
-            padding-bottom: 10px;
-        }}
-        .info {{
-            background: #1a1f3a;
-            padding: 15px;
-            border-radius: 8px;
-            margin: 20px 0;
-            border-left: 4px solid #4a9eff;
-        }}
-        .info p {{
-            margin: 5px 0;
-        }}
-        .controls {{
-            background: #1a1f3a;
-            padding: 15px;
-            border-radius: 8px;
-            margin: 20px 0;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }}
-        .controls label {{
-            color: #4a9eff;
-            font-weight: 600;
-        }}
-        #force-rebuild-btn, controls button {{
-            padding: 8px 16px;
-            background: #4a9eff !important;
-            color: #ffffff !important;
-            border: 1px solid #4a9eff !important;
-            border-radius: 4px;
-            font-size: 14px;
-            font-weight: 600;
-            cursor: pointer;
-            margin-left: 10px;
-            transition: background 0.2s ease;
-        }}
-
-        #force-rebuild-btn:hover, controls button:hover {{
-            background: #3a8eef !important;
-            border-color: #3a8eef !important;
-        }}
-
-        #force-rebuild-btn:active, controls button:active {{
-            background: #2a7edf !important;
-            border-color: #2a7edf !important;
-        }}
-        .controls input[type="date"] {{
-            padding: 8px 12px;
-            background: #2a3f5f;
-            color: #e0e0e0;
-            border: 1px solid #4a9eff;
-            border-radius: 4px;
-            font-size: 14px;
-            cursor: pointer;
-            color-scheme: dark;
-        }}
-
-        .controls input[type="date"]:hover {{
-            background: #3a4f6f;
-        }}
-
-        .controls input[type="date"]:focus {{
-            outline: none;
-            border-color: #7ec8a3;
-        }}
-
-        .controls select {{
-            padding: 8px 12px;
-            background: #2a3f5f;
-            color: #e0e0e0;
-            border: 1px solid #4a9eff;
-            border-radius: 4px;
-            font-size: 14px;
-            cursor: pointer;
-        }}
-        .controls select:hover {{
-            background: #3a4f6f;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
-            background: #1a1f3a;
-            border-radius: 8px;
-            overflow: hidden;
-        }}
-        th {{
-            background: #2a3f5f;
-            color: #4a9eff;
-            padding: 12px;
-            text-align: left;
-            font-weight: 600;
-            position: sticky;
-            top: 0;
-        }}
-        td {{
-            padding: 10px 12px;
-            border-bottom: 1px solid #2a3f5f;
-        }}
-        tr:hover {{
-            background: #243447;
-        }}
-        .priority {{
-            color: #ffd700;
-            font-size: 1.2em;
-        }}
-        .duration {{
-            color: #7ec8a3;
-            font-weight: 600;
-        }}
-        .time {{
-            color: #b8c5d6;
-        }}
-        @media (max-width: 768px) {{
-            body {{
-                padding: 10px;
-            }}
-            table {{
-                font-size: 0.85em;
-            }}
-            th, td {{
-                padding: 6px;
-            }}
-            .controls {{
-                flex-direction: column;
-                align-items: flex-start;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <h1>DSO Visibility Report</h1>
-    <div class="info">
-        <p><strong>Location:</strong> {LOCATION_NAME}</p>
-        <p><strong>Viewing Window:</strong> {start_local.strftime('%H:%M %Z')} to {end_local.strftime('%H:%M %Z')}</p>
-        <p><strong>Criteria:</strong> Altitude &gt;= {MIN_ALTITUDE_DEG}&deg;, Azimuth {AZ_MIN_DEG}&deg;-{AZ_MAX_DEG}&deg;</p>
-    </div>
-
-    <div class="controls">
-        <label for="sortOrder">Sort by:</label>
-        <select id="sortOrder" onchange="sortTable()">
-            <option value="duration">Duration (longest first)</option>
-            <option value="start">Start Time (earliest first)</option>
-            <option value="end">End Time (earliest first)</option>
-            <option value="start_az">Starting Azimuth (lowest first)</option>
-            <option value="start_alt">Starting Altitude (highest first)</option>
-            <option value="magnitude">Magnitude (brightest first)</option>
-            <option value="size">Size (largest first)</option>
-            <option value="name">Name (A-Z)</option>
-            <option value="aka">Friendly Name</option>
-        </select>
-        <button id="force-rebuild-btn" onclick="window.location.href=window.location.pathname + '?date={target_date_str}&profile={profile_name}&rebuild=1'">Force Rebuild</button>
-    </div>
-
-""")
-
-    if not visible_objects:
-        print("<p>No objects meet the visibility criteria for this date.</p>")
-    else:
-        print("""
-    <table id="dsoTable">
-        <thead>
-            <tr>
-                <th>Priority</th>
-                <th>Name</th>
-                <th>Also Known As</th>
-                <th>Start</th>
-                <th>Start Alt</th>
-                <th>Start Az</th>
-                <th>End</th>
-                <th>End Alt</th>
-                <th>End Az</th>
-                <th>Duration</th>
-                <th>Size (sq')</th>
-                <th>Mag</th>
-                <th>Constellation</th>
-                <th>Type</th>
-            </tr>
-        </thead>
-        <tbody id="tableBody">
-        </tbody>
-    </table>
-    <div class="info" style="margin-top: 20px;">
-        <p><strong>Total visible objects:</strong> <span id="totalCount"></span></p>
-        <p><strong>&#9733;</strong> = Priority target (not recently observed)</p>
-    </div>
-
-    <script>
-        const objectsData = """ + objects_json + """;
-
-        function formatDuration(minutes) {
-            const hours = minutes / 60;
-            return hours >= 1 ? `${hours.toFixed(1)}h` : `${minutes.toFixed(0)}m`;
-        }
-
-        function renderTable(data) {
-            const tbody = document.getElementById('tableBody');
-            tbody.innerHTML = '';
-
-            data.forEach(obj => {
-                const row = tbody.insertRow();
-                row.innerHTML = `
-                    <td class="priority">${obj.do_me}</td>
-                    <td><strong>${obj.name}</strong></td>
-                    <td>${obj.aka}</td>
-                    <td class="time">${obj.start}</td>
-                    <td>${obj.start_alt.toFixed(0)}&deg;</td>
-                    <td>${obj.start_az.toFixed(0)}&deg;</td>
-                    <td class="time">${obj.end}</td>
-                    <td>${obj.end_alt.toFixed(0)}&deg;</td>
-                    <td>${obj.end_az.toFixed(0)}&deg;</td>
-                    <td class="duration">${formatDuration(obj.duration)}</td>
-                    <td>${obj.size.toFixed(0)}</td>
-                    <td>${obj.magnitude.toFixed(1)}</td>
-                    <td>${obj.constellation}</td>
-                    <td>${obj.type_desc}</td>
-                `;
-            });
-
-            document.getElementById('totalCount').textContent = data.length;
-        }
-
-        function sortTable() {
-            const sortBy = document.getElementById('sortOrder').value;
-            const sortedData = [...objectsData];
-
-            switch(sortBy) {
-                case 'duration':
-                    sortedData.sort((a, b) => b.duration - a.duration);
-                    break;
-                case 'start':
-                    sortedData.sort((a, b) => a.start_minutes - b.start_minutes);
-                    break;
-                case 'end':
-                    sortedData.sort((a, b) => a.end_minutes - b.end_minutes);
-                    break;
-                case 'start_az':
-                    sortedData.sort((a, b) => a.start_az - b.start_az);
-                    break;
-                case 'start_alt':
-                    sortedData.sort((a, b) => b.start_alt - a.start_alt);
-                    break;
-                case 'magnitude':
-                    sortedData.sort((a, b) => a.magnitude - b.magnitude);
-                    break;
-                case 'size':
-                    sortedData.sort((a, b) => b.size - a.size);
-                    break;
-                case 'name':
-                    sortedData.sort((a, b) => a.name.localeCompare(b.name));
-                    break;
-                case 'aka':
-                    sortedData.sort((a, b) => a.aka.localeCompare(b.aka));
-                    break;
-            }
-
-            renderTable(sortedData);
-        }
-
-        // Initial render with default sort (duration)
-        sortTable();
-    </script>
-</body>
-</html>
-""")
-
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Calculate DSO visibility for a given date')
     parser.add_argument('--date', type=str, help='Date in YYYY-MM-DD format (default: today)')
     parser.add_argument('--profile', type=str, default='default', help='Profile name to use (default: default)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Number of worker processes for object evaluation (default: 1)')
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                        help=f'Alt/az engine: full Skyfield or the fast NumPy approximation (default: {DEFAULT_ENGINE})')
+    parser.add_argument('--memory-budget', type=float, default=fast_altaz.DEFAULT_MEMORY_BUDGET / (1 << 20),
+                        help='Working memory per block of objects in MB, fast engine '
+                             f'(default: {fast_altaz.DEFAULT_MEMORY_BUDGET >> 20})')
+    parser.add_argument('--float32', action='store_true',
+                        help='Compute in float32 with the fast engine (half the memory)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Time evaluation with 1..--workers processes instead of producing HTML')
+    parser.add_argument('--output', type=str,
+                        help='Write the report to this file (atomically) instead of stdout')
+    parser.add_argument('--data-output', type=str,
+                        help='Write the columnar table payload to this file instead of embedding it')
+    parser.add_argument('--data-url', type=str,
+                        help='URL the report fetches the --data-output payload from')
+    parser.add_argument('--data-dir', type=str,
+                        help='Directory holding de421.bsp and timescale files (default: pythonscripts/data)')
+    parser.add_argument('--ephemeris', type=str,
+                        help='Kernel file name inside the data directory, e.g. a trimmed kernel')
+    parser.add_argument('--offline', action='store_true', default=None,
+                        help='Fail instead of downloading missing ephemeris files')
+    parser.add_argument('--catalog', type=str,
+                        help='Load objects from a dso_catalog.py catalog instead of the Google Sheet')
+    parser.add_argument('--survey', action='append', default=[], metavar='DSOCAT',
+                        help='Also search this survey_catalog.py catalog (repeatable)')
+    parser.add_argument('--filter', action='append', default=[], metavar='EXPR',
+                        help="Survey filter, e.g. 'mag < 12', 'size > 10', 'type in {G, PN}' (repeatable)")
+    parser.add_argument('--planets', action='store_true',
+                        help='Also list the Moon and planets from the ephemeris')
+    parser.add_argument('--elements', action='append', default=[], metavar='FILE',
+                        help='Also list comets/minor planets from this MPC elements file (repeatable)')
+    parser.add_argument('--body-mag-limit', type=float, default=solar_system.MAG_LIMIT,
+                        help=f'Skip --elements bodies fainter than this (default: {solar_system.MAG_LIMIT})')
+    parser.add_argument('--track-output', type=str,
+                        help='Write downsampled alt/az tracks of visible objects to this binary file')
+    parser.add_argument('--track-url', type=str,
+                        help='URL the report fetches the --track-output sidecar from')
+    parser.add_argument('--track-step', type=int, default=TRACK_STEP,
+                        help=f'Minutes between track samples (default: {TRACK_STEP})')
+    parser.add_argument('--min-duration', type=float,
+                        help=f"Minimum visible minutes (default: the profile's min_duration or {MIN_DURATION})")
+    parser.add_argument('--visibility-output', type=str,
+                        help='Also store per-minute alt/az of every object above the horizon '
+                             'for visibility_cache.py queries')
+    parser.add_argument('--window', action='append', default=[], metavar='HH:MM-HH:MM',
+                        help='Only count time inside this local time window, e.g. 23:00-02:00 (repeatable)')
+    parser.add_argument('--schedule', action='store_true',
+                        help='Add a suggested imaging session to the report')
+    parser.add_argument('--schedule-output', type=str,
+                        help='Also write the suggested session as JSON to this file (implies --schedule)')
+    parser.add_argument('--min-block', type=int, default=session_scheduler.MIN_BLOCK,
+                        help=f'Minimum imaging block in minutes (default: {session_scheduler.MIN_BLOCK})')
+    parser.add_argument('--slew-overhead', type=int, default=session_scheduler.SLEW_OVERHEAD,
+                        help=f'Slew/settle minutes between blocks (default: {session_scheduler.SLEW_OVERHEAD})')
     args = parser.parse_args()
+    ephemeris_data.configure(args.data_dir, args.ephemeris, args.offline)
     
     target_date = None
     if args.date:
@@ -554,5 +878,42 @@ if __name__ == '__main__':
         except ValueError:
             print("<p>Error: Invalid date format. Use YYYY-MM-DD</p>")
             sys.exit(1)
+
+    try:
+        windows = [visibility_cache.parse_window(text) for text in args.window]
+        survey_filters = [survey_catalog.parse_filter(text) for text in args.filter]
+    except ValueError as e:
+        print(f"<p>Error: {e}</p>")
+        sys.exit(1)
     
-    calculate_visibility(target_date, args.profile)
+    schedule_settings = None
+    if args.schedule or args.schedule_output:
+        schedule_settings = {'min_block': args.min_block,
+                             'max_block': max(args.min_block, session_scheduler.MAX_BLOCK),
+                             'overhead': args.slew_overhead}
+
+    if args.benchmark:
+        benchmark_workers(target_date, args.profile, max(1, args.workers), args.catalog,
+                          int(args.memory_budget * (1 << 20)))
+    else:
+        calculate_visibility(target_date, args.profile, max(1, args.workers),
+                             output_path=args.output,
+                             data_output_path=args.data_output,
+                             data_url=args.data_url,
+                             catalog_path=args.catalog,
+                             track_output_path=args.track_output,
+                             track_url=args.track_url,
+                             track_step=max(1, args.track_step),
+                             schedule_settings=schedule_settings,
+                             schedule_output_path=args.schedule_output,
+                             min_duration=args.min_duration,
+                             visibility_output_path=args.visibility_output,
+                             windows=windows,
+                             engine=args.engine,
+                             memory_budget=int(args.memory_budget * (1 << 20)),
+                             float32=args.float32,
+                             surveys=args.survey,
+                             survey_filters=survey_filters,
+                             planets=args.planets,
+                             element_paths=args.elements,
+                             body_mag_limit=args.body_mag_limit)
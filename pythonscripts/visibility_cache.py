@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Per-night visibility cache and threshold queries.
+
+todays_dsos_web.py --visibility-output stores the altitude/azimuth of every
+object that rises above FLOOR_ALT that night, at each minute of the viewing
+window, together with the object metadata and the report header. Tracks are
+stored as int16 hundredths of a degree (the report track layout), as
+sample-to-sample differences, in a compressed .npz. Report variants with a different minimum duration, altitude
+floor, azimuth range or time window(s) are then derived from the cached arrays
+without touching the ephemeris:
+
+    python visibility_cache.py CACHE --min-duration 90 --min-alt 30 --az-min 90 --az-max 200
+    python visibility_cache.py CACHE --window 23:00-02:00 --window 03:30-04:30
+
+Because the full tracks are stored (not a mask for the profile's criteria),
+any altitude floor down to FLOOR_ALT and any azimuth range work, not only ones
+inside the profile's. The report's own criteria select exactly the samples the
+generator did (see pack_tracks()); other limits hold to 0.01 degrees. An
+azimuth range
+with az_min > az_max wraps through north (e.g. 300..60). With time windows an
+object's duration is its visible time inside the windows, summed over windows,
+and its maximum altitude is the highest sampled inside them. The transit time
+and altitude stay those of the night's transit, which may fall outside the
+windows.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from zoneinfo import ZoneInfo
+import numpy as np
+import quality
+import session_scheduler
+from report_renderer import render_report, report_output, write_payload, TRACK_SCALE, TRACK_AZ_OFFSET
+
+CACHE_VERSION = 2
+
+# Lowest altitude floor variants can ask for. Objects that stay below it all
+# night, in every azimuth, are not stored (see sky_index.py)
+FLOOR_ALT = 0.0
+
+TEXT_COLUMNS = ('do_me', 'name', 'aka', 'constellation', 'type_desc')
+NUMBER_COLUMNS = ('size', 'magnitude', 'transit_minutes', 'transit_alt', 'max_alt')
+REPORT_FIELDS = ('date', 'profile', 'location', 'timezone', 'window_start', 'window_end',
+                 'min_altitude', 'az_min', 'az_max', 'min_duration', 'quality')
+
+WINDOW_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$')
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def parse_window(text):
+    """
+    Parse a local time window 'HH:MM-HH:MM' into report clock minutes.
+
+    Times before noon belong to the morning after the report date (+1440), as
+    in the start_minutes/end_minutes columns, so '23:00-02:00' is (1380, 1560).
+
+    Raises:
+        ValueError: If the text is malformed or the window is empty
+    """
+    match = WINDOW_PATTERN.match(text.strip())
+    if not match:
+        raise ValueError(f"Invalid time window '{text}'; use HH:MM-HH:MM")
+    start_h, start_m, end_h, end_m = (int(part) for part in match.groups())
+    if start_h > 23 or end_h > 23 or start_m > 59 or end_m > 59:
+        raise ValueError(f"Invalid time window '{text}'; use HH:MM-HH:MM")
+    start = start_h * 60 + start_m + (1440 if start_h < 12 else 0)
+    end = end_h * 60 + end_m + (1440 if end_h < 12 else 0)
+    if end <= start:
+        raise ValueError(f"Time window '{text}' ends before it starts")
+    return start, end
+
+
+def merge_windows(windows):
+    """Sort (start, end) clock-minute windows and merge overlapping ones."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def format_windows(windows):
+    return ', '.join(f'{start // 60 % 24:02d}:{start % 60:02d}-{end // 60 % 24:02d}:{end % 60:02d}'
+                     for start, end in windows)
+
+
+def night_data(report, rows, tracks, sample_seconds, sample_minutes, floor=None):
+    """
+    Assemble a night's visibility data in the form load_visibility() returns.
+
+    Args:
+        report: Report header dict from calculate_visibility() (window_start
+            and window_end as aware datetimes) plus 'timezone' and 'min_duration'
+        rows: Per-object metadata dicts (load_targets() rows)
+        tracks: (N, T, 2) alt/az degrees for every object at every grid sample
+        sample_seconds: (T,) seconds of each sample since window_start
+        sample_minutes: (T,) report clock minutes of each sample
+        floor: Altitude the rows were selected by (any azimuth), or None when
+            every object is included
+    """
+    header = {key: report[key] for key in REPORT_FIELDS}
+    header['window_start'] = report['window_start'].isoformat()
+    header['window_end'] = report['window_end'].isoformat()
+    header['floor'] = floor
+
+    night = {key: np.array(['' if row[key] is None else str(row[key]) for row in rows], dtype=str)
+             for key in TEXT_COLUMNS}
+    night.update({key: np.array([_number(row[key]) for row in rows], dtype=np.float64)
+                  for key in NUMBER_COLUMNS})
+    night.update({
+        'header': header,
+        'tracks': np.asarray(tracks, dtype=np.float32),
+        'sample_seconds': np.asarray(sample_seconds, dtype=np.float64),
+        'sample_minutes': np.asarray(sample_minutes, dtype=np.int32),
+    })
+    return night
+
+
+def pack_tracks(tracks, az_min, az_max):
+    """
+    (N, T, 2) alt/az degrees as int16 [alt, az - TRACK_AZ_OFFSET] hundredths.
+
+    Altitudes are rounded down and azimuths away from the nearer of az_min and
+    az_max, so the report's own criteria (whole degrees) select the same
+    samples from the packed tracks as from the originals. Samples are stored
+    as differences from the previous one (wrapping in int16), which compress
+    about five times better than the values.
+    """
+    alt = tracks[..., 0].astype(np.float64)
+    az = tracks[..., 1].astype(np.float64)
+    packed = np.empty(tracks.shape, dtype=np.int16)
+    packed[..., 0] = np.floor(alt * TRACK_SCALE)
+    to_max = np.abs((az - az_max + 180.0) % 360.0 - 180.0) < np.abs((az - az_min + 180.0) % 360.0 - 180.0)
+    az = (az - TRACK_AZ_OFFSET) * TRACK_SCALE
+    packed[..., 1] = np.where(to_max, np.ceil(az), np.floor(az))
+    packed[:, 1:] = np.diff(packed, axis=1)
+    return packed
+
+
+def unpack_tracks(packed):
+    """pack_tracks() output back to (N, T, 2) float32 degrees."""
+    packed = np.cumsum(packed, axis=1, dtype=np.int16)
+    tracks = np.empty(packed.shape, dtype=np.float32)
+    tracks[..., 0] = packed[..., 0] / TRACK_SCALE
+    tracks[..., 1] = packed[..., 1] / TRACK_SCALE + TRACK_AZ_OFFSET
+    return tracks
+
+
+def save_visibility(path, night):
+    """Write night_data() atomically, with packed tracks, compressed."""
+    arrays = {key: value for key, value in night.items() if key != 'header'}
+    arrays['tracks'] = pack_tracks(night['tracks'], night['header']['az_min'], night['header']['az_max'])
+    path = Path(path)
+    tmp = path.with_name(f'.{path.stem}.{os.getpid()}.tmp.npz')
+    try:
+        np.savez_compressed(tmp, version=np.int32(CACHE_VERSION), header=np.array(json.dumps(night['header'])),
+                            **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def load_visibility(path):
+    """
+    Load a visibility cache.
+
+    Returns:
+        dict of arrays plus 'header' (the report fields)
+
+    Raises:
+        FileNotFoundError: If the cache does not exist
+        ValueError: If it was written by an incompatible version
+    """
+    with np.load(path, allow_pickle=False) as npz:
+        cache = {name: npz[name] for name in npz.files}
+    version = int(cache.pop('version', 0))
+    # Version 1 stored float32 tracks of every object
+    if version not in (1, CACHE_VERSION):
+        raise ValueError(f'{path} is not a version {CACHE_VERSION} visibility cache; regenerate the report')
+    cache['header'] = json.loads(str(cache['header']))
+    cache['header'].setdefault('floor', None)
+    if version == CACHE_VERSION:
+        cache['tracks'] = unpack_tracks(cache['tracks'])
+    # Caches written before a column existed
+    for key in NUMBER_COLUMNS:
+        cache.setdefault(key, np.full(len(cache['tracks']), np.nan))
+    return cache
+
+
+def criteria_mask(tracks, min_alt, az_min, az_max):
+    """(N, T) bool, samples where each object meets the criteria (az_min > az_max wraps through north)."""
+    alt = tracks[:, :, 0]
+    az = tracks[:, :, 1]
+    if az_min <= az_max:
+        in_az = (az >= az_min) & (az <= az_max)
+    else:
+        in_az = (az >= az_min) | (az <= az_max)
+    return (alt >= min_alt) & in_az
+
+
+def window_samples(sample_minutes, windows):
+    """(T,) bool, samples inside any of the merged clock-minute windows."""
+    inside = np.zeros(len(sample_minutes), dtype=bool)
+    for start, end in windows:
+        inside |= (sample_minutes >= start) & (sample_minutes <= end)
+    return inside
+
+
+def visible_spans(tracks, sample_seconds, min_alt, az_min, az_max, sample_minutes=None, windows=None):
+    """
+    First and last sample each object meets the criteria, and its visible minutes.
+
+    Args:
+        tracks: (N, T, 2) alt/az degrees
+        sample_seconds: (T,) sample times in seconds
+        min_alt, az_min, az_max: Criteria in degrees
+        sample_minutes: (T,) report clock minutes, needed with windows
+        windows: Merged (start, end) clock-minute windows, or None for all samples
+
+    Returns:
+        (first, last, minutes) arrays; first/last are -1 where the object is
+        never visible, minutes is the first-to-last span within each window,
+        summed over windows
+    """
+    mask = criteria_mask(tracks, min_alt, az_min, az_max)
+
+    if windows is None:
+        ranges = [np.arange(mask.shape[1])]
+    else:
+        ranges = [np.flatnonzero((sample_minutes >= start) & (sample_minutes <= end)) for start, end in windows]
+
+    count = mask.shape[0]
+    first = np.full(count, -1)
+    last = np.full(count, -1)
+    minutes = np.zeros(count)
+    for columns in ranges:
+        if len(columns) == 0:
+            continue
+        sub = mask[:, columns]
+        seen = sub.any(axis=1)
+        start = columns[sub.argmax(axis=1)]
+        end = columns[len(columns) - 1 - sub[:, ::-1].argmax(axis=1)]
+        minutes += np.where(seen, (sample_seconds[end] - sample_seconds[start]) / 60, 0.0)
+        first = np.where(seen & (first < 0), start, first)
+        last = np.where(seen, end, last)
+    return first, last, minutes
+
+
+def query(cache, min_duration=None, min_alt=None, az_min=None, az_max=None, windows=None):
+    """
+    Derive a report from a visibility cache.
+
+    Thresholds left as None use the values the cache was generated with.
+
+    Args:
+        cache: load_visibility() or night_data() result
+        min_duration, min_alt, az_min, az_max: Criteria overrides
+        windows: (start, end) clock-minute windows (see parse_window()) to
+            restrict the night to, or None for the whole viewing window
+
+    Returns:
+        (report, visible_objects, rows) where report and visible_objects are
+        in the form render_report() takes and rows are the objects' cache rows
+
+    Raises:
+        ValueError: If min_alt is below the altitude the cache's objects were
+            selected by
+    """
+    header = cache['header']
+    min_duration = header['min_duration'] if min_duration is None else min_duration
+    min_alt = header['min_altitude'] if min_alt is None else min_alt
+    if header.get('floor') is not None and min_alt < header['floor']:
+        raise ValueError(f"Altitude floor {min_alt:g} is below the visibility cache's {header['floor']:g} degrees")
+    az_min = header['az_min'] if az_min is None else az_min
+    az_max = header['az_max'] if az_max is None else az_max
+    if windows:
+        windows = merge_windows(windows)
+
+    tracks = cache['tracks']
+    seconds = cache['sample_seconds']
+    minutes = cache['sample_minutes']
+    first, last, spans = visible_spans(tracks, seconds, min_alt, az_min, az_max, minutes, windows or None)
+
+    tz = ZoneInfo(header['timezone'])
+    window_start = datetime.datetime.fromisoformat(header['window_start']).astimezone(tz)
+
+    rows = np.flatnonzero((first >= 0) & (spans >= min_duration))
+    # Caches written before quality scores default to the standard weighting
+    quality_settings = header.get('quality') or quality.settings({})
+    mask = criteria_mask(tracks[rows], min_alt, az_min, az_max)
+    if windows:
+        mask &= window_samples(minutes, windows)
+    scores = quality.summarize(tracks[rows, :, 0], mask, seconds / 60, quality_settings)
+    max_alt = cache['max_alt']
+    if windows and len(rows):
+        # Highest point inside the windows; the cached column covers the whole night
+        max_alt = max_alt.copy()
+        max_alt[rows] = tracks[rows][:, window_samples(minutes, windows), 0].max(axis=1)
+
+    visible_objects = []
+    for i, values in zip(rows, scores):
+        start_idx, end_idx = first[i], last[i]
+        start_alt, start_az = tracks[i, start_idx]
+        end_alt, end_az = tracks[i, end_idx]
+        visible_objects.append({
+            **{key: str(cache[key][i]) for key in TEXT_COLUMNS},
+            'start': window_start + datetime.timedelta(seconds=float(seconds[start_idx])),
+            'start_minutes': int(minutes[start_idx]),
+            'end': window_start + datetime.timedelta(seconds=float(seconds[end_idx])),
+            'end_minutes': int(minutes[end_idx]),
+            'duration': float(spans[i]),
+            'size': float(cache['size'][i]),
+            'magnitude': float(cache['magnitude'][i]),
+            'start_alt': float(start_alt),
+            'start_az': float(start_az),
+            'end_alt': float(end_alt),
+            'end_az': float(end_az),
+            'transit_minutes': float(cache['transit_minutes'][i]),
+            'transit_alt': float(cache['transit_alt'][i]),
+            'max_alt': float(max_alt[i]),
+            **quality.object_fields(values, quality_settings),
+        })
+
+    report = {
+        'date': header['date'],
+        'profile': header['profile'],
+        'location': header['location'],
+        'window_start': window_start,
+        'window_end': datetime.datetime.fromisoformat(header['window_end']).astimezone(tz),
+        'min_altitude': min_alt,
+        'az_min': az_min,
+        'az_max': az_max,
+        'min_duration': min_duration,
+        'quality': quality_settings,
+    }
+    if windows:
+        report['time_windows'] = format_windows(windows)
+    return report, visible_objects, rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Derive a report variant from a cached night')
+    parser.add_argument('cache', help='Visibility cache (todays_dsos_web.py --visibility-output)')
+    parser.add_argument('--min-duration', type=float, help='Minimum visible minutes (default: as generated)')
+    parser.add_argument('--min-alt', type=float, help='Altitude floor in degrees (default: as generated)')
+    parser.add_argument('--az-min', type=float, help='Azimuth range start in degrees (default: as generated)')
+    parser.add_argument('--az-max', type=float, help='Azimuth range end in degrees (default: as generated)')
+    parser.add_argument('--window', action='append', default=[], metavar='HH:MM-HH:MM',
+                        help='Only count time inside this local time window (repeatable)')
+    parser.add_argument('--format', choices=('html', 'json'), default='html',
+                        help='Full report page or the columnar payload (default: html)')
+    parser.add_argument('--schedule', action='store_true', help='Add a suggested imaging session to the report')
+    parser.add_argument('--min-block', type=int, default=session_scheduler.MIN_BLOCK,
+                        help=f'Minimum imaging block in minutes (default: {session_scheduler.MIN_BLOCK})')
+    parser.add_argument('--slew-overhead', type=int, default=session_scheduler.SLEW_OVERHEAD,
+                        help=f'Slew/settle minutes between blocks (default: {session_scheduler.SLEW_OVERHEAD})')
+    args = parser.parse_args()
+
+    try:
+        windows = [parse_window(text) for text in args.window]
+        cache = load_visibility(args.cache)
+        report, objects, _ = query(cache, args.min_duration, args.min_alt, args.az_min, args.az_max, windows)
+    except (OSError, ValueError) as e:
+        print(f'<p>Error: {e}</p>')
+        sys.exit(1)
+
+    if args.format == 'json':
+        write_payload(sys.stdout, objects)
+        print()
+        sys.exit(0)
+
+    schedule = None
+    if args.schedule:
+        settings = {'min_block': args.min_block,
+                    'max_block': max(args.min_block, session_scheduler.MAX_BLOCK),
+                    'overhead': args.slew_overhead}
+        schedule = (session_scheduler.schedule(objects, **settings), settings)
+
+    with report_output() as out:
+        render_report(out, report, objects, schedule=schedule)